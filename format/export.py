@@ -0,0 +1,43 @@
+"""Streaming machine-readable report output (JSON, NDJSON, CSV, TSV)."""
+
+import csv
+import json
+from typing import Iterable, Sequence, TextIO
+
+FORMATS = ('json', 'ndjson', 'csv', 'tsv')
+
+
+def write_records(rows: Iterable[Sequence], fields: Sequence[str], fmt: str, out: TextIO) -> int:
+    """Write *rows* (tuples ordered like *fields*) to *out* one at a time, without color codes.
+
+    'json' is a single array of objects, 'ndjson' one object per line, and
+    'csv'/'tsv' a header line followed by one line per row (None as an
+    empty cell). Nothing is buffered beyond the current row.
+
+    Returns:
+        Number of rows written
+
+    Raises:
+        ValueError: Unknown *fmt*
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format: {fmt}. Pick from: {', '.join(FORMATS)}")
+    count = 0
+    if fmt in ('csv', 'tsv'):
+        writer = csv.writer(out, delimiter='\t' if fmt == 'tsv' else ',', lineterminator='\n')
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elif fmt == 'ndjson':
+        for row in rows:
+            out.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n')
+            count += 1
+    else:
+        out.write('[')
+        for row in rows:
+            out.write((',\n' if count else '\n') + json.dumps(dict(zip(fields, row)), ensure_ascii=False))
+            count += 1
+        out.write('\n]\n' if count else ']\n')
+    out.flush()
+    return count
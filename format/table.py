@@ -0,0 +1,113 @@
+"""Buffered plain-text table rendering for large reports."""
+
+import os
+import sys
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Optional, Sequence, TextIO, Tuple
+
+BOLD = "\033[;1m"
+HEADER = "\033[;1m\033[;7m"
+RESET = "\033[0m"
+
+CHUNK_ROWS = 4096  # Lines joined per write
+
+
+class Table:
+    """Render rows as aligned columns, writing large chunks instead of a call per row.
+
+    Column widths are measured in one pass over the formatted cells; lines are
+    then generated lazily and written CHUNK_ROWS at a time.
+    """
+
+    def __init__(self, columns: Sequence[Tuple[str, Callable]], numbered: bool = True):
+        """
+        Args:
+            columns: (header, cell formatter) pairs; a formatter maps a row to its cell text
+            numbered: Prefix every line with a 1-based '#' column
+        """
+        self.columns = list(columns)
+        self.numbered = numbered
+
+    def _cells(self, rows: Iterable) -> Tuple[List[Tuple[str, ...]], List[int]]:
+        formatters = [fmt for _header, fmt in self.columns]
+        widths = [len(header) for header, _fmt in self.columns]
+        cells = []
+        for row in rows:
+            cell = tuple(str(fmt(row)) for fmt in formatters)
+            for i, text in enumerate(cell):
+                if len(text) > widths[i]:
+                    widths[i] = len(text)
+            cells.append(cell)
+        return cells, [w + 2 for w in widths]
+
+    def _lines(self, cells: List[Tuple[str, ...]], widths: List[int], color: bool):
+        start, end = (BOLD, RESET) if color else ('', '')
+        for n, cell in enumerate(cells, 1):
+            parts = [text.ljust(width) for text, width in zip(cell, widths)]
+            if self.numbered:
+                parts.insert(0, str(n).ljust(5))
+            yield start + ' '.join(parts).rstrip() + end
+
+    def render(self, rows: Iterable, out: Optional[TextIO] = None, color: Optional[bool] = None) -> int:
+        """Write the header and one line per row to *out* (default stdout).
+
+        Args:
+            color: Emit ANSI bold/reverse styling; defaults to whether *out* is a terminal
+
+        Returns:
+            Number of rows written
+        """
+        out = out if out is not None else sys.stdout
+        if color is None:
+            color = _isatty(out)
+        cells, widths = self._cells(rows)
+        header = [title.center(width) for (title, _fmt), width in zip(self.columns, widths)]
+        if self.numbered:
+            header.insert(0, '#'.center(5))
+        out.write((HEADER if color else '') + ' '.join(header).rstrip() + (RESET if color else '') + '\n')
+
+        chunk = []
+        for line in self._lines(cells, widths, color):
+            chunk.append(line)
+            if len(chunk) >= CHUNK_ROWS:
+                out.write('\n'.join(chunk) + '\n')
+                chunk = []
+        if chunk:
+            out.write('\n'.join(chunk) + '\n')
+        out.flush()
+        return len(cells)
+
+
+def _isatty(stream) -> bool:
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+@contextmanager
+def output(pager: bool = False):
+    """Yield the stream reports are written to: stdout, or $PAGER (default 'less -R') when
+    *pager* is set and stdout is a terminal. Quitting the pager early is not an error."""
+    if not pager or not _isatty(sys.stdout):
+        yield sys.stdout
+        return
+    import shlex
+    import subprocess
+    sys.stdout.flush()
+    try:
+        proc = subprocess.Popen(shlex.split(os.environ.get('PAGER') or 'less -R'),
+                                stdin=subprocess.PIPE, text=True)
+    except OSError:
+        yield sys.stdout
+        return
+    try:
+        yield proc.stdin
+    except BrokenPipeError:
+        pass
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        proc.wait()
@@ -0,0 +1,167 @@
+"""Per-group distribution statistics (count/min/median/p90/mean/stddev) over results.
+
+Uses NumPy when it is installed: values are grouped with one sort and all
+groups' statistics are computed as array operations. Without NumPy the same
+numbers come from a pure-Python fallback. NumPy is imported on the first
+distribution() call, so importing this module (e.g. for FIELDS) stays cheap.
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+np = None  # numpy once _numpy() has imported it; stays None when it is not installed
+_numpy_checked = False
+
+METRICS = ('latency_ms', 'rx_speed_mbps', 'tx_speed_mbps')
+STATS = ('count', 'min', 'median', 'p90', 'mean', 'stddev')
+FIELDS = ('servers',) + tuple(f'{metric}_{stat}' for metric in METRICS for stat in STATS)
+
+
+def _numpy():
+    """Import NumPy on first use; None when it is not installed."""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+        except ImportError:
+            pass
+        else:
+            np = numpy
+    return np
+
+
+def _usable(value) -> bool:
+    """Only positive numbers count; 0/None mean 'not measured' in results."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0 and math.isfinite(value)
+
+
+def _quantile(ordered: List[float], q: float) -> float:
+    pos = q * (len(ordered) - 1)
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def _python_stats(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {'count': 0, 'min': None, 'median': None, 'p90': None, 'mean': None, 'stddev': None}
+    ordered = sorted(values)
+    mean = sum(ordered) / len(ordered)
+    return {
+        'count': len(ordered),
+        'min': ordered[0],
+        'median': _quantile(ordered, 0.5),
+        'p90': _quantile(ordered, 0.9),
+        'mean': mean,
+        'stddev': math.sqrt(sum((v - mean) ** 2 for v in ordered) / len(ordered)),
+    }
+
+
+def _numpy_stats(codes, n_groups: int, values: Sequence) -> Dict[str, List]:
+    """Statistics of *values* per group code; NaN marks a missing value."""
+    try:
+        arr = np.array(values, dtype=float)  # None -> NaN
+    except (TypeError, ValueError):
+        arr = np.array([v if _usable(v) else None for v in values], dtype=float)
+    with np.errstate(invalid='ignore'):
+        valid = np.isfinite(arr) & (arr > 0)
+    arr[~valid] = np.nan
+    counts = np.bincount(codes[valid], minlength=n_groups)
+    # One sort groups the values and orders each group ascending (NaN last within its group)
+    order = np.lexsort((arr, codes))
+    ordered = arr[order]
+    starts = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=n_groups))[:-1]))
+    has = counts > 0
+    last = np.maximum(counts - 1, 0)
+
+    def quantile(q):
+        pos = starts + q * last
+        lo = np.floor(pos).astype(int)
+        hi = np.minimum(lo + 1, starts + last)
+        return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(codes, weights=np.where(valid, arr, 0.0), minlength=n_groups) / counts
+        deviation = np.where(valid, arr - mean[codes], 0.0)
+        variance = np.bincount(codes, weights=deviation * deviation, minlength=n_groups) / counts
+
+    def column(values_):
+        return [float(v) if ok else None for v, ok in zip(values_, has)]
+
+    return {
+        'count': counts.tolist(),
+        'min': column(ordered[starts]),
+        'median': column(quantile(0.5)),
+        'p90': column(quantile(0.9)),
+        'mean': column(mean),
+        'stddev': column(np.sqrt(variance)),
+    }
+
+
+def distribution(keys: Sequence, metrics: Dict[str, Sequence], key_name: Union[str, Tuple[str, ...]] = 'key') -> List[Dict]:
+    """Group rows by *keys* and describe each metric column per group.
+
+    Args:
+        keys: Group key of each row (e.g. its country, or a (country, city) tuple)
+        metrics: Metric name -> one value per row; non-positive or missing values are skipped
+        key_name: Name of the key field in the output; a tuple of names for tuple keys
+
+    Returns:
+        One dict per group in first-seen order: {key_name, 'servers',
+        '<metric>_<stat>' for every metric and STATS}; statistics of a metric
+        with no usable values are None. stddev is the population deviation.
+    """
+    if not keys:
+        return []
+    groups = list(dict.fromkeys(keys))
+    if isinstance(key_name, tuple):
+        out = [dict(zip(key_name, group), servers=0) for group in groups]
+    else:
+        out = [{key_name: group, 'servers': 0} for group in groups]
+
+    if _numpy() is not None:
+        position = {group: i for i, group in enumerate(groups)}
+        codes = np.fromiter((position[k] for k in keys), dtype=np.intp, count=len(keys))
+        for i, n in enumerate(np.bincount(codes, minlength=len(groups)).tolist()):
+            out[i]['servers'] = n
+        for metric, values in metrics.items():
+            for stat, column in _numpy_stats(codes, len(groups), values).items():
+                for i, value in enumerate(column):
+                    out[i][f'{metric}_{stat}'] = value
+        return out
+
+    index = {group: row for group, row in zip(groups, out)}
+    buckets = {metric: {group: [] for group in groups} for metric in metrics}
+    for i, key in enumerate(keys):
+        index[key]['servers'] += 1
+        for metric, values in metrics.items():
+            if _usable(values[i]):
+                buckets[metric][key].append(float(values[i]))
+    for metric in metrics:
+        for group in groups:
+            for stat, value in _python_stats(buckets[metric][group]).items():
+                index[group][f'{metric}_{stat}'] = value
+    return out
+
+
+def descending(field: str) -> bool:
+    """Natural sort direction of a field: more servers/samples and faster speeds first."""
+    return field == 'servers' or field.endswith('_count') or (
+        field.startswith(('rx_', 'tx_')) and not field.endswith('_stddev'))
+
+
+def sort_groups(groups: List[Dict], field: str, reverse: Optional[bool] = None) -> List[Dict]:
+    """Sort *groups* in place by *field*; None values always go last.
+
+    Raises:
+        ValueError: *field* is not a distribution field or the key field
+    """
+    if groups and field not in groups[0]:
+        raise ValueError(f"Unknown sort field: {field}")
+    reverse = descending(field) if reverse is None else reverse
+    present = [g for g in groups if g.get(field) is not None]
+    missing = [g for g in groups if g.get(field) is None]
+    present.sort(key=lambda g: g[field], reverse=reverse)
+    groups[:] = present + missing
+    return groups
@@ -0,0 +1,230 @@
+"""Column-oriented, read-only view of one results version for ranking and filtering.
+
+A ResultsTable is built once per results file version; top-N rankings,
+per-country bests and counts are then array operations over its columns
+instead of loops over result records. Uses NumPy when it is installed and
+the table has at least NUMPY_MIN_ROWS rows (NumPy is imported lazily, like in
+generate.aggregate, so small CLI reports do not pay for the import); otherwise
+the same answers come from plain lists.
+"""
+
+import math
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from generate.aggregate import _numpy
+
+# Smallest table worth importing NumPy for
+NUMPY_MIN_ROWS = 1000
+# Numeric columns of ResultsTable.from_results
+NUMERIC = ('latency_ms', 'rx_speed_mbps', 'tx_speed_mbps')
+# Timestamp columns of ResultsTable.from_results, as POSIX seconds
+TIMESTAMPS = ('scan_timestamp', 'speedtest_timestamp', 'speedtest_failed_timestamp')
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value):
+        return float(value)
+    return None
+
+
+def _epoch(value) -> Optional[float]:
+    if not isinstance(value, str):
+        return None
+    try:
+        ts = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return (ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def recently_failed(entry: Mapping) -> bool:
+    """True if the entry's most recent speedtest failed (as web.state._is_failed_server)."""
+    fts = entry.get('speedtest_failed_timestamp')
+    if not fts:
+        return False
+    ts = entry.get('speedtest_timestamp')
+    return not ts or fts > ts
+
+
+class ResultsTable:
+    """Results as columns: one float column per metric (missing = NaN/None), country codes and a failed flag.
+
+    Row i is the i-th result in file order; selections are boolean masks over
+    the rows, made with mask() and consumed by order(), best_per_country()
+    and count_per_country().
+    """
+
+    def __init__(self, domains: Sequence[str], columns: Mapping[str, Sequence], countries: Sequence[Optional[str]],
+                 failed: Optional[Sequence[bool]] = None, records: Optional[Sequence[Mapping]] = None):
+        """
+        Args:
+            domains: Domain of each row
+            columns: Column name -> one value per row; None or non-numbers are missing
+            countries: Country of each row; None is grouped as 'Unknown'
+            failed: Whether each row's latest speedtest failed (default: none failed)
+            records: Source record of each row, for building responses
+        """
+        self.domains = list(domains)
+        self.records = list(records) if records is not None else None
+        self.size = len(self.domains)
+        self.np = np = _numpy() if self.size >= NUMPY_MIN_ROWS else None
+        codes: Dict[str, int] = {}
+        country_codes = [codes.setdefault(country or 'Unknown', len(codes)) for country in countries]
+        self.countries = list(codes)
+        self._folded = [country.lower() for country in self.countries]
+        failed = [bool(f) for f in failed] if failed is not None else [False] * self.size
+        if np is not None:
+            self.country_codes = np.array(country_codes, dtype=np.intp)
+            self.failed = np.array(failed, dtype=bool)
+            self.columns = {name: self._array(values) for name, values in columns.items()}
+        else:
+            self.country_codes = country_codes
+            self.failed = failed
+            self.columns = {name: [_number(v) for v in values] for name, values in columns.items()}
+
+    def _array(self, values: Sequence):
+        np = self.np
+        try:
+            return np.array(values, dtype=float)  # None -> NaN
+        except (TypeError, ValueError):
+            return np.array([_number(v) for v in values], dtype=float)
+
+    @classmethod
+    def from_results(cls, results: Mapping[str, Mapping]) -> 'ResultsTable':
+        """Table of {domain: result} *results* with NUMERIC and TIMESTAMPS columns."""
+        records = list(results.values())
+        columns = {name: [record.get(name) for record in records] for name in NUMERIC}
+        for name in TIMESTAMPS:
+            columns[name] = [_epoch(record.get(name)) for record in records]
+        return cls(list(results), columns, [record.get('country') for record in records],
+                   failed=[recently_failed(record) for record in records], records=records)
+
+    # -- selections -----------------------------------------------------------
+
+    def mask(self, rows: Optional[Iterable[int]] = None, countries: Optional[Set[str]] = None,
+             include_failed: bool = True, present: Sequence[str] = (), positive: Sequence[str] = (),
+             ranges: Optional[Mapping[str, Tuple[float, float]]] = None):
+        """Rows matching every given condition.
+
+        Args:
+            rows: Only these row numbers
+            countries: Lower-case country names to keep
+            include_failed: Keep rows whose latest speedtest failed
+            present: Columns that must have a value
+            positive: Columns that must be > 0
+            ranges: Column -> (low, high), inclusive
+        """
+        np = self.np
+        if np is not None:
+            mask = np.ones(self.size, dtype=bool)
+            if rows is not None:
+                mask[:] = False
+                mask[np.fromiter(rows, dtype=np.intp)] = True
+            if countries is not None:
+                wanted = [code for code, name in enumerate(self._folded) if name in countries]
+                mask &= np.isin(self.country_codes, wanted)
+            if not include_failed:
+                mask &= ~self.failed
+            for name in present:
+                mask &= ~np.isnan(self.columns[name])
+            with np.errstate(invalid='ignore'):
+                for name in positive:
+                    mask &= self.columns[name] > 0
+                for name, (low, high) in (ranges or {}).items():
+                    column = self.columns[name]
+                    mask &= (column >= low) & (column <= high)
+            return mask
+
+        if rows is not None:
+            mask = [False] * self.size
+            for i in rows:
+                mask[i] = True
+        else:
+            mask = [True] * self.size
+        if countries is not None:
+            wanted = {code for code, name in enumerate(self._folded) if name in countries}
+            mask = [m and code in wanted for m, code in zip(mask, self.country_codes)]
+        if not include_failed:
+            mask = [m and not f for m, f in zip(mask, self.failed)]
+        for name in present:
+            mask = [m and v is not None for m, v in zip(mask, self.columns[name])]
+        for name in positive:
+            mask = [m and v is not None and v > 0 for m, v in zip(mask, self.columns[name])]
+        for name, (low, high) in (ranges or {}).items():
+            mask = [m and v is not None and low <= v <= high for m, v in zip(mask, self.columns[name])]
+        return mask
+
+    def rows(self, mask) -> List[int]:
+        """Row numbers selected by *mask*, in file order."""
+        if self.np is not None:
+            return self.np.flatnonzero(mask).tolist()
+        return [i for i, m in enumerate(mask) if m]
+
+    # -- rankings and groups ----------------------------------------------------
+
+    def order(self, column: str, mask, descending: bool = False, missing: float = 0.0) -> List[int]:
+        """Selected row numbers sorted by *column*; missing values sort as *missing*, ties keep file order."""
+        np = self.np
+        if np is not None:
+            rows = np.flatnonzero(mask)
+            values = self.columns[column][rows]
+            values = np.where(np.isnan(values), missing, values)
+            return rows[np.argsort(-values if descending else values, kind='stable')].tolist()
+        values = self.columns[column]
+        rows = self.rows(mask)
+        rows.sort(key=lambda i: missing if values[i] is None else values[i], reverse=descending)
+        return rows
+
+    def best_per_country(self, column: str, mask, highest: bool = True) -> List[int]:
+        """Row with the highest (or lowest) *column* value per country among the selected rows.
+
+        Rows with a missing value are skipped and the first row wins a tie.
+        Countries come in the order of their first selected row.
+        """
+        np = self.np
+        if np is not None:
+            rows = np.flatnonzero(mask & ~np.isnan(self.columns[column]))
+            if not len(rows):
+                return []
+            values = self.columns[column][rows]
+            codes = self.country_codes[rows]
+            # Best value per country, then the first row reaching it
+            best_value = np.full(len(self.countries), -np.inf if highest else np.inf)
+            (np.maximum if highest else np.minimum).at(best_value, codes, values)
+            hits = np.flatnonzero(values == best_value[codes])
+            _, first_hit = np.unique(codes[hits], return_index=True)
+            best = hits[first_hit]
+            # Countries in the order of their first selected row
+            return rows[best[np.argsort(np.unique(codes, return_index=True)[1])]].tolist()
+        values = self.columns[column]
+        best: Dict[int, int] = {}
+        for i in self.rows(mask):
+            value = values[i]
+            if value is None:
+                continue
+            code = self.country_codes[i]
+            current = best.get(code)
+            if current is None or (value > values[current] if highest else value < values[current]):
+                best[code] = i
+        return list(best.values())
+
+    def count_per_country(self, mask) -> List[int]:
+        """Number of selected rows per country code."""
+        np = self.np
+        if np is not None:
+            return np.bincount(self.country_codes[mask], minlength=len(self.countries)).tolist()
+        counts = [0] * len(self.countries)
+        for code, m in zip(self.country_codes, mask):
+            if m:
+                counts[code] += 1
+        return counts
+
+    def any(self, mask) -> bool:
+        return bool(mask.any()) if self.np is not None else any(mask)
+
+    def value(self, column: str, row: int) -> Optional[float]:
+        value = self.columns[column][row]
+        if self.np is not None:
+            return None if math.isnan(value) else float(value)
+        return value
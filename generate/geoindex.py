@@ -0,0 +1,92 @@
+"""Hierarchical country -> city -> servers index over normalized result rows.
+
+Rows are grouped once and every (country, city) node gets a summary at
+build time; country roll-ups merge their city summaries, so no query level
+rescans the rows. Cities are keyed by (country, city), so equally named
+cities in different countries (and every 'Unknown') stay apart.
+"""
+
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Row positions, as in generate.report.ROW_FIELDS
+_DOMAIN, _LATENCY, _COUNTRY, _CITY, _RX = 0, 1, 3, 4, 5
+
+
+def _summarize(rows: Sequence[Tuple], row_ids: List[int]) -> Dict:
+    best_latency = best_download = None
+    latency_server = download_server = None
+    for i in row_ids:
+        row = rows[i]
+        latency, rx = row[_LATENCY], row[_RX]
+        if latency and latency > 0 and (best_latency is None or latency < best_latency):
+            best_latency, latency_server = latency, row[_DOMAIN]
+        if rx and rx > 0 and (best_download is None or rx > best_download):
+            best_download, download_server = rx, row[_DOMAIN]
+    return {'servers': len(row_ids),
+            'best_latency': best_latency, 'best_latency_server': latency_server,
+            'best_download': best_download, 'best_download_server': download_server}
+
+
+def _merge(summaries: List[Dict]) -> Dict:
+    merged = {'servers': sum(s['servers'] for s in summaries),
+              'best_latency': None, 'best_latency_server': None,
+              'best_download': None, 'best_download_server': None}
+    for s in summaries:
+        if s['best_latency'] is not None and (merged['best_latency'] is None or s['best_latency'] < merged['best_latency']):
+            merged['best_latency'], merged['best_latency_server'] = s['best_latency'], s['best_latency_server']
+        if s['best_download'] is not None and (merged['best_download'] is None or s['best_download'] > merged['best_download']):
+            merged['best_download'], merged['best_download_server'] = s['best_download'], s['best_download_server']
+    return merged
+
+
+class GeoIndex:
+    """Country -> city -> row numbers, with per-node summaries (servers, best latency/download)."""
+
+    def __init__(self, rows: Sequence[Tuple]):
+        self.rows = rows
+        self.tree: Dict[str, Dict[str, List[int]]] = {}
+        for i, row in enumerate(rows):
+            self.tree.setdefault(row[_COUNTRY], {}).setdefault(row[_CITY], []).append(i)
+        self._city_summaries = {(country, city): _summarize(rows, row_ids)
+                                for country, cities in self.tree.items() for city, row_ids in cities.items()}
+        self._country_summaries = {country: _merge([self._city_summaries[(country, city)] for city in cities])
+                                   for country, cities in self.tree.items()}
+
+    def city_groups(self) -> Iterator[Tuple[str, str, List[int]]]:
+        """(country, city, row numbers) for every city node."""
+        for country, cities in self.tree.items():
+            for city, row_ids in cities.items():
+                yield country, city, row_ids
+
+    def find_country(self, name: str) -> Optional[str]:
+        """Stored spelling of *name* (case-insensitive exact match), or None."""
+        if name in self.tree:
+            return name
+        folded = name.casefold()
+        return next((country for country in self.tree if country.casefold() == folded), None)
+
+    def find_city(self, country: str, name: str) -> Optional[str]:
+        cities = self.tree.get(country, {})
+        if name in cities:
+            return name
+        folded = name.casefold()
+        return next((city for city in cities if city.casefold() == folded), None)
+
+    def countries(self) -> List[Dict]:
+        """Roll-up per country: {country, cities, servers, best_latency(_server), best_download(_server)}."""
+        return [{'country': country, 'cities': len(self.tree[country]), **summary}
+                for country, summary in self._country_summaries.items()]
+
+    def cities(self, country: str) -> Optional[List[Dict]]:
+        """Drill-down into *country*: one summary per city, or None if the country is unknown."""
+        if country not in self.tree:
+            return None
+        return [{'country': country, 'city': city, **self._city_summaries[(country, city)]}
+                for city in self.tree[country]]
+
+    def servers(self, country: str, city: str) -> Optional[List[Tuple]]:
+        """Rows of the servers in (*country*, *city*), or None if there is no such city."""
+        row_ids = self.tree.get(country, {}).get(city)
+        if row_ids is None:
+            return None
+        return [self.rows[i] for i in row_ids]
@@ -0,0 +1,121 @@
+"""Process-wide registry of GeoIP database readers with hot swap.
+
+Readers are opened once per database path and shared. Callers hold a reader
+through a lease. If the file on disk is replaced (new inode, size or mtime,
+e.g. after os.replace by a GeoLite update), the next lease opens the new
+database. The old reader is closed once its last lease is released, so
+lookups already in flight finish against the database they started with.
+Each worker process notices the swap on its own on its next lease.
+"""
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import geoip2.database
+
+logger = logging.getLogger(__name__)
+
+
+class _Handle:
+    __slots__ = ('reader', 'key', 'refs', 'retired')
+
+    def __init__(self, reader, key):
+        self.reader = reader
+        self.key = key
+        self.refs = 0
+        self.retired = False
+
+
+def _file_key(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class ReaderRegistry:
+    """Shared, reference-counted GeoIP readers keyed by database path."""
+
+    def __init__(self):
+        self._handles: Dict[str, _Handle] = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, path: str) -> _Handle:
+        key = _file_key(path)
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is not None and handle.key == key:
+                handle.refs += 1
+                return handle
+        # Open outside the lock; a slow open must not block lookups on other databases
+        reader = geoip2.database.Reader(path)
+        with self._lock:
+            current = self._handles.get(path)
+            if current is not None and current.key == key:
+                # Another thread opened the same file meanwhile
+                reader.close()
+                current.refs += 1
+                return current
+            if current is not None:
+                self._retire(current)
+                logger.info(f"GeoIP database {os.path.basename(path)} changed on disk, swapping reader")
+            handle = _Handle(reader, key)
+            handle.refs = 1
+            self._handles[path] = handle
+            return handle
+
+    def _release(self, handle: _Handle) -> None:
+        with self._lock:
+            handle.refs -= 1
+            close = handle.retired and handle.refs == 0
+        if close:
+            handle.reader.close()
+
+    def _retire(self, handle: _Handle) -> None:
+        # Caller holds self._lock
+        handle.retired = True
+        if handle.refs == 0:
+            handle.reader.close()
+
+    @contextmanager
+    def lease(self, path: str):
+        """Yield the current reader for *path*, opening or swapping it as needed.
+
+        Raises:
+            FileNotFoundError / maxminddb.InvalidDatabaseError: from opening the database
+        """
+        handle = self._acquire(os.path.abspath(path))
+        try:
+            yield handle.reader
+        finally:
+            self._release(handle)
+
+    def invalidate(self, path: str) -> None:
+        """Drop the cached reader for *path*; the next lease reopens the file."""
+        with self._lock:
+            handle = self._handles.pop(os.path.abspath(path), None)
+            if handle is not None:
+                self._retire(handle)
+
+    def close_all(self) -> None:
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+            for handle in handles:
+                self._retire(handle)
+
+
+registry = ReaderRegistry()
+
+
+def lease(path: str):
+    """Lease a reader from the process-wide registry (see ReaderRegistry.lease)."""
+    return registry.lease(path)
+
+
+def invalidate(path: str) -> None:
+    registry.invalidate(path)
@@ -0,0 +1,124 @@
+"""Negative cache of scan targets that failed, with exponential re-check back-off.
+
+A target that fails to resolve or answer is not scanned again until its
+back-off expires; the back-off doubles with every consecutive failure and
+is cleared by the first success. The input servers list is never edited.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_HOURS = 1.0
+MAX_BACKOFF_HOURS = 7 * 24
+
+
+def _parse_ts(value) -> Optional[datetime]:
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+class NegativeCache:
+    """Failed targets persisted as JSON: {domain: {failures, first_failed, last_failed, retry_at}}."""
+
+    def __init__(self, path: str, backoff_hours: float = BACKOFF_HOURS,
+                 max_backoff_hours: float = MAX_BACKOFF_HOURS):
+        """
+        Args:
+            path: JSON file holding the cache
+            backoff_hours: Back-off after the first failure; doubles per consecutive failure
+            max_backoff_hours: Upper bound on a single back-off
+        """
+        self.path = path
+        self.backoff_hours = max(0.0, float(backoff_hours))
+        self.max_backoff_hours = float(max_backoff_hours)
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self, entries: Dict[str, Dict]) -> None:
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def backoff(self, failures: int) -> float:
+        """Back-off in hours after *failures* consecutive failures."""
+        return min(self.max_backoff_hours, self.backoff_hours * 2 ** (max(1, failures) - 1))
+
+    def partition(self, domains: Iterable[str], now: Optional[datetime] = None) -> Tuple[List[str], List[str]]:
+        """Split *domains* into (due, suppressed); suppressed ones are still in back-off."""
+        now = now or datetime.now(timezone.utc)
+        entries = self.load()
+        due, suppressed = [], []
+        for domain in domains:
+            entry = entries.get(domain)
+            retry_at = _parse_ts(entry.get('retry_at')) if isinstance(entry, dict) else None
+            (suppressed if retry_at and retry_at > now else due).append(domain)
+        return due, suppressed
+
+    def update(self, failed: Iterable[str], succeeded: Iterable[str], now: Optional[datetime] = None) -> Dict[str, Dict]:
+        """Record one scan's outcome: extend back-off of *failed*, forget *succeeded*.
+
+        Returns:
+            The updated cache
+        """
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            entries = self.load()
+            changed = False
+            for domain in succeeded:
+                if entries.pop(domain, None) is not None:
+                    changed = True
+            for domain in failed:
+                entry = entries.get(domain) if isinstance(entries.get(domain), dict) else {}
+                failures = entry.get('failures', 0) + 1
+                entries[domain] = {
+                    'failures': failures,
+                    'first_failed': entry.get('first_failed') or now.isoformat(),
+                    'last_failed': now.isoformat(),
+                    'retry_at': (now + timedelta(hours=self.backoff(failures))).isoformat(),
+                }
+                changed = True
+            if changed:
+                self._save(entries)
+        return entries
+
+    def clear(self, domains: Optional[Iterable[str]] = None) -> int:
+        """Forget *domains* (all if None) so the next scan re-checks them. Returns the number removed."""
+        with self._lock:
+            entries = self.load()
+            if domains is None:
+                removed = len(entries)
+                entries = {}
+            else:
+                removed = sum(entries.pop(domain, None) is not None for domain in set(domains))
+            if removed:
+                self._save(entries)
+        return removed
+
+    def status(self, now: Optional[datetime] = None) -> List[Dict]:
+        """Cached failures, soonest re-check first, each with a 'suppressed' flag."""
+        now = now or datetime.now(timezone.utc)
+        rows = []
+        for domain, entry in self.load().items():
+            if not isinstance(entry, dict):
+                continue
+            retry_at = _parse_ts(entry.get('retry_at'))
+            rows.append({'domain': domain, **entry, 'suppressed': bool(retry_at and retry_at > now)})
+        rows.sort(key=lambda row: (row.get('retry_at') or '', row['domain']))
+        return rows
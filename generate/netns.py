@@ -0,0 +1,101 @@
+"""Linux network namespaces for running isolated OpenVPN tunnels side by side."""
+
+import os
+import subprocess
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+NETNS_PREFIX = "gipa"
+NETNS_SUBNET_BASE = "10.231"
+NETNS_DNS = os.environ.get('NETNS_DNS', '1.1.1.1')
+
+
+def _run(cmd: List[str]) -> Optional[subprocess.CompletedProcess]:
+    """Run a setup command, returning None if the binary is not installed."""
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True)
+    except FileNotFoundError:
+        logger.debug(f"{cmd[0]} not found in PATH")
+        return None
+
+
+class NetNamespace:
+    """A network namespace connected to the host through a NATed veth pair.
+
+    Each slot gets its own namespace, veth pair and /30 subnet, so the tun
+    device and routes OpenVPN creates inside it never touch the host routing
+    table or the tunnels running in other slots.
+    """
+
+    def __init__(self, slot: int, dns: str = NETNS_DNS):
+        if not 0 <= slot <= 255:
+            raise ValueError(f"Namespace slot must be 0-255, got {slot}")
+        self.slot = slot
+        self.name = f"{NETNS_PREFIX}{slot}"
+        self.host_if = f"{self.name}h"
+        self.ns_if = f"{self.name}n"
+        self.host_ip = f"{NETNS_SUBNET_BASE}.{slot}.1"
+        self.ns_ip = f"{NETNS_SUBNET_BASE}.{slot}.2"
+        self.subnet = f"{NETNS_SUBNET_BASE}.{slot}.0/30"
+        self.dns = dns
+        self.created = False
+
+    def wrap(self, cmd: List[str]) -> List[str]:
+        """Return *cmd* prefixed so it runs inside this namespace."""
+        return ["ip", "netns", "exec", self.name] + list(cmd)
+
+    def create(self) -> bool:
+        """Create the namespace, veth pair, default route and NAT rule."""
+        self.destroy()
+        steps = [
+            ["ip", "netns", "add", self.name],
+            ["ip", "link", "add", self.host_if, "type", "veth", "peer", "name", self.ns_if],
+            ["ip", "link", "set", self.ns_if, "netns", self.name],
+            ["ip", "addr", "add", f"{self.host_ip}/30", "dev", self.host_if],
+            ["ip", "link", "set", self.host_if, "up"],
+            self.wrap(["ip", "addr", "add", f"{self.ns_ip}/30", "dev", self.ns_if]),
+            self.wrap(["ip", "link", "set", self.ns_if, "up"]),
+            self.wrap(["ip", "link", "set", "lo", "up"]),
+            self.wrap(["ip", "route", "add", "default", "via", self.host_ip]),
+        ]
+        try:
+            for cmd in steps:
+                result = _run(cmd)
+                if result is None or result.returncode != 0:
+                    err = result.stderr.strip() if result is not None else 'command not found'
+                    logger.error(f"Namespace {self.name} setup failed at '{' '.join(cmd)}': {err}")
+                    self.destroy()
+                    return False
+            _run(["sysctl", "-qw", "net.ipv4.ip_forward=1"])
+            _run(
+                ["iptables", "-t", "nat", "-A", "POSTROUTING", "-s", self.subnet,
+                 "!", "-o", self.host_if, "-j", "MASQUERADE"]
+            )
+            # `ip netns exec` bind-mounts this over /etc/resolv.conf inside the namespace
+            resolv_dir = Path("/etc/netns") / self.name
+            resolv_dir.mkdir(parents=True, exist_ok=True)
+            (resolv_dir / "resolv.conf").write_text(f"nameserver {self.dns}\n")
+        except Exception as e:
+            logger.error(f"Namespace {self.name} setup failed: {e}")
+            self.destroy()
+            return False
+        self.created = True
+        return True
+
+    def destroy(self) -> None:
+        """Remove the namespace (its veth peer goes with it) and the NAT rule."""
+        try:
+            _run(["iptables", "-t", "nat", "-D", "POSTROUTING", "-s", self.subnet,
+                  "!", "-o", self.host_if, "-j", "MASQUERADE"])
+            _run(["ip", "netns", "del", self.name])
+            _run(["ip", "link", "del", self.host_if])
+            resolv = Path("/etc/netns") / self.name / "resolv.conf"
+            if resolv.exists():
+                resolv.unlink()
+                resolv.parent.rmdir()
+        except Exception as e:
+            logger.warning(f"Namespace {self.name} cleanup failed: {e}")
+        self.created = False
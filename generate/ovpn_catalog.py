@@ -0,0 +1,336 @@
+"""Persisted index of OpenVPN config files with parsed remotes.
+
+The catalog lives beside the config directory (``<parent>/.<ovpn_dir name>.catalog.json``),
+not inside it, so saving it does not change the directory mtime that
+is_stale() watches. It is refreshed when configs are uploaded or downloaded,
+or when is_stale() sees a file added, removed or edited in place; both only
+stat the directory and its files, and files whose size and mtime are
+unchanged are never re-read.
+apply_zip() syncs the directory with a provider bundle by content hash.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SUFFIX = '.catalog.json'
+# Catalog file inside the config directory, as written by older versions
+LEGACY_CATALOG_FILENAME = '.catalog.json'
+CATALOG_VERSION = 1
+# Preferred config when a domain has several (the speedtest uses UDP configs)
+PROTO_PREFERENCE = {'udp': 0, 'tcp': 1, '': 2}
+# Timestamps this close to the last refresh may hide a later write in the same
+# filesystem clock tick, so they are not trusted (same idea as git's racy index)
+RACY_WINDOW_NS = 2_000_000_000
+COPY_CHUNK = 1024 * 1024
+
+
+def domain_from_filename(filename: str):
+    """Split "ad1.nordvpn.com.udp.ovpn" into ("ad1.nordvpn.com", "udp")."""
+    stem = filename[:-len('.ovpn')] if filename.endswith('.ovpn') else filename
+    if stem.endswith('.udp') or stem.endswith('.tcp'):
+        domain, proto = stem.rsplit('.', 1)
+        return domain, proto
+    return stem, ''
+
+
+def parse_ovpn(text: str) -> Dict:
+    """Extract protocol, remotes, cipher and TLS options from config text."""
+    info = {'proto': None, 'remotes': [], 'cipher': None, 'auth': None,
+            'tls_auth': False, 'tls_crypt': False, 'key_direction': None}
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line or line[0] in '#;':
+            continue
+        if line.startswith('<'):
+            tag = line.strip('<>/')
+            if tag == 'tls-auth':
+                info['tls_auth'] = True
+            elif tag in ('tls-crypt', 'tls-crypt-v2'):
+                info['tls_crypt'] = True
+            continue
+        parts = line.split()
+        key, args = parts[0], parts[1:]
+        if key == 'proto' and args:
+            info['proto'] = args[0].replace('-client', '')
+        elif key == 'remote' and args:
+            remote = {'host': args[0], 'port': int(args[1]) if len(args) > 1 and args[1].isdigit() else 1194}
+            if len(args) > 2:
+                remote['proto'] = args[2]
+            info['remotes'].append(remote)
+        elif key == 'cipher' and args:
+            info['cipher'] = args[0]
+        elif key == 'data-ciphers' and args and not info['cipher']:
+            info['cipher'] = args[0].split(':')[0]
+        elif key == 'auth' and args:
+            info['auth'] = args[0]
+        elif key == 'tls-auth':
+            info['tls_auth'] = True
+            if len(args) > 1:
+                info['key_direction'] = args[1]
+        elif key in ('tls-crypt', 'tls-crypt-v2'):
+            info['tls_crypt'] = True
+        elif key == 'key-direction' and args:
+            info['key_direction'] = args[0]
+    return info
+
+
+class OvpnCatalog:
+    """Domain-indexed catalog of the configs in one directory."""
+
+    def __init__(self, ovpn_dir: str):
+        self.ovpn_dir = os.path.abspath(ovpn_dir)
+        self.path = os.path.join(os.path.dirname(self.ovpn_dir),
+                                 '.' + os.path.basename(self.ovpn_dir) + CATALOG_SUFFIX)
+        self.files: Dict[str, Dict] = {}  # filename -> record
+        self.by_domain: Dict[str, Dict] = {}  # domain -> preferred record
+        self.dir_mtime_ns: Optional[int] = None
+        self.refreshed_ns = 0
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Load the persisted catalog. Returns False if missing, stale-format or unreadable."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(data, dict) or data.get('version') != CATALOG_VERSION:
+            return False
+        self.files = data.get('files', {})
+        self.dir_mtime_ns = data.get('dir_mtime_ns')
+        self.refreshed_ns = data.get('refreshed_ns', 0)
+        self._rebuild_index()
+        return True
+
+    def save(self) -> None:
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': CATALOG_VERSION, 'dir_mtime_ns': self.dir_mtime_ns,
+                       'refreshed_ns': self.refreshed_ns, 'files': self.files}, f)
+        os.replace(tmp, self.path)
+
+    def _rebuild_index(self) -> None:
+        by_domain = {}
+        for record in self.files.values():
+            current = by_domain.get(record['domain'])
+            if current is None or PROTO_PREFERENCE.get(record['name_proto'], 2) < PROTO_PREFERENCE.get(current['name_proto'], 2):
+                by_domain[record['domain']] = record
+        self.by_domain = by_domain
+
+    def _index_file(self, filename: str, st: os.stat_result) -> Dict:
+        with open(os.path.join(self.ovpn_dir, filename), 'rb') as f:
+            raw = f.read()
+        domain, name_proto = domain_from_filename(filename)
+        info = parse_ovpn(raw.decode('utf-8', errors='replace'))
+        first = info['remotes'][0] if info['remotes'] else {}
+        return {
+            'file': filename,
+            'domain': domain,
+            'name_proto': name_proto,
+            'proto': info['proto'] or first.get('proto') or name_proto or None,
+            'remote': first.get('host'),
+            'port': first.get('port'),
+            'remotes': info['remotes'],
+            'cipher': info['cipher'],
+            'auth': info['auth'],
+            'tls_auth': info['tls_auth'],
+            'tls_crypt': info['tls_crypt'],
+            'key_direction': info['key_direction'],
+            'sha256': hashlib.sha256(raw).hexdigest(),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+        }
+
+    def refresh(self) -> Dict[str, List[str]]:
+        """Re-index the directory, reading only new or modified files.
+
+        Returns:
+            Dict of 'added', 'changed' and 'removed' filename lists
+        """
+        with self._lock:
+            changes = {'added': [], 'changed': [], 'removed': []}
+            if not os.path.isdir(self.ovpn_dir):
+                changes['removed'] = sorted(self.files)
+                self.files, self.by_domain, self.dir_mtime_ns = {}, {}, None
+                return changes
+            try:
+                os.unlink(os.path.join(self.ovpn_dir, LEGACY_CATALOG_FILENAME))
+            except OSError:
+                pass
+            refreshed_ns = time.time_ns()
+            dir_mtime_ns = os.stat(self.ovpn_dir).st_mtime_ns
+            trusted_before = self.refreshed_ns - RACY_WINDOW_NS
+            seen = set()
+            files = {}
+            with os.scandir(self.ovpn_dir) as it:
+                for de in it:
+                    if not de.name.endswith('.ovpn') or not de.is_file():
+                        continue
+                    seen.add(de.name)
+                    st = de.stat()
+                    old = self.files.get(de.name)
+                    if (old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns
+                            and old['mtime_ns'] < trusted_before):
+                        files[de.name] = old
+                        continue
+                    try:
+                        files[de.name] = self._index_file(de.name, st)
+                    except OSError as e:
+                        logger.warning(f"Could not index {de.name}: {e}")
+                        continue
+                    if old is None:
+                        changes['added'].append(de.name)
+                    elif old['sha256'] != files[de.name]['sha256']:
+                        changes['changed'].append(de.name)
+            changes['removed'] = sorted(set(self.files) - seen)
+            self.files = files
+            self.dir_mtime_ns = dir_mtime_ns
+            self.refreshed_ns = refreshed_ns
+            self._rebuild_index()
+            try:
+                self.save()
+            except OSError as e:
+                logger.warning(f"Could not persist OVPN catalog: {e}")
+            if any(changes.values()):
+                logger.info(f"OVPN catalog: {len(files)} configs ({len(changes['added'])} added, "
+                            f"{len(changes['changed'])} changed, {len(changes['removed'])} removed)")
+            return changes
+
+    def is_stale(self) -> bool:
+        """True if files were added, removed or modified since the last refresh.
+
+        Stats the directory (added/removed files) and every indexed file, whose
+        size and mtime must still match the catalog (edits in place).
+        """
+        try:
+            dir_mtime_ns = os.stat(self.ovpn_dir).st_mtime_ns
+        except OSError:
+            return bool(self.files)
+        trusted_before = self.refreshed_ns - RACY_WINDOW_NS
+        if dir_mtime_ns != self.dir_mtime_ns or dir_mtime_ns >= trusted_before:
+            return True
+        for filename, record in self.files.items():
+            try:
+                st = os.stat(os.path.join(self.ovpn_dir, filename))
+            except OSError:
+                return True
+            if (st.st_size != record['size'] or st.st_mtime_ns != record['mtime_ns']
+                    or st.st_mtime_ns >= trusted_before):
+                return True
+        return False
+
+    def get(self, domain: str) -> Optional[Dict]:
+        return self.by_domain.get(domain)
+
+    def path_for(self, domain: str) -> Optional[str]:
+        record = self.by_domain.get(domain)
+        return os.path.join(self.ovpn_dir, record['file']) if record else None
+
+    def domain_files(self) -> Dict[str, str]:
+        """Map every indexed domain to its preferred config path."""
+        return {domain: os.path.join(self.ovpn_dir, record['file']) for domain, record in self.by_domain.items()}
+
+    def status(self) -> Dict:
+        mtimes = [r['mtime_ns'] for r in self.files.values()]
+        return {'count': len(self.files), 'newest_mtime': max(mtimes) / 1e9 if mtimes else None}
+
+
+_catalogs: Dict[str, OvpnCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(ovpn_dir: str, refresh: bool = False) -> OvpnCatalog:
+    """Shared catalog for *ovpn_dir*, loaded from disk once per process.
+
+    The catalog is re-indexed when *refresh* is set, when nothing was persisted
+    yet, or when files were added, removed or edited behind its back.
+    """
+    key = os.path.abspath(ovpn_dir)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = OvpnCatalog(key)
+            if not catalog.load():
+                refresh = True
+            _catalogs[key] = catalog
+    if refresh or catalog.is_stale():
+        catalog.refresh()
+    return catalog
+
+
+def is_udp_config(filename: str) -> bool:
+    """Bundle members extracted by default: the UDP configs the speedtest uses."""
+    lower = filename.lower()
+    return lower.endswith('.ovpn') and 'udp' in lower
+
+
+def _hash_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    digest = hashlib.sha256()
+    with zf.open(info) as src:
+        for chunk in iter(lambda: src.read(COPY_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def apply_zip(zip_path: str, ovpn_dir: str, select=is_udp_config) -> Dict:
+    """Sync *ovpn_dir* with the configs in a zip bundle, touching only what changed.
+
+    Members are hashed while decompressing and compared to the catalog, so
+    unchanged configs are neither rewritten nor re-indexed. Configs missing
+    from the bundle are removed.
+
+    Args:
+        zip_path: Path of the zip file (streamed, never loaded into memory)
+        ovpn_dir: Config directory to update
+        select: Predicate on member basenames choosing which configs to keep
+
+    Returns:
+        Dict with 'count' (configs in the bundle), 'added', 'changed' and
+        'removed' filename lists and the 'unchanged' count
+
+    Raises:
+        ValueError: If a member path is absolute or contains '..'
+        zipfile.BadZipFile: If the file is not a zip
+    """
+    with zipfile.ZipFile(zip_path) as zf:
+        members = zf.infolist()
+        for info in members:
+            if os.path.isabs(info.filename) or '..' in info.filename:
+                raise ValueError(f'Invalid path in zip: {info.filename}')
+        wanted = {}
+        for info in members:
+            basename = os.path.basename(info.filename)
+            if not info.is_dir() and select(basename):
+                wanted[basename] = info
+
+        os.makedirs(ovpn_dir, exist_ok=True)
+        catalog = get_catalog(ovpn_dir, refresh=True)
+        changes = {'count': len(wanted), 'added': [], 'changed': [], 'removed': [], 'unchanged': 0}
+        for basename, info in sorted(wanted.items()):
+            old = catalog.files.get(basename)
+            if old and old['sha256'] == _hash_member(zf, info):
+                changes['unchanged'] += 1
+                continue
+            target = os.path.join(catalog.ovpn_dir, basename)
+            with zf.open(info) as src, open(target + '.part', 'wb') as dst:
+                for chunk in iter(lambda: src.read(COPY_CHUNK), b''):
+                    dst.write(chunk)
+            os.replace(target + '.part', target)
+            changes['changed' if old else 'added'].append(basename)
+
+    for filename in sorted(set(catalog.files) - set(wanted)):
+        try:
+            os.unlink(os.path.join(catalog.ovpn_dir, filename))
+        except FileNotFoundError:
+            pass
+        changes['removed'].append(filename)
+    catalog.refresh()
+    return changes
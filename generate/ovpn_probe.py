@@ -0,0 +1,322 @@
+"""OpenVPN handshake-RTT probe: one control-channel reset, no tunnel.
+
+The probe reads the remote, protocol and tls-auth key from a config and sends a
+P_CONTROL_HARD_RESET_CLIENT_V2 packet. The time until the server answers with
+P_CONTROL_HARD_RESET_SERVER_V2 is the handshake RTT. With tls-auth the packet
+carries a valid HMAC, because servers silently drop unauthenticated resets.
+tls-crypt wraps the packet in an encrypted envelope and is not supported.
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from generate.ovpn_catalog import get_catalog, parse_ovpn
+
+logger = logging.getLogger(__name__)
+
+P_CONTROL_HARD_RESET_CLIENT_V2 = 7
+P_CONTROL_HARD_RESET_SERVER_V2 = 8
+STATIC_KEY_BYTES = 256  # Four 64-byte slots: cipher/hmac for each direction
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_WORKERS = 64
+
+# Probe statuses
+OK = 'ok'
+TIMEOUT = 'timeout'
+REFUSED = 'refused'
+RESOLVE_FAILED = 'resolve_failed'
+UNEXPECTED = 'unexpected'
+UNSUPPORTED = 'unsupported'
+ERROR = 'error'
+
+
+def _inline_block(text: str, tag: str) -> Optional[str]:
+    start, end = text.find(f'<{tag}>'), text.find(f'</{tag}>')
+    if start == -1 or end == -1:
+        return None
+    return text[start + len(tag) + 2:end]
+
+
+def parse_static_key(text: str) -> bytes:
+    """Decode an "OpenVPN Static key V1" block (hex lines between the markers)."""
+    lines = [line.strip() for line in text.splitlines()]
+    try:
+        body = lines[lines.index('-----BEGIN OpenVPN Static key V1-----') + 1:
+                     lines.index('-----END OpenVPN Static key V1-----')]
+    except ValueError:
+        raise ValueError("Not an OpenVPN static key")
+    key = bytes.fromhex(''.join(body))
+    if len(key) != STATIC_KEY_BYTES:
+        raise ValueError(f"Static key is {len(key)} bytes, expected {STATIC_KEY_BYTES}")
+    return key
+
+
+def client_hmac_key(static_key: bytes, key_direction: Optional[str], digest: str = 'sha1') -> bytes:
+    """The HMAC key a client signs outgoing packets with.
+
+    key-direction 1 (the usual client side) sends with slot 1, no direction
+    uses slot 0 both ways. The key is truncated to the digest size.
+    """
+    slot = 1 if str(key_direction) == '1' else 0
+    offset = slot * 128 + 64
+    return static_key[offset:offset + hashlib.new(digest).digest_size]
+
+
+def build_reset_packet(session_id: bytes, hmac_key: Optional[bytes] = None, digest: str = 'sha1',
+                       packet_id: int = 1, now: Optional[int] = None) -> bytes:
+    """Build a HARD_RESET_CLIENT_V2 packet (key id 0, no ACKs, message id 0).
+
+    Wire layout with tls-auth: opcode | session id | HMAC | packet id | time | body.
+    The HMAC covers packet id | time | opcode | session id | body.
+    """
+    opcode = bytes([P_CONTROL_HARD_RESET_CLIENT_V2 << 3])
+    body = b'\x00' + struct.pack('!I', 0)
+    if hmac_key is None:
+        return opcode + session_id + body
+    replay = struct.pack('!II', packet_id, int(now if now is not None else time.time()))
+    mac = hmac.new(hmac_key, replay + opcode + session_id + body, digest).digest()
+    return opcode + session_id + mac + replay + body
+
+
+def load_probe_target(path: str) -> Dict:
+    """Read a config and return what the probe needs: host, port, proto and HMAC key."""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    info = parse_ovpn(text)
+    if not info['remotes']:
+        raise ValueError(f"No remote in {os.path.basename(path)}")
+    remote = info['remotes'][0]
+    proto = remote.get('proto') or info['proto'] or 'udp'
+    target = {'host': remote['host'], 'port': remote['port'], 'proto': 'tcp' if proto.startswith('tcp') else 'udp',
+              'digest': (info['auth'] or 'SHA1').lower().replace('-', ''), 'hmac_key': None,
+              'tls_crypt': info['tls_crypt']}
+    if info['tls_auth']:
+        block = _inline_block(text, 'tls-auth')
+        if block is not None:
+            target['hmac_key'] = client_hmac_key(parse_static_key(block), info['key_direction'], target['digest'])
+    return target
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionResetError("Connection closed by server")
+        data += chunk
+    return data
+
+
+def probe(host: str, port: int, proto: str = 'udp', hmac_key: Optional[bytes] = None, digest: str = 'sha1',
+          timeout: float = DEFAULT_TIMEOUT) -> Dict:
+    """Send one reset packet to host:port and time the server's reply.
+
+    Returns:
+        Dict with status (see module constants), rtt_ms (None unless ok),
+        host, ip, port and proto; TCP probes add connect_ms
+    """
+    result = {'status': ERROR, 'rtt_ms': None, 'host': host, 'ip': None, 'port': port, 'proto': proto}
+    family = socket.SOCK_STREAM if proto == 'tcp' else socket.SOCK_DGRAM
+    try:
+        addr = socket.getaddrinfo(host, port, socket.AF_INET, family)[0][4]
+    except (socket.gaierror, UnicodeError) as e:
+        result.update(status=RESOLVE_FAILED, error=str(e))
+        return result
+    result['ip'] = addr[0]
+    packet = build_reset_packet(os.urandom(8), hmac_key, digest)
+    sock = socket.socket(socket.AF_INET, family)
+    sock.settimeout(timeout)
+    try:
+        if proto == 'tcp':
+            start = time.perf_counter()
+            sock.connect(addr)
+            result['connect_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            start = time.perf_counter()
+            sock.sendall(struct.pack('!H', len(packet)) + packet)
+            length = struct.unpack('!H', _recv_exact(sock, 2))[0]
+            reply = _recv_exact(sock, min(length, 1)) if length else b''
+        else:
+            sock.connect(addr)
+            start = time.perf_counter()
+            sock.send(packet)
+            reply = sock.recv(2048)
+        rtt_ms = round((time.perf_counter() - start) * 1000, 2)
+    except socket.timeout:
+        result['status'] = TIMEOUT
+        return result
+    except ConnectionRefusedError:
+        result['status'] = REFUSED
+        return result
+    except OSError as e:
+        result['error'] = str(e)
+        return result
+    finally:
+        sock.close()
+    if reply and reply[0] >> 3 == P_CONTROL_HARD_RESET_SERVER_V2:
+        result.update(status=OK, rtt_ms=rtt_ms)
+    else:
+        result.update(status=UNEXPECTED, error=f"Unexpected reply opcode {reply[0] >> 3 if reply else None}")
+    return result
+
+
+def probe_config(path: str, timeout: float = DEFAULT_TIMEOUT) -> Dict:
+    """Probe the first remote of the config at *path*."""
+    try:
+        target = load_probe_target(path)
+    except (OSError, ValueError) as e:
+        return {'status': ERROR, 'rtt_ms': None, 'error': str(e)}
+    if target['tls_crypt']:
+        return {'status': UNSUPPORTED, 'rtt_ms': None, 'host': target['host'], 'port': target['port'],
+                'proto': target['proto'], 'error': 'tls-crypt configs cannot be probed'}
+    return probe(target['host'], target['port'], target['proto'], target['hmac_key'], target['digest'], timeout)
+
+
+def probe_many(configs: Dict[str, str], timeout: float = DEFAULT_TIMEOUT, workers: int = DEFAULT_WORKERS,
+               stop_event: Optional[threading.Event] = None) -> Dict[str, Dict]:
+    """Probe many configs concurrently.
+
+    Args:
+        configs: Mapping of domain to config path (e.g. OvpnCatalog.domain_files())
+        timeout: Per-probe reply timeout in seconds
+        workers: Probes in flight at once; each one mostly waits on the network
+        stop_event: Skips the remaining probes when set
+
+    Returns:
+        Mapping of domain to probe result
+    """
+    def run(path):
+        if stop_event is not None and stop_event.is_set():
+            return None
+        return probe_config(path, timeout)
+
+    domains = list(configs)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(domains) or 1))) as pool:
+        results = pool.map(run, [configs[d] for d in domains])
+        return {domain: result for domain, result in zip(domains, results) if result is not None}
+
+
+class LocalOvpnResponder:
+    """Minimal OpenVPN stand-in that answers reset packets (for tests).
+
+    Packets with a wrong HMAC are dropped, like a tls-auth server would.
+
+    Usage:
+        with LocalOvpnResponder(hmac_key=key) as responder:
+            probe('127.0.0.1', responder.port, hmac_key=key)
+    """
+
+    def __init__(self, proto: str = 'udp', hmac_key: Optional[bytes] = None, digest: str = 'sha1',
+                 delay: float = 0.0):
+        self.proto = proto
+        self.hmac_key = hmac_key
+        self.digest = digest
+        self.delay = delay
+        self.port = None
+        self.received = 0
+        self._sock = None
+        self._thread = None
+        self._closed = threading.Event()
+
+    def _accepts(self, packet: bytes) -> bool:
+        if not packet or packet[0] >> 3 != P_CONTROL_HARD_RESET_CLIENT_V2:
+            return False
+        if self.hmac_key is None:
+            return True
+        size = hashlib.new(self.digest).digest_size
+        opcode, session_id, mac = packet[:1], packet[1:9], packet[9:9 + size]
+        rest = packet[9 + size:]
+        expected = hmac.new(self.hmac_key, rest[:8] + opcode + session_id + rest[8:], self.digest).digest()
+        return hmac.compare_digest(mac, expected)
+
+    def _reply(self, packet: bytes) -> bytes:
+        self.received += 1
+        if self.delay:
+            time.sleep(self.delay)
+        # opcode | server session id | ACK of the client's message 0 | own message 0
+        return (bytes([P_CONTROL_HARD_RESET_SERVER_V2 << 3]) + os.urandom(8)
+                + b'\x01' + struct.pack('!I', 0) + packet[1:9] + struct.pack('!I', 0))
+
+    def _serve_udp(self):
+        while not self._closed.is_set():
+            try:
+                packet, addr = self._sock.recvfrom(2048)
+            except OSError:
+                return
+            if self._accepts(packet):
+                self._sock.sendto(self._reply(packet), addr)
+
+    def _serve_tcp(self):
+        while not self._closed.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    length = struct.unpack('!H', _recv_exact(conn, 2))[0]
+                    packet = _recv_exact(conn, length)
+                except (OSError, struct.error):
+                    continue
+                if self._accepts(packet):
+                    reply = self._reply(packet)
+                    conn.sendall(struct.pack('!H', len(reply)) + reply)
+
+    def __enter__(self):
+        kind = socket.SOCK_STREAM if self.proto == 'tcp' else socket.SOCK_DGRAM
+        self._sock = socket.socket(socket.AF_INET, kind)
+        self._sock.bind(('127.0.0.1', 0))
+        if self.proto == 'tcp':
+            self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+        target = self._serve_tcp if self.proto == 'tcp' else self._serve_udp
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._closed.set()
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        self._thread.join(timeout=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Probe OpenVPN endpoints with a single control-channel reset")
+    parser.add_argument('configs', nargs='+', help=".ovpn files or directories of them")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="Reply timeout in seconds")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Concurrent probes")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    configs = {}
+    for item in args.configs:
+        if os.path.isdir(item):
+            configs.update(get_catalog(item).domain_files())
+        else:
+            configs[os.path.basename(item)] = item
+    results = probe_many(configs, args.timeout, args.workers)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for domain, result in sorted(results.items(), key=lambda kv: kv[1]['rtt_ms'] or float('inf')):
+            rtt = f"{result['rtt_ms']:.1f} ms" if result['rtt_ms'] is not None else '-'
+            print(f"{domain:40} {result['status']:15} {rtt}")
+    return 0 if any(r['status'] == OK for r in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Speedtest planner: rank endpoints by expected value and enforce run budgets."""
+
+import logging
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER_DAYS = 7  # A result this old counts as fully stale
+COVERAGE_DECAY = 0.85  # Each further pick from the same country is worth this much less
+WEIGHTS = {'staleness': 0.45, 'variance': 0.30, 'latency': 0.25}
+DEFAULT_TEST_SECONDS = 30.0  # Assumed cost of one test before any have finished
+DEFAULT_TEST_BYTES = 150_000_000
+
+
+def _parse_ts(value) -> Optional[datetime]:
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def score_endpoint(entry, now: Optional[datetime] = None) -> float:
+    """Expected value of testing *entry* now, in [0, 1].
+
+    Combines low latency, staleness (never tested scores highest) and the
+    variability of past download results (unstable servers are worth re-testing).
+    """
+    now = now or datetime.now(timezone.utc)
+    latency = entry.get('latency_ms')
+    latency_score = 1 / (1 + latency / 100) if isinstance(latency, (int, float)) else 0.0
+
+    tested = _parse_ts(entry.get('speedtest_timestamp'))
+    if tested is None:
+        staleness = 1.0
+    else:
+        staleness = min(1.0, max(0.0, (now - tested).total_seconds() / 86400 / STALE_AFTER_DAYS))
+
+    speeds = [h['download_mbps'] for h in entry.get('history', [])
+              if h.get('event') == 'success' and isinstance(h.get('download_mbps'), (int, float))]
+    if len(speeds) >= 2 and statistics.fmean(speeds) > 0:
+        variance = min(1.0, statistics.pstdev(speeds) / statistics.fmean(speeds))
+    else:
+        variance = 0.5  # Unknown
+
+    return (WEIGHTS['latency'] * latency_score + WEIGHTS['staleness'] * staleness
+            + WEIGHTS['variance'] * variance)
+
+
+def plan_endpoints(endpoints: Iterable[Tuple[str, object]], now: Optional[datetime] = None) -> List[Tuple[str, object]]:
+    """Order (domain, entry) pairs by expected value, spreading picks across countries.
+
+    The k-th best server of a country is discounted by COVERAGE_DECAY ** k, so
+    every country gets its best candidates in early before any one dominates.
+    """
+    now = now or datetime.now(timezone.utc)
+    by_country = defaultdict(list)
+    for domain, entry in endpoints:
+        country = entry.get('country', '')
+        by_country[country].append((score_endpoint(entry, now), domain, entry))
+
+    ranked = []
+    for candidates in by_country.values():
+        candidates.sort(key=lambda c: -c[0])
+        for k, (score, domain, entry) in enumerate(candidates):
+            ranked.append((score * COVERAGE_DECAY ** k, domain, entry))
+    ranked.sort(key=lambda c: -c[0])
+    return [(domain, entry) for _score, domain, entry in ranked]
+
+
+class Budget:
+    """Wall-clock and data budget for one speedtest run.
+
+    A test is only started if the remaining budget covers the average cost of
+    the tests finished so far, so the run stops cleanly instead of overrunning.
+    """
+
+    def __init__(self, time_budget_s: Optional[float] = None, data_budget_bytes: Optional[int] = None):
+        self.time_budget_s = time_budget_s or None
+        self.data_budget_bytes = data_budget_bytes or None
+        self.start = time.monotonic()
+        self.bytes_used = 0
+        self.tests_done = 0
+        self._seconds_total = 0.0
+        self.exhausted_reason: Optional[str] = None
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.time_budget_s or self.data_budget_bytes)
+
+    def charge(self, seconds: float, bytes_used: int = 0) -> None:
+        """Account for one finished test."""
+        self.tests_done += 1
+        self._seconds_total += seconds
+        self.bytes_used += bytes_used or 0
+
+    def _expected(self) -> Tuple[float, float]:
+        if not self.tests_done:
+            return DEFAULT_TEST_SECONDS, DEFAULT_TEST_BYTES
+        return self._seconds_total / self.tests_done, self.bytes_used / self.tests_done
+
+    def allows_next(self, parallel: int = 1) -> bool:
+        """True if another test (one of *parallel* running side by side) fits in the budget."""
+        expected_s, expected_bytes = self._expected()
+        if self.time_budget_s:
+            remaining = self.time_budget_s - (time.monotonic() - self.start)
+            if remaining < expected_s:
+                self.exhausted_reason = 'time'
+                return False
+        if self.data_budget_bytes:
+            if self.data_budget_bytes - self.bytes_used < expected_bytes * parallel:
+                self.exhausted_reason = 'data'
+                return False
+        return True
+
+    def summary(self) -> Dict:
+        return {
+            'elapsed_s': round(time.monotonic() - self.start, 1),
+            'bytes_used': self.bytes_used,
+            'exhausted': self.exhausted_reason,
+        }
@@ -0,0 +1,173 @@
+"""Compact per-server scan result record.
+
+A ResultRecord keeps the fields every result has in __slots__ and anything
+rarer (VPN timings, quarantine, handshake probe...) in an overflow dict that
+only exists when needed. Records are mutable mappings, so code written
+against result dicts (entry.get('country'), entry['rx_speed_mbps'] = ...)
+works unchanged, and they serialize to JSON and CSV field by field without
+building an intermediate dict.
+"""
+
+import json
+import sys
+from collections.abc import MutableMapping
+from json.encoder import encode_basestring, encode_basestring_ascii
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# Slotted fields, in the order they are written to results.json (keep from_dict in sync)
+FIELDS = ('latency_ms', 'ip', 'country', 'city', 'rx_speed_mbps', 'tx_speed_mbps',
+          'scan_timestamp', 'speedtest_timestamp', 'speedtest_failed_timestamp',
+          'speedtest_failed_reason', 'history')
+_SLOTTED = frozenset(FIELDS)
+_FIELD_JSON = {name: encode_basestring_ascii(name) for name in FIELDS}
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self):
+        return '<missing>'
+
+
+MISSING = _Missing()  # Value of a slotted field the record does not have
+
+
+_encode = json.JSONEncoder().encode
+_encode_unicode = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def json_value(value: Any, indent: Optional[int] = None, prefix: str = '', ensure_ascii: bool = True) -> str:
+    """*value* as JSON, like json.dumps(value, indent=indent, ensure_ascii=ensure_ascii)
+    with nested lines prefixed by *prefix*."""
+    kind = type(value)
+    if kind is str:
+        return encode_basestring_ascii(value) if ensure_ascii else encode_basestring(value)
+    if value is None:
+        return 'null'
+    if indent is None or kind not in (dict, list):
+        return _encode(value) if ensure_ascii else _encode_unicode(value)
+    return json.dumps(value, indent=indent, ensure_ascii=ensure_ascii).replace('\n', '\n' + prefix)
+
+
+class ResultRecord(MutableMapping):
+    """One server's result: {latency_ms, ip, country, city, rx/tx_speed_mbps, timestamps, history, ...}."""
+
+    __slots__ = ('domain',) + FIELDS + ('_extra',)
+
+    def __init__(self, domain: str, **fields):
+        self.domain = domain
+        for name in FIELDS:
+            setattr(self, name, MISSING)
+        self._extra = None
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, domain: str, data: Dict[str, Any]) -> 'ResultRecord':
+        """Record holding the fields of result dict *data*.
+
+        Country and city strings are interned: a few hundred distinct values
+        are shared by all records instead of one copy per server.
+        """
+        record = cls.__new__(cls)
+        record.domain = domain
+        get = data.get
+        record.latency_ms = get('latency_ms', MISSING)
+        record.ip = get('ip', MISSING)
+        country = get('country', MISSING)
+        record.country = sys.intern(country) if type(country) is str else country
+        city = get('city', MISSING)
+        record.city = sys.intern(city) if type(city) is str else city
+        record.rx_speed_mbps = get('rx_speed_mbps', MISSING)
+        record.tx_speed_mbps = get('tx_speed_mbps', MISSING)
+        record.scan_timestamp = get('scan_timestamp', MISSING)
+        record.speedtest_timestamp = get('speedtest_timestamp', MISSING)
+        record.speedtest_failed_timestamp = get('speedtest_failed_timestamp', MISSING)
+        record.speedtest_failed_reason = get('speedtest_failed_reason', MISSING)
+        record.history = get('history', MISSING)
+        record._extra = (None if _SLOTTED.issuperset(data)
+                         else {key: value for key, value in data.items() if key not in _SLOTTED})
+        return record
+
+    # -- mapping protocol ---------------------------------------------------
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _SLOTTED:
+            value = getattr(self, key)
+            if value is MISSING:
+                raise KeyError(key)
+            return value
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _SLOTTED:
+            value = getattr(self, key)
+            return default if value is MISSING else value
+        return default if self._extra is None else self._extra.get(key, default)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _SLOTTED:
+            setattr(self, key, value)
+        elif self._extra is None:
+            self._extra = {key: value}
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in _SLOTTED:
+            if getattr(self, key) is MISSING:
+                raise KeyError(key)
+            setattr(self, key, MISSING)
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+
+    def __contains__(self, key: object) -> bool:
+        if key in _SLOTTED:
+            return getattr(self, key) is not MISSING
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for name in FIELDS:
+            if getattr(self, name) is not MISSING:
+                yield name
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return (sum(getattr(self, name) is not MISSING for name in FIELDS)
+                + (len(self._extra) if self._extra is not None else 0))
+
+    def __repr__(self) -> str:
+        return f'ResultRecord({self.domain!r}, {dict(self.items())!r})'
+
+    # -- serialization --------------------------------------------------------
+
+    def _json_items(self, indent: Optional[int], prefix: str, ensure_ascii: bool) -> Iterator[str]:
+        for name in FIELDS:
+            value = getattr(self, name)
+            if value is not MISSING:
+                yield f'{prefix}{_FIELD_JSON[name]}: {json_value(value, indent, prefix, ensure_ascii)}'
+        if self._extra is not None:
+            encode_key = encode_basestring_ascii if ensure_ascii else encode_basestring
+            for key, value in self._extra.items():
+                yield f'{prefix}{encode_key(key)}: {json_value(value, indent, prefix, ensure_ascii)}'
+
+    def to_json(self, indent: Optional[int] = None, level: int = 1, ensure_ascii: bool = True) -> str:
+        """The record's fields as JSON object text, as json.dumps(dict(record), indent=indent,
+        ensure_ascii=ensure_ascii) writes it nested *level* levels deep (the domain is not part of the object)."""
+        if indent is None:
+            body = ', '.join(self._json_items(None, '', ensure_ascii))
+            return '{' + body + '}'
+        body = ',\n'.join(self._json_items(indent, ' ' * (indent * (level + 1)), ensure_ascii))
+        return '{\n' + body + '\n' + ' ' * (indent * level) + '}' if body else '{}'
+
+    def values_for(self, fields: Sequence[str], default: Any = '') -> List[Any]:
+        """Values of *fields* (e.g. a CSV row), *default* for missing ones."""
+        get = self.get
+        return [get(name, default) for name in fields]
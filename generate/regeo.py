@@ -0,0 +1,84 @@
+"""Re-geolocate stored results against the current GeoLite databases, without probing."""
+
+import ipaddress
+import logging
+from collections.abc import Mapping
+from typing import Callable, Dict, Optional, Tuple
+
+from generate import georeader
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = 'Unknown'
+
+
+class _PrefixCache:
+    """Resolve addresses in sorted order, reusing the last lookup while inside its network.
+
+    GeoIP records apply to a whole network (traits.network), so for sorted
+    input each network costs one database lookup however many results share it.
+    """
+
+    def __init__(self, lookup: Callable[[str], Tuple[str, Optional[ipaddress.IPv4Network]]]):
+        self._lookup = lookup
+        self._network = None
+        self._value = None
+        self.lookups = 0
+
+    def get(self, ip) -> str:
+        if self._network is not None and ip.version == self._network.version and ip in self._network:
+            return self._value
+        self.lookups += 1
+        self._value, self._network = self._lookup(str(ip))
+        return self._value
+
+
+def _resolver(reader, method: str, attr: str):
+    def lookup(ip: str):
+        try:
+            response = getattr(reader, method)(ip)
+        except Exception:
+            return UNKNOWN, None
+        network = getattr(response.traits, 'network', None)
+        if not isinstance(network, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+            network = None
+        return getattr(response, attr).name or UNKNOWN, network
+    return lookup
+
+
+def regeolocate(endpoints_dict: Dict, city_db: str, country_db: str) -> Dict:
+    """Update country/city of results whose stored IP now geolocates differently.
+
+    Entries are changed in place; unchanged entries are not touched.
+
+    Returns:
+        Dict with 'checked' (entries with an IP), 'lookups' (database lookups)
+        and 'changed' (domains whose country or city changed)
+    """
+    entries = []
+    for domain, entry in endpoints_dict.items():
+        if not isinstance(entry, Mapping) or not entry.get('ip'):
+            continue
+        try:
+            entries.append((ipaddress.ip_address(entry['ip']), domain, entry))
+        except ValueError:
+            continue
+    entries.sort(key=lambda item: (item[0].version, item[0]))
+    if not entries:
+        return {'checked': 0, 'lookups': 0, 'changed': []}
+
+    changed = []
+    with georeader.lease(city_db) as city_reader, georeader.lease(country_db) as country_reader:
+        countries = _PrefixCache(_resolver(country_reader, 'country', 'country'))
+        cities = _PrefixCache(_resolver(city_reader, 'city', 'city'))
+        for ip, domain, entry in entries:
+            country, city = countries.get(ip), cities.get(ip)
+            if entry.get('country') != country or entry.get('city') != city:
+                logger.debug(f"{domain}: {entry.get('country')}/{entry.get('city')} -> {country}/{city}")
+                entry['country'] = country
+                entry['city'] = city
+                changed.append(domain)
+
+    summary = {'checked': len(entries), 'lookups': countries.lookups + cities.lookups, 'changed': changed}
+    logger.info(f"Re-geolocated {len(entries)} results with {summary['lookups']} lookups: {len(changed)} changed")
+    return summary
@@ -1,65 +1,166 @@
 """Report rendering for latency scan results with VPN speedtest support."""
 
 from format.colors import Format
-from json import loads
-from collections import defaultdict
-from typing import Dict, List, Optional, Tuple, Any
-from pathlib import Path
+from format.export import write_records
+from generate.aggregate import FIELDS as DISTRIBUTION_FIELDS, distribution, sort_groups
+from generate.columnar import ResultsTable
+from generate.geoindex import GeoIndex
+from generate import results_store
+from format.table import Table
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, List, Mapping, Optional, Set, Tuple
 import logging
+import os
 import sys
 import re
 
 logger = logging.getLogger(__name__)
 
 
+# Row layout of Analyze.rows (also the tuples returned by get_top_performers)
+ROW_FIELDS = ('domain', 'latency_ms', 'ip', 'country', 'city', 'rx_speed_mbps', 'tx_speed_mbps')
+COUNTRY_COL = 3
+CITY_COL = 4
+
+
+def _speed(value) -> str:
+    return f"{value:.2f}" if value is not None else "N/A"
+
+
+def _stat(value) -> str:
+    return f"{value:.2f}" if isinstance(value, float) else ('-' if value is None else str(value))
+
+
+# Summary fields of each country/city node in geo_report
+GEO_SUMMARY_FIELDS = ('servers', 'best_latency', 'best_latency_server', 'best_download', 'best_download_server')
+
+# Distribution columns shown in table output (machine formats carry every field)
+DISTRIBUTION_TABLE = (('SERVERS', 'servers'),
+                      ('LAT MIN', 'latency_ms_min'), ('LAT MED', 'latency_ms_median'), ('LAT P90', 'latency_ms_p90'),
+                      ('LAT MEAN', 'latency_ms_mean'), ('LAT SD', 'latency_ms_stddev'),
+                      ('DL N', 'rx_speed_mbps_count'), ('DL MED', 'rx_speed_mbps_median'), ('DL P90', 'rx_speed_mbps_p90'),
+                      ('UL N', 'tx_speed_mbps_count'), ('UL MED', 'tx_speed_mbps_median'), ('UL P90', 'tx_speed_mbps_p90'))
+
+
 class Analyze:
-    """Read results and generate filtered reports and stats."""
+    """Read results and generate filtered reports and stats.
+
+    The results file is parsed and normalized once into a table of row tuples
+    shared by every report of the instance; it is re-read only if the file
+    changes on disk. Per-column indexes are built on first use.
+
+    Report tables are written to self.out (default stdout) in buffered
+    chunks; logging carries only the summaries around them. With
+    output_format set to one of format.export.FORMATS, reports stream
+    records with stable field names instead of tables.
+    """
     formatting = Format()
 
     def __init__(self, res_fl: str):
         self.res_fl = res_fl
+        self._rows: Optional[List[Tuple]] = None
+        self._rows_key = None
+        self._indexes: Dict[int, Dict[str, List[int]]] = {}
+        self._geo_index: Optional[GeoIndex] = None
+        self._table: Optional[ResultsTable] = None
+        self.out = None
+        self.output_format = 'table'
 
     @staticmethod
-    def read_json_file(json_file: str) -> Dict[str, Any]:
+    def read_json_file(json_file: str) -> Dict[str, Dict]:
+        """Results as plain {domain: dict}, converted to rows only once; older layouts are migrated on first read."""
         logger.info("Reading file: %s", json_file)
-        with Path(json_file).open('r', encoding='utf-8') as infile:
-            data = infile.read()
-            json_data = loads(data)
-
-        return json_data
+        return results_store.load_dicts(json_file)
 
     @staticmethod
-    def _normalize_result(server_data: Any) -> Dict:
-        """Normalize results to dict format (handles both old list and new dict formats)."""
-        if isinstance(server_data, dict):
-            # New format
-            return {
-                'latency_ms': server_data.get('latency_ms', 0),
-                'ip': server_data.get('ip', 'N/A'),
-                'country': server_data.get('country', 'Unknown'),
-                'city': server_data.get('city', 'Unknown'),
-                'rx_speed_mbps': server_data.get('rx_speed_mbps'),
-                'tx_speed_mbps': server_data.get('tx_speed_mbps')
-            }
-        elif isinstance(server_data, list) and len(server_data) >= 4:
-            # Old format: [latency, ip, country, city]
-            return {
-                'latency_ms': server_data[0],
-                'ip': server_data[1],
-                'country': server_data[2],
-                'city': server_data[3],
-                'rx_speed_mbps': None,
-                'tx_speed_mbps': None
-            }
-        else:
-            return {
-                'latency_ms': 0,
-                'ip': 'N/A',
-                'country': 'Unknown',
-                'city': 'Unknown',
-                'rx_speed_mbps': None,
-                'tx_speed_mbps': None
-            }
+    def _row(domain: str, server_data: Mapping) -> Tuple:
+        """One result as a ROW_FIELDS tuple, with 0 latency and 'N/A'/'Unknown' for missing fields."""
+        return (domain, float(server_data.get('latency_ms') or 0), server_data.get('ip', 'N/A'),
+                server_data.get('country') or 'Unknown', server_data.get('city') or 'Unknown',
+                server_data.get('rx_speed_mbps'), server_data.get('tx_speed_mbps'))
+
+    def _file_key(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.res_fl)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    @property
+    def rows(self) -> List[Tuple]:
+        """All results as ROW_FIELDS tuples, in file order."""
+        if self._rows is None or self._file_key() != self._rows_key:
+            row = self._row
+            self._rows = [row(domain, data) for domain, data in self.read_json_file(self.res_fl).items()]
+            self._rows_key = self._file_key()  # After reading: a legacy file is rewritten on first read
+            self._indexes = {}
+            self._geo_index = None
+            self._table = None
+        return self._rows
+
+    @property
+    def geo_index(self) -> GeoIndex:
+        """Country -> city -> servers index of the current rows, built on first use."""
+        rows = self.rows
+        if self._geo_index is None:
+            self._geo_index = GeoIndex(rows)
+        return self._geo_index
+
+    @property
+    def table(self) -> ResultsTable:
+        """Latency/speed columns of the current rows, built on first use."""
+        rows = self.rows
+        if self._table is None:
+            self._table = ResultsTable([row[0] for row in rows],
+                                       {'latency_ms': [row[1] for row in rows],
+                                        'rx_speed_mbps': [row[5] for row in rows],
+                                        'tx_speed_mbps': [row[6] for row in rows]},
+                                       [row[3] for row in rows])
+        return self._table
+
+    def _index(self, column: int) -> Dict[str, List[int]]:
+        """Map each distinct value of *column* to its row numbers, in first-seen order."""
+        rows = self.rows
+        index = self._indexes.get(column)
+        if index is None:
+            index = {}
+            for i, row in enumerate(rows):
+                index.setdefault(row[column], []).append(i)
+            self._indexes[column] = index
+        return index
+
+    def _search(self, column: int, pattern: str) -> Set[int]:
+        """Row numbers whose *column* contains *pattern* (case-insensitive); matched per distinct value."""
+        regex = re.compile(re.escape(str(pattern)), re.IGNORECASE)
+        matched = set()
+        for value, row_ids in self._index(column).items():
+            if regex.search(value):
+                matched.update(row_ids)
+        return matched
+
+    def _group_stats(self, column: int, min_latency_limit: float, max_latency_limit: float) -> List[Tuple]:
+        """(value, servers, min latency) per distinct value of *column* within the latency limits."""
+        latency = [row[1] for row in self.rows]
+        unbounded = min_latency_limit <= 0 and max_latency_limit == float("inf")
+        metrics = []
+        for value, row_ids in self._index(column).items():
+            latencies = [latency[i] for i in row_ids]
+            if not unbounded:
+                latencies = [x for x in latencies if min_latency_limit <= x <= max_latency_limit]
+            if latencies:
+                metrics.append((value, len(latencies), round(min(latencies), 2)))
+        return metrics
+
+    def _write_records(self, rows, fields) -> None:
+        write_records(rows, fields, self.output_format, self.out if self.out is not None else sys.stdout)
+
+    def _render_stats(self, fields: Dict[int, str], metrics: List[Tuple]) -> None:
+        if self.output_format != 'table':
+            self._write_records(metrics, (fields[0].lower(), 'servers', 'min_latency_ms'))
+            return
+        Table([(fields[0], itemgetter(0)), (fields[1], itemgetter(1)),
+               (fields[2], lambda each: round(each[2], 2))]).render(metrics, out=self.out)
 
     def get_top_performers(self, limit: Optional[int] = None, country: Optional[str] = None,
                            city: Optional[str] = None, sort_by: int = 1,
@@ -67,108 +168,60 @@ class Analyze:
         if not limit:
             limit = 'all'
 
-        top_servers = []
-
-        results_json = self.read_json_file(self.res_fl)
-
-        for domain, data in results_json.items():
-            norm_data = self._normalize_result(data)
-            latency = norm_data['latency_ms']
-            
-            if latency < min_latency_limit or latency > max_latency_limit:
-                continue
-                
-            if country and not re.search(re.escape(str(country)), norm_data['country'], re.IGNORECASE):
-                continue
-            if city and not re.search(re.escape(str(city)), norm_data['city'], re.IGNORECASE):
-                continue
-                
-            top_servers.append((
-                domain,
-                latency,
-                norm_data['ip'],
-                norm_data['country'],
-                norm_data['city'],
-                norm_data['rx_speed_mbps'],
-                norm_data['tx_speed_mbps']
-            ))
-
-        if not top_servers:
+        rows = self.rows
+        row_ids = None
+        for column, pattern in ((COUNTRY_COL, country), (CITY_COL, city)):
+            if pattern:
+                matched = self._search(column, pattern)
+                row_ids = matched if row_ids is None else row_ids & matched
+        table = self.table
+        latency_range = {'latency_ms': (min_latency_limit, max_latency_limit)}
+        selected = table.mask(rows=row_ids, ranges=latency_range)
+
+        if not table.any(selected):
+            top_servers = []
             self.formatting.output('yellow')
             logger.info("No matching results found")
             self.formatting.output('reset')
+            if self.output_format != 'table':
+                self._write_records([], ROW_FIELDS)
         else:
             fields = {0: 'ENDPOINT', 1: 'LATENCY', 2: 'IP', 3: 'COUNTRY', 4: 'CITY', 5: 'DL(Mbps)', 6: 'UL(Mbps)'}
 
             self.formatting.output('bold', 'green')
             # If sorting by speed but no speed data exists, fall back to latency
-            has_any_speed = any(s[5] is not None or s[6] is not None for s in top_servers)
-            if sort_by in (5, 6) and not has_any_speed:
+            if sort_by in (5, 6) and not any(
+                    table.any(table.mask(rows=row_ids, ranges=latency_range, present=(column,)))
+                    for column in ('rx_speed_mbps', 'tx_speed_mbps')):
                 sort_by = 1
 
             logger.info("Sorted by: %s", fields.get(sort_by, fields[1]))
             self.formatting.output('reset')
 
-            if sort_by == 2:  # IP
-                def _ipv4_key(value):
-                    parts = str(value[2]).split('.')
-                    if len(parts) != 4 or not all(p.isdigit() for p in parts):
-                        return (999, 999, 999, 999)
-                    return tuple(min(int(p), 255) for p in parts)
-                top_servers.sort(key=_ipv4_key)
+            if sort_by == 1:  # Latency
+                top_servers = [rows[i] for i in table.order('latency_ms', selected)]
             elif sort_by in (5, 6):  # Speed (descending, None treated as 0)
-                top_servers.sort(key=lambda x: x[sort_by] or 0, reverse=True)
-            elif sort_by <= 4:
-                top_servers.sort(key=lambda x: x[sort_by])
+                column = 'rx_speed_mbps' if sort_by == 5 else 'tx_speed_mbps'
+                top_servers = [rows[i] for i in table.order(column, selected, descending=True)]
+            else:
+                top_servers = [rows[i] for i in table.rows(selected)]
+                if sort_by == 2:  # IP
+                    def _ipv4_key(value):
+                        parts = str(value[2]).split('.')
+                        if len(parts) != 4 or not all(p.isdigit() for p in parts):
+                            return (999, 999, 999, 999)
+                        return tuple(min(int(p), 255) for p in parts)
+                    top_servers.sort(key=_ipv4_key)
+                elif sort_by <= 4:
+                    top_servers.sort(key=lambda x: x[sort_by])
 
             if limit == 'all':
                 limit = len(top_servers)
                 
-            # Check if any speedtest data exists
-            has_speedtest = any(s[5] is not None or s[6] is not None for s in top_servers[:limit])
-            
-            max_endpoint_len = max(len(l[0]) for l in top_servers[0:limit])
-            max_latency_len = max(len(str(l[1])) for l in top_servers[0:limit])
-            max_country_len = max(len(l[3]) for l in top_servers[0:limit])
-            max_city_len = max(len(l[4]) for l in top_servers[0:limit])
-            
-            self.formatting.output('bold', 'reverse')
-            if has_speedtest:
-                logger.info('{0:^5} {1:^{max_endpoint}} {2:^{max_latency}} {3:^16} {4:^{max_country}} {5:^{max_city}} {6:^10} {7:^10}'.format(
-                    '#', 'ENDPOINT', 'LATENCY', 'IP', 'COUNTRY', 'CITY', 'DL(Mbps)', 'UL(Mbps)',
-                    max_latency=max_latency_len + 2,
-                    max_endpoint=max_endpoint_len + 2,
-                    max_city=max_city_len + 2,
-                    max_country=max_country_len + 2))
+            if self.output_format != 'table':
+                self._write_records(islice(top_servers, limit), ROW_FIELDS)
             else:
-                logger.info('{0:^5} {1:^{max_endpoint}} {2:^{max_latency}} {3:^16} {4:^{max_country}} {5:^{max_city}}'.format(
-                    '#', 'ENDPOINT', 'LATENCY', 'IP', 'COUNTRY', 'CITY',
-                    max_latency=max_latency_len + 2,
-                    max_endpoint=max_endpoint_len + 2,
-                    max_city=max_city_len + 2,
-                    max_country=max_country_len + 2))
-            self.formatting.output('reset')
-
-            for i, item in enumerate(top_servers[0:limit], 1):
-                self.formatting.output('bold')
-                dl_speed = f"{item[5]:.2f}" if item[5] is not None else "N/A"
-                ul_speed = f"{item[6]:.2f}" if item[6] is not None else "N/A"
-                
-                if has_speedtest:
-                    logger.info('{0:<5} {1:<{max_endpoint}} {2:<{max_latency}} {3:<16} {4:<{max_country}} {5:<{max_city}} {6:<10} {7:<10}'.format(
-                        i, item[0], round(item[1], 2), item[2], item[3], item[4], dl_speed, ul_speed,
-                        max_latency=max_latency_len + 2,
-                        max_endpoint=max_endpoint_len + 2,
-                        max_city=max_city_len + 2,
-                        max_country=max_country_len + 2))
-                else:
-                    logger.info('{0:<5} {1:<{max_endpoint}} {2:<{max_latency}} {3:<16} {4:<{max_country}} {5:<{max_city}}'.format(
-                        i, item[0], round(item[1], 2), item[2], item[3], item[4],
-                        max_latency=max_latency_len + 2,
-                        max_endpoint=max_endpoint_len + 2,
-                        max_city=max_city_len + 2,
-                        max_country=max_country_len + 2))
-                self.formatting.output('reset')
+                self._render_top(top_servers[:limit])
 
             self.formatting.output('green')
             logger.info("Found: %s results", min(limit, len(top_servers)))
@@ -176,39 +229,26 @@ class Analyze:
 
         return top_servers
 
+    def _render_top(self, shown: List[Tuple]) -> None:
+        columns = [('ENDPOINT', itemgetter(0)), ('LATENCY', lambda row: round(row[1], 2)), ('IP', itemgetter(2)),
+                   ('COUNTRY', itemgetter(3)), ('CITY', itemgetter(4))]
+        if any(s[5] is not None or s[6] is not None for s in shown):
+            columns += [('DL(Mbps)', lambda row: _speed(row[5])), ('UL(Mbps)', lambda row: _speed(row[6]))]
+        Table(columns).render(shown, out=self.out)
+
     def country_stats(self, sort_by: int = 2, min_latency_limit: float = 0,
                       max_latency_limit: float = float("inf")) -> None:
-        country_servers = {}
-        country_latency = defaultdict(list)
-        country_metrics = []
-
-        results_json = self.read_json_file(self.res_fl)
-
-        for domain, data in results_json.items():
-            norm_data = self._normalize_result(data)
-            server_latency = float(norm_data['latency_ms'])
-            
-            if server_latency < min_latency_limit or server_latency > max_latency_limit:
-                continue
-
-            country = norm_data['country']
-            country_latency[country].append(server_latency)
-
-            if country in country_servers:
-                country_servers[country] += 1
-            else:
-                country_servers[country] = 1
+        country_metrics = self._group_stats(COUNTRY_COL, min_latency_limit, max_latency_limit)
 
-        if not country_servers:
+        if not country_metrics:
             self.formatting.output('bold', 'yellow')
             logger.info("No results found")
             self.formatting.output('reset')
+            if self.output_format != 'table':
+                self._write_records([], ('country', 'servers', 'min_latency_ms'))
+                return
             sys.exit(0)
 
-        for country, servers in country_servers.items():
-            min_latency = round(min(country_latency[country]), 2)
-            country_metrics.append((country, servers, min_latency))
-
         fields = {0: 'COUNTRY', 1: 'SERVERS', 2: 'LATENCY'}
         rev_sort = True if fields[sort_by] == 'SERVERS' else False
         country_metrics.sort(key=lambda x: x[sort_by], reverse=rev_sort)
@@ -217,53 +257,70 @@ class Analyze:
         logger.info("Sorted by: %s", fields[sort_by])
         self.formatting.output('reset')
 
-        max_country_len = max(len(str(l[0])) for l in country_metrics)
-        max_latency_len = max(len(str(l[2])) for l in country_metrics)
-        self.formatting.output('bold', 'reverse')
-        logger.info('{0:^5} {1:^{max_country}} {2:^8} {3:^{max_latency}}'.format(
-            '#', fields[0], fields[1], fields[2],
-            max_country=max_country_len + 2,
-            max_latency=max_latency_len + 2))
-        self.formatting.output('reset')
-
-        for i, each in enumerate(country_metrics, 1):
-            self.formatting.output('bold')
-            logger.info('{0:<5} {1:<{max_country}} {2:<8} {3:<{max_latency}}'.format(
-                i, each[0], each[1], round(each[2], 2),
-                max_country=max_country_len + 2,
-                max_latency=max_latency_len + 2))
-            self.formatting.output('reset')
+        self._render_stats(fields, country_metrics)
 
         self.formatting.output('bold', 'green')
         logger.info("Total Countries: %s", len(country_metrics))
         self.formatting.output('reset')
 
-    def city_stats(self, sort_by: int = 2, min_latency_limit: float = 0,
-                   max_latency_limit: float = float("inf")) -> None:
-        city_servers = {}
-        city_latency = defaultdict(list)
-        city_metrics = []
-
-        results_json = self.read_json_file(self.res_fl)
+    def distribution_stats(self, column: int = COUNTRY_COL, sort_field: Optional[str] = None,
+                           min_latency_limit: float = 0, max_latency_limit: float = float("inf")) -> List[Dict]:
+        """Count/min/median/p90/mean/stddev of latency and speeds per country (or city, column=CITY_COL).
+
+        Args:
+            sort_field: Any generate.aggregate.FIELDS name, or 'country'/'city' to sort by name;
+                default latency_ms_median
+
+        Raises:
+            ValueError: Unknown *sort_field*
+        """
+        by_city = column == CITY_COL
+        key_names = ('country', 'city') if by_city else ('country',)
+        sort_field = sort_field or 'latency_ms_median'
+        if sort_field == 'city' and not by_city:
+            sort_field = 'country'  # 'country'/'city' both mean: by name
+        if sort_field not in DISTRIBUTION_FIELDS and sort_field not in key_names:
+            raise ValueError(f"Unknown sort field: {sort_field}")
+        rows = self.rows
+        if min_latency_limit > 0 or max_latency_limit != float("inf"):
+            rows = [row for row in rows if min_latency_limit <= row[1] <= max_latency_limit]
+        keys = [(row[COUNTRY_COL], row[CITY_COL]) for row in rows] if by_city else [row[COUNTRY_COL] for row in rows]
+        groups = distribution(keys,
+                              {'latency_ms': [row[1] for row in rows],
+                               'rx_speed_mbps': [row[5] for row in rows],
+                               'tx_speed_mbps': [row[6] for row in rows]},
+                              key_name=key_names if by_city else 'country')
+        sort_groups(groups, sort_field)
 
-        for domain, data in results_json.items():
-            norm_data = self._normalize_result(data)
-            server_latency = float(norm_data['latency_ms'])
-            
-            if server_latency < min_latency_limit or server_latency > max_latency_limit:
-                continue
+        self.formatting.output('bold', 'green')
+        logger.info("Sorted by: %s", sort_field)
+        self.formatting.output('reset')
 
-            city = norm_data['city']
-            city_latency[city].append(server_latency)
+        if self.output_format != 'table':
+            fields = key_names + DISTRIBUTION_FIELDS
+            self._write_records((tuple(group[f] for f in fields) for group in groups), fields)
+        else:
+            columns = [(name.upper(), itemgetter(name)) for name in key_names]
+            columns += [(title, lambda group, field=field: _stat(group[field])) for title, field in DISTRIBUTION_TABLE]
+            Table(columns).render(groups, out=self.out)
 
-            if city in city_servers:
-                city_servers[city] += 1
-            else:
-                city_servers[city] = 1
+        self.formatting.output('bold', 'green')
+        logger.info("Total %s: %s", 'Cities' if by_city else 'Countries', len(groups))
+        self.formatting.output('reset')
+        return groups
 
-        for city, servers in city_servers.items():
-            min_latency = round(min(city_latency[city]), 2)
-            city_metrics.append((city, servers, min_latency))
+    def city_stats(self, sort_by: int = 2, min_latency_limit: float = 0,
+                   max_latency_limit: float = float("inf")) -> None:
+        # Cities are grouped per country: (city, servers, min latency, country)
+        rows = self.rows
+        unbounded = min_latency_limit <= 0 and max_latency_limit == float("inf")
+        city_metrics = []
+        for country, city, row_ids in self.geo_index.city_groups():
+            latencies = [rows[i][1] for i in row_ids]
+            if not unbounded:
+                latencies = [x for x in latencies if min_latency_limit <= x <= max_latency_limit]
+            if latencies:
+                city_metrics.append((city, len(latencies), round(min(latencies), 2), country))
 
         fields = {0: 'CITY', 1: 'SERVERS', 2: 'LATENCY'}
         rev_sort = True if fields[sort_by] == 'SERVERS' else False
@@ -273,23 +330,69 @@ class Analyze:
         logger.info("Sorted by: %s", fields[sort_by])
         self.formatting.output('reset')
 
-        max_city_len = max(len(str(l[0])) for l in city_metrics)
-        max_latency_len = max(len(str(l[2])) for l in city_metrics)
-        self.formatting.output('bold', 'reverse')
-        logger.info('{0:^5} {1:^{max_city}} {2:^8} {3:^{max_latency}}'.format(
-            '#', fields[0], fields[1], fields[2],
-            max_city=max_city_len + 2,
-            max_latency=max_latency_len + 2))
+        if self.output_format != 'table':
+            self._write_records(((c[0], c[3], c[1], c[2]) for c in city_metrics),
+                                ('city', 'country', 'servers', 'min_latency_ms'))
+        else:
+            Table([('CITY', itemgetter(0)), ('COUNTRY', itemgetter(3)), ('SERVERS', itemgetter(1)),
+                   ('LATENCY', lambda each: round(each[2], 2))]).render(city_metrics, out=self.out)
+
+        self.formatting.output('bold', 'green')
+        logger.info("Total Cities: %s", len(city_metrics))
         self.formatting.output('reset')
 
-        for i, each in enumerate(city_metrics, 1):
-            self.formatting.output('bold')
-            logger.info('{0:<5} {1:<{max_city}} {2:<8} {3:<{max_latency}}'.format(
-                i, each[0], each[1], round(each[2], 2),
-                max_city=max_city_len + 2,
-                max_latency=max_latency_len + 2))
+    def geo_report(self, path: str = '') -> Optional[List]:
+        """Roll-up/drill-down over the country -> city -> servers index.
+
+        Args:
+            path: '' for all countries, 'COUNTRY' for its cities, 'COUNTRY/CITY'
+                for its servers (names match case-insensitively)
+
+        Returns:
+            The listed countries, cities or server rows; None if the country or
+            city does not exist
+        """
+        index = self.geo_index
+        country_name, _, city_name = path.partition('/')
+        country = city = None
+        if country_name:
+            country = index.find_country(country_name.strip())
+            if country is not None and city_name:
+                city = index.find_city(country, city_name.strip())
+
+        if not country_name:
+            items = sort_groups(index.countries(), 'best_latency')
+            fields = ('country', 'cities') + GEO_SUMMARY_FIELDS
+            total = "Total Countries: %s"
+        elif country is not None and not city_name:
+            items = sort_groups(index.cities(country), 'best_latency')
+            fields = ('country', 'city') + GEO_SUMMARY_FIELDS
+            total = f"Total Cities in {country}: %s"
+        elif city is not None:
+            items = sorted(index.servers(country, city), key=itemgetter(1))
+            fields = ROW_FIELDS
+            total = f"Total Servers in {city}, {country}: %s"
+        else:
+            self.formatting.output('bold', 'yellow')
+            logger.info("No results found for: %s", path)
             self.formatting.output('reset')
+            if self.output_format != 'table':
+                self._write_records([], ROW_FIELDS if city_name else ('country', 'city') + GEO_SUMMARY_FIELDS)
+            return None
+
+        if fields is ROW_FIELDS:
+            records = items
+            if self.output_format == 'table':
+                self._render_top(items)
+        else:
+            records = [tuple(item[f] for f in fields) for item in items]
+            if self.output_format == 'table':
+                columns = [(f.upper().replace('_', ' '), lambda item, f=f: _stat(item[f])) for f in fields]
+                Table(columns).render(items, out=self.out)
+        if self.output_format != 'table':
+            self._write_records(records, fields)
 
         self.formatting.output('bold', 'green')
-        logger.info("Total Cities: %s", len(city_metrics))
+        logger.info(total, len(items))
         self.formatting.output('reset')
+        return items
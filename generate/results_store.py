@@ -0,0 +1,226 @@
+"""Versioned reading of results.json with one-time migration of legacy layouts.
+
+Scan results have been stored in three layouts (schema versions):
+
+    0  [{'domain': ..., 'latency_ms': ..., ...}, ...]
+    1  {domain: [latency_ms, ip, country, city]}, possibly mixed with version 2 entries
+    2  {domain: {'latency_ms', 'ip', 'country', 'city', 'rx_speed_mbps', ...}}
+
+load() upgrades an older file to SCHEMA_VERSION and writes it back once, so
+readers only ever see {domain: ResultRecord} results (or, from load_dicts(),
+the equivalent plain dicts). The current layout carries no version marker,
+keeping the file the plain domain -> result mapping that /api/results and
+the exports serve; the version is inferred from the shape, and a file found
+current is remembered by (mtime, size) so it is not inspected again until it
+changes. snapshot() additionally keeps the parsed
+records of the current file version for read-only callers.
+"""
+
+import io
+import json
+import logging
+import os
+import threading
+from json.encoder import encode_basestring, encode_basestring_ascii
+from typing import Any, Dict, Mapping, Optional, TextIO, Tuple
+
+from generate.records import ResultRecord, json_value
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 2
+
+# Field order of version 1 list entries
+LEGACY_FIELDS = ('latency_ms', 'ip', 'country', 'city')
+
+_current: Dict[str, Tuple[int, int]] = {}  # abspath -> (mtime_ns, size) of a file known to be current
+_snapshots: Dict[str, Tuple[Tuple[int, int], Dict[str, ResultRecord]]] = {}  # abspath -> (key, records)
+_lock = threading.Lock()
+
+
+def _file_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def schema_version(data: Any) -> int:
+    """Schema version of parsed results *data*.
+
+    Raises:
+        ValueError: *data* is not a results layout
+    """
+    if isinstance(data, list):
+        return 0
+    if not isinstance(data, dict):
+        raise ValueError("Results file is in an invalid format.")
+    return SCHEMA_VERSION if all(type(entry) is dict for entry in data.values()) else 1
+
+
+def _from_v0(data: list) -> Dict[str, Any]:
+    results = {}
+    for item in data:
+        if isinstance(item, dict) and item.get('domain'):
+            item = dict(item)
+            results[item.pop('domain')] = item
+    return results
+
+
+def _from_v1(data: Dict[str, Any]) -> Dict[str, Dict]:
+    results = {}
+    for domain, entry in data.items():
+        if isinstance(entry, dict):
+            results[domain] = entry
+        elif isinstance(entry, list) and len(entry) >= len(LEGACY_FIELDS):
+            results[domain] = {**dict(zip(LEGACY_FIELDS, entry)), 'rx_speed_mbps': None, 'tx_speed_mbps': None}
+        else:
+            logger.warning("Dropping unreadable result entry for %s", domain)
+    return results
+
+
+_MIGRATIONS = {0: _from_v0, 1: _from_v1}
+
+
+def migrate(data: Any) -> Dict[str, Dict]:
+    """Upgrade parsed results *data* of any known version to SCHEMA_VERSION.
+
+    Raises:
+        ValueError: *data* is not a results layout
+    """
+    version = schema_version(data)
+    while version < SCHEMA_VERSION:
+        data = _MIGRATIONS[version](data)
+        version += 1
+    return data
+
+
+def _records(data: Dict[str, Dict]) -> Dict[str, ResultRecord]:
+    from_dict = ResultRecord.from_dict
+    return {domain: from_dict(domain, entry) for domain, entry in data.items()}
+
+
+def _entry_json(entry: Mapping, indent: Optional[int], level: int, ensure_ascii: bool) -> str:
+    if isinstance(entry, ResultRecord):
+        return entry.to_json(indent, level, ensure_ascii)
+    return json_value(dict(entry), indent, ' ' * (indent * level) if indent else '', ensure_ascii)
+
+
+def dump(results: Mapping[str, Mapping], out: TextIO, indent: Optional[int] = 2, ensure_ascii: bool = True) -> None:
+    """Write *results* ({domain: ResultRecord or dict}) to *out* as JSON, one entry at a time.
+
+    The text is what json.dump(results, out, indent=indent, ensure_ascii=ensure_ascii)
+    would write for the equivalent dicts.
+    """
+    if not results:
+        out.write('{}')
+        return
+    encode_key = encode_basestring_ascii if ensure_ascii else encode_basestring
+    if indent is None:
+        out.write('{')
+        sep = ''
+        for domain, entry in results.items():
+            out.write(f'{sep}{encode_key(domain)}: {_entry_json(entry, None, 1, ensure_ascii)}')
+            sep = ', '
+        out.write('}')
+        return
+    prefix = ' ' * indent
+    sep = '{\n'
+    for domain, entry in results.items():
+        out.write(f'{sep}{prefix}{encode_key(domain)}: {_entry_json(entry, indent, 1, ensure_ascii)}')
+        sep = ',\n'
+    out.write('\n}')
+
+
+def dumps(results: Mapping[str, Mapping], indent: Optional[int] = None, ensure_ascii: bool = True) -> str:
+    """*results* as a JSON string (see dump())."""
+    out = io.StringIO()
+    dump(results, out, indent, ensure_ascii)
+    return out.getvalue()
+
+
+def _write(path: str, results: Mapping[str, Mapping]) -> None:
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        dump(results, f)
+    os.replace(tmp, path)
+    _current[os.path.abspath(path)] = _file_key(path)
+
+
+def save(path: str, results: Mapping[str, Mapping]) -> None:
+    """Atomically write version 2 *results* ({domain: ResultRecord or dict}) to *path*."""
+    with _lock:
+        _write(path, results)
+
+
+def load_dicts(path: str) -> Dict[str, Dict]:
+    """Read results from *path* as plain {domain: dict}, migrating an older file in place once.
+
+    For read-only callers that convert entries themselves (the CLI report
+    builds its rows straight from these) and would only throw records away.
+    The migrated file is only written back if nobody changed it since it was
+    read; if the write fails the migrated results are still returned.
+
+    Raises:
+        OSError: The file cannot be read
+        ValueError: The file is not JSON or not a results layout
+    """
+    abspath = os.path.abspath(path)
+    key = _file_key(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    with _lock:
+        if key is not None and _current.get(abspath) == key:
+            return data
+    version = schema_version(data)
+    if version == SCHEMA_VERSION:
+        with _lock:
+            _current[abspath] = key
+        return data
+
+    results = migrate(data)
+    with _lock:
+        if _file_key(path) == key:
+            try:
+                _write(path, results)
+            except OSError as e:
+                logger.warning("Could not write migrated results to %s: %s", path, e)
+            else:
+                logger.info("Migrated %s from results schema version %s to %s (%s entries)",
+                            path, version, SCHEMA_VERSION, len(results))
+    return results
+
+
+def load(path: str) -> Dict[str, ResultRecord]:
+    """Read results from *path* as {domain: ResultRecord}, migrating an older file in place once.
+
+    Every call returns new records the caller may modify and save().
+
+    Raises:
+        OSError: The file cannot be read
+        ValueError: The file is not JSON or not a results layout
+    """
+    return _records(load_dicts(path))
+
+
+def snapshot(path: str) -> Dict[str, ResultRecord]:
+    """Results of *path* like load(), parsed once per file version and shared between callers.
+
+    The returned records must not be modified; use load() to change results.
+
+    Raises:
+        OSError: The file cannot be read
+        ValueError: The file is not JSON or not a results layout
+    """
+    abspath = os.path.abspath(path)
+    key = _file_key(path)
+    with _lock:
+        cached = _snapshots.get(abspath)
+    if cached is not None and key is not None and cached[0] == key:
+        return cached[1]
+    results = load(path)
+    key = _file_key(path)  # load() may have rewritten a legacy file
+    with _lock:
+        _snapshots[abspath] = (key, results)
+    return results
@@ -0,0 +1,111 @@
+"""Failure classification, in-run retry policy and quarantine for VPN speedtests."""
+
+import logging
+import threading
+import time
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+AUTH = 'auth'
+TIMEOUT = 'timeout'
+TUNNEL_DOWN = 'tunnel_down'
+NO_ROUTE = 'no_route'
+MEASUREMENT = 'measurement'
+FAILURE_CLASSES = (AUTH, TIMEOUT, TUNNEL_DOWN, NO_ROUTE, MEASUREMENT)
+TRANSIENT = frozenset({TIMEOUT, TUNNEL_DOWN, NO_ROUTE, MEASUREMENT})
+
+QUARANTINE_AFTER_FAILURES = 3  # Consecutive failed runs before a transient class is quarantined
+MAX_QUARANTINE_HOURS = 30 * 24
+
+_NO_ROUTE_MARKERS = ('Network is unreachable', 'No route to host', 'Cannot resolve host',
+                     'RESOLVE:', 'connect_error')
+
+
+def classify_failure(event: str, vpn_failure: Optional[str] = None, output: str = '') -> str:
+    """Map a failed test to one of FAILURE_CLASSES.
+
+    Args:
+        event: Outcome event ('vpn_failed', 'speedtest_failed', 'error')
+        vpn_failure: VPNManager.last_failure (management-interface reason)
+        output: Tail of the OpenVPN output (VPNManager.last_output)
+    """
+    if event == 'speedtest_failed':
+        return MEASUREMENT
+    text = f"{vpn_failure or ''}\n{output or ''}"
+    if vpn_failure == 'auth_failed' or 'AUTH_FAILED' in text:
+        return AUTH
+    if vpn_failure == 'timeout' or 'connection-timeout' in text or 'TLS handshake failed' in text:
+        return TIMEOUT
+    if any(marker in text for marker in _NO_ROUTE_MARKERS):
+        return NO_ROUTE
+    return TUNNEL_DOWN
+
+
+class RetryPolicy:
+    """In-run retries with exponential backoff for transient failure classes."""
+
+    def __init__(self, max_retries: int = 2, backoff_s: float = 2.0, max_backoff_s: float = 30.0,
+                 quarantine_hours: float = 6.0):
+        """
+        Args:
+            max_retries: Extra attempts after the first for a transient failure
+            backoff_s: Delay before the first retry; doubles for each further retry
+            max_backoff_s: Upper bound on a single retry delay
+            quarantine_hours: Cool-down of the first quarantine; doubles per strike
+        """
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_s = max(0.0, float(backoff_s))
+        self.max_backoff_s = float(max_backoff_s)
+        self.quarantine_hours = max(0.0, float(quarantine_hours))
+
+    def should_retry(self, failure_class: str, attempt: int) -> bool:
+        """True if a failure of *failure_class* on attempt number *attempt* (1-based) gets another try."""
+        return failure_class in TRANSIENT and attempt <= self.max_retries
+
+    def delay(self, attempt: int) -> float:
+        return min(self.max_backoff_s, self.backoff_s * 2 ** (attempt - 1))
+
+    def wait(self, attempt: int, stop_event: Optional[threading.Event] = None) -> bool:
+        """Sleep before the next attempt. Returns False if the run was stopped meanwhile."""
+        delay = self.delay(attempt)
+        if stop_event is not None:
+            return not stop_event.wait(delay)
+        time.sleep(delay)
+        return True
+
+    def record(self, entry: Dict, failure_class: Optional[str], now: Optional[datetime] = None) -> None:
+        """Update the entry's failure streak and quarantine after a final (post-retry) outcome."""
+        if failure_class is None:
+            entry.pop('consecutive_failures', None)
+            entry.pop('quarantine', None)
+            return
+        now = now or datetime.now(timezone.utc)
+        failures = entry.get('consecutive_failures', 0) + 1
+        entry['consecutive_failures'] = failures
+        if not self.quarantine_hours:
+            return
+        if failure_class == AUTH or failures >= QUARANTINE_AFTER_FAILURES:
+            strikes = entry.get('quarantine', {}).get('strikes', 0) + 1
+            hours = min(MAX_QUARANTINE_HOURS, self.quarantine_hours * 2 ** (strikes - 1))
+            entry['quarantine'] = {
+                'until': (now + timedelta(hours=hours)).isoformat(),
+                'strikes': strikes,
+                'failure_class': failure_class,
+            }
+            logger.info(f"Quarantined for {hours:g}h after {failure_class} failure (strike {strikes})")
+
+
+def is_quarantined(entry, now: Optional[datetime] = None) -> bool:
+    """True if *entry* is in an active quarantine cool-down."""
+    if not isinstance(entry, Mapping) or not entry.get('quarantine'):
+        return False
+    try:
+        until = datetime.fromisoformat(entry['quarantine']['until'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    if until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+    return until > (now or datetime.now(timezone.utc))
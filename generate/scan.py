@@ -1,6 +1,5 @@
 """Latency scanning and GeoIP enrichment for target endpoints."""
 
-import json
 import os
 from pathlib import Path
 from format.colors import Format
@@ -8,38 +7,48 @@ from datetime import datetime, timedelta, timezone
 from collections import OrderedDict
 from subprocess import run, PIPE
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 import threading
 import logging
-import geoip2.database
 import platform
 import re
 import socket
 import sys
 import time
 
+from generate import georeader, results_store
+from generate.records import ResultRecord
+
 logger = logging.getLogger(__name__)
 
+# Fields a latency scan measures; every other field of an existing result
+# (speedtest results and timings, history, quarantine, handshake probe...) is carried over
+SCAN_FIELDS = frozenset(('latency_ms', 'ip', 'country', 'city', 'scan_timestamp'))
+
 
 class Scanner:
     """Scan a list of targets, ping them, and write GeoIP-enriched results."""
     formatting = Format()
 
-    def __init__(self, targets_file, city_db, country_db, results_json, excl_countries_fle, include_countries=None):
+    def __init__(self, targets_file, city_db, country_db, results_json, excl_countries_fle, include_countries=None,
+                 negative_cache=None):
+        """
+        Args:
+            negative_cache: Optional generate.negcache.NegativeCache; targets in failure
+                back-off are skipped and each scan's outcome is recorded in it
+        """
         self.targets_file = targets_file
         self.city_db = city_db
         self.country_db = country_db
         self.results_json = results_json
         self.exclude_countries_fle = excl_countries_fle
         self.include_countries = include_countries
+        self.negative_cache = negative_cache
 
     @staticmethod
     def write_json_file(json_file: str, data: Dict[str, List]) -> None:
         print("Creating json file:", json_file)
-        tmp = json_file + '.tmp'
-        with Path(tmp).open('w', encoding='utf-8') as outfile:
-            json.dump(data, outfile, indent=2)
-        os.replace(tmp, json_file)
+        results_store.save(json_file, data)
         print("DONE")
 
     def get_servers_list(self) -> Optional[List[str]]:
@@ -80,53 +89,48 @@ class Scanner:
 
         return excludes
 
-    def scan(self, pings_num: int = 1, timeout_ms: int = 1000, workers: int = 10, all_a_records: bool = False, progress_container: Dict = None, vpn_speedtest: bool = False, vpn_ovpn_dir: str = 'ovpn', vpn_username: str = '', vpn_password: str = '', vpn_batch_size: int = 20, vpn_batch_interactive: bool = True, vpn_selected_domains: List[str] = None, stop_event: threading.Event = None) -> Tuple[Dict[str, List], set]:
+    def scan(self, pings_num: int = 1, timeout_ms: int = 1000, workers: int = 10, all_a_records: bool = False, progress_container: Dict = None, vpn_speedtest: bool = False, vpn_ovpn_dir: str = 'ovpn', vpn_username: str = '', vpn_password: str = '', vpn_batch_size: int = 20, vpn_batch_interactive: bool = True, vpn_selected_domains: List[str] = None, stop_event: threading.Event = None, vpn_concurrency: int = 1, vpn_engine: str = 'speedtest-cli', vpn_engine_options: Dict = None, vpn_retry_options: Dict = None) -> Tuple[Dict[str, ResultRecord], set]:
         domains = self.get_servers_list()
+        if self.negative_cache is not None:
+            domains, suppressed = self.negative_cache.partition(domains)
+            if suppressed:
+                logger.info("Skipping %s targets in failure back-off", len(suppressed))
         excl_countries = None
         include_countries = self.include_countries
 
-        endpoints_list: List[Tuple[str, float, str, str, str, Optional[float], Optional[float]]] = []
-        endpoints_dict: "OrderedDict[str, List]" = OrderedDict()
+        endpoints_list: List[ResultRecord] = []
+        endpoints_dict: "OrderedDict[str, ResultRecord]" = OrderedDict()
         
         # Load existing results for merging
         existing_results = {}
         if self.results_json and os.path.exists(self.results_json):
             try:
-                with open(self.results_json, 'r', encoding='utf-8') as f:
-                    existing_results = json.load(f)
-                    # Handle old list format conversion
-                    if isinstance(existing_results, list):
-                        temp_results = {}
-                        for entry in existing_results:
-                            if isinstance(entry, dict) and 'domain' in entry:
-                                domain = entry.pop('domain')
-                                temp_results[domain] = entry
-                        existing_results = temp_results
+                existing_results = results_store.load(self.results_json)
             except Exception as e:
                 logger.warning(f"Could not load existing results for merging: {e}")
 
         skipped_total = 0
         errors_total = 0
 
-        city_reader = geoip2.database.Reader(self.city_db)
-        country_reader = geoip2.database.Reader(self.country_db)
-        try:
-            return self._scan_inner(
+        with georeader.lease(self.city_db) as city_reader, georeader.lease(self.country_db) as country_reader:
+            endpoints_dict, failed_domains = self._scan_inner(
                 domains, excl_countries, include_countries, endpoints_list, endpoints_dict,
                 existing_results, city_reader, country_reader, pings_num, timeout_ms,
                 workers, all_a_records, progress_container, vpn_speedtest, vpn_ovpn_dir,
                 vpn_username, vpn_password, vpn_batch_size, vpn_batch_interactive,
-                vpn_selected_domains, stop_event
+                vpn_selected_domains, stop_event, vpn_concurrency, vpn_engine, vpn_engine_options,
+                vpn_retry_options
             )
-        finally:
-            city_reader.close()
-            country_reader.close()
+        if self.negative_cache is not None:
+            self.negative_cache.update(failed=failed_domains, succeeded=endpoints_dict.keys())
+        return endpoints_dict, failed_domains
 
     def _scan_inner(self, domains, excl_countries, include_countries, endpoints_list, endpoints_dict,
                     existing_results, city_reader, country_reader, pings_num, timeout_ms,
                     workers, all_a_records, progress_container, vpn_speedtest, vpn_ovpn_dir,
                     vpn_username, vpn_password, vpn_batch_size, vpn_batch_interactive,
-                    vpn_selected_domains, stop_event):
+                    vpn_selected_domains, stop_event, vpn_concurrency=1, vpn_engine='speedtest-cli', vpn_engine_options=None,
+                    vpn_retry_options=None):
         skipped_total = 0
         errors_total = 0
         failed_domains = set()
@@ -227,7 +231,7 @@ class Scanner:
                     if payload:
                         failed_domains.add(payload)
 
-        endpoints_list.sort(key=lambda x: x[1])
+        endpoints_list.sort(key=lambda record: record.latency_ms)
 
         retrieved_total = int(total_targets) - (skipped_total + errors_total)
 
@@ -247,58 +251,22 @@ class Scanner:
         logger.info("Errors:          %s / %s", errors_total, total_targets)
         logger.info("Total Retrieved:  %s / %s", retrieved_total, len(domains))
 
-        for item in endpoints_list:
-            domain = item[0]
-            # Merge with existing speedtest results if available
-            rx_speed = item[5]
-            tx_speed = item[6]
-            
-            if domain in existing_results:
-                old_data = existing_results[domain]
-                if isinstance(old_data, dict):
-                    if rx_speed is None: rx_speed = old_data.get('rx_speed_mbps')
-                    if tx_speed is None: tx_speed = old_data.get('tx_speed_mbps')
-            
-            # Preserve existing speedtest timestamps if carrying over old speed values
-            speedtest_ts = None
-            speedtest_failed_ts = None
-            speedtest_failed_reason = None
-            old_history = None
-            if domain in existing_results and isinstance(existing_results[domain], dict):
-                old_ts = existing_results[domain].get('speedtest_timestamp')
-                if old_ts:
-                    speedtest_ts = old_ts
-                old_failed_ts = existing_results[domain].get('speedtest_failed_timestamp')
-                if old_failed_ts:
-                    speedtest_failed_ts = old_failed_ts
-                speedtest_failed_reason = existing_results[domain].get('speedtest_failed_reason')
-                old_history = existing_results[domain].get('history')
-
-            entry = {
-                'latency_ms': item[1],
-                'ip': item[2],
-                'country': item[3],
-                'city': item[4],
-                'rx_speed_mbps': rx_speed,
-                'tx_speed_mbps': tx_speed,
-                'scan_timestamp': datetime.now(timezone.utc).isoformat(),
-                'speedtest_timestamp': speedtest_ts
-            }
-            if speedtest_failed_ts:
-                entry['speedtest_failed_timestamp'] = speedtest_failed_ts
-            if speedtest_failed_reason:
-                entry['speedtest_failed_reason'] = speedtest_failed_reason
-            if old_history:
-                entry['history'] = old_history
-            endpoints_dict[domain] = entry
+        for record in endpoints_list:
+            old_data = existing_results.get(record.domain)
+            record.scan_timestamp = datetime.now(timezone.utc).isoformat()
+            record.speedtest_timestamp = None
+            if old_data is not None:
+                # Merge with existing speedtest results and everything else the scan did not measure
+                for key, value in old_data.items():
+                    if key not in SCAN_FIELDS:
+                        record[key] = value
+            endpoints_dict[record.domain] = record
 
         if endpoints_list:
             # Merge new results into existing, preserving servers not in this scan
             merged = OrderedDict(existing_results)
+            # Failed domains keep their last results; the negative cache tracks the failure
             merged.update(endpoints_dict)
-            # Remove failed domains from results
-            for fd in failed_domains:
-                merged.pop(fd, None)
             self.write_json_file(json_file=self.results_json, data=merged)
             self.formatting.output('reset')
         else:
@@ -316,14 +284,16 @@ class Scanner:
                 progress,
                 batch_size=vpn_batch_size,
                 interactive=vpn_batch_interactive,
-                selected_domains=vpn_selected_domains
+                selected_domains=vpn_selected_domains,
+                concurrency=vpn_concurrency,
+                engine=vpn_engine,
+                engine_options=vpn_engine_options,
+                retry_options=vpn_retry_options
             )
             # Save results after speedtests (merge into existing)
             if endpoints_dict:
                 merged = OrderedDict(existing_results)
                 merged.update(endpoints_dict)
-                for fd in failed_domains:
-                    merged.pop(fd, None)
                 self.write_json_file(json_file=self.results_json, data=merged)
 
         return endpoints_dict, failed_domains
@@ -360,7 +330,7 @@ class Scanner:
 
     def _scan_one(self, domain: str, ip: str, pings_num: int, timeout_ms: int,
                   excl_countries: Optional[set], include_countries: Optional[set], city_reader, country_reader,
-                  lock: threading.Lock, progress: Dict[str, int]) -> Optional[Tuple[str, Optional[Tuple[str, float, str, str, str, Optional[float], Optional[float]]]]]:
+                  lock: threading.Lock, progress: Dict[str, int]) -> Optional[Tuple[str, Union[ResultRecord, str, None]]]:
         try:
             try:
                 country_result = country_reader.country(ip)
@@ -445,14 +415,22 @@ class Scanner:
             logger.info(msg)
             self.formatting.output('reset')
 
-        return ('ok', (domain, avg_latency, ip, country, city, None, None))
+        return ('ok', ResultRecord(domain, latency_ms=avg_latency, ip=ip, country=country, city=city,
+                                   rx_speed_mbps=None, tx_speed_mbps=None))
 
-    def _perform_vpn_speedtests(self, endpoints_dict: Dict, ovpn_dir: str, username: str, password: str, progress: Dict, batch_size: int = 20, interactive: bool = True, selected_domains: List[str] = None, stop_event: threading.Event = None, results_file: str = None, source: str = 'user'):
+    def _perform_vpn_speedtests(self, endpoints_dict: Dict, ovpn_dir: str, username: str, password: str, progress: Dict, batch_size: int = 20, interactive: bool = True, selected_domains: List[str] = None, stop_event: threading.Event = None, results_file: str = None, source: str = 'user', concurrency: int = 1, engine: str = 'speedtest-cli', engine_options: Dict = None, time_budget_s: float = None, data_budget_mb: float = None, retry_options: Dict = None, respect_quarantine: bool = True):
         """Perform VPN speedtests on endpoints that have matching .ovpn files."""
         from generate.vpn_batch_helper import _perform_vpn_speedtests_batch
         return _perform_vpn_speedtests_batch(
             endpoints_dict, ovpn_dir, username, password, progress,
             batch_size, interactive, selected_domains, self.formatting,
-            stop_event=stop_event, results_file=results_file, source=source
+            stop_event=stop_event, results_file=results_file, source=source,
+            concurrency=concurrency,
+            engine=engine,
+            engine_options=engine_options,
+            time_budget_s=time_budget_s,
+            data_budget_mb=data_budget_mb,
+            retry_options=retry_options,
+            respect_quarantine=respect_quarantine
         )
 
@@ -1,5 +1,7 @@
-"""Speedtest module using speedtest-cli."""
+"""Speedtest module: native throughput engine or speedtest-cli."""
 
+import os
+import sys
 import subprocess
 import json
 import logging
@@ -7,21 +9,75 @@ from typing import Optional, Dict
 
 logger = logging.getLogger(__name__)
 
+ENGINES = ('speedtest-cli', 'native')
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 class SpeedTest:
     """Run network speedtests."""
-    
-    @staticmethod
-    def run_speedtest(timeout: int = 60) -> Optional[Dict[str, float]]:
+
+    def __init__(self, engine: str = 'speedtest-cli', engine_options: Optional[Dict] = None):
+        """
+        Args:
+            engine: 'speedtest-cli' or 'native' (generate.throughput)
+            engine_options: ThroughputEngine kwargs (generate.throughput.ENGINE_OPTIONS)
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown speedtest engine: {engine}. Pick from: {', '.join(ENGINES)}")
+        self.engine = engine
+        self.engine_options = dict(engine_options or {})
+
+    def run_speedtest(self, timeout: int = 60, netns=None) -> Optional[Dict[str, float]]:
         """
         Run speedtest and return results.
         
         Args:
             timeout: Speedtest timeout in seconds
+            netns: Optional NetNamespace to run the speedtest inside
             
         Returns:
-            Dictionary with download_mbps, upload_mbps, ping_ms or None on failure
+            Dictionary with download_mbps, upload_mbps, ping_ms, bytes_total (and per-direction
+            durations for the native engine) or None on failure
         """
+        if self.engine == 'native':
+            return self._run_native(timeout, netns)
+        return self._run_speedtest_cli(timeout, netns)
+
+    def _run_native(self, timeout: int, netns=None) -> Optional[Dict[str, float]]:
+        """Measure with the in-process throughput engine (in a child process when inside a namespace)."""
+        try:
+            from generate.throughput import ENGINE_OPTIONS, ThroughputEngine
+            logger.info(f"Running native speedtest against {self.engine_options.get('target', 'cloudflare')}...")
+            unknown = set(self.engine_options).difference(ENGINE_OPTIONS)
+            if unknown:
+                logger.warning(f"Ignoring unknown native speedtest options: {', '.join(sorted(unknown))}")
+            options = {key: val for key, val in self.engine_options.items() if key in ENGINE_OPTIONS}
+            if netns is None:
+                return ThroughputEngine(**options).run()
+
+            cmd = [sys.executable, '-m', 'generate.throughput', '--json']
+            for key, val in options.items():
+                if val is not None:
+                    cmd += [f"--{key.replace('_', '-')}", str(val)]
+            result = subprocess.run(
+                netns.wrap(cmd),
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                cwd=PROJECT_ROOT
+            )
+            if result.returncode != 0:
+                logger.warning(f"Native speedtest failed: {result.stderr.strip()[-200:]}")
+                return None
+            return json.loads(result.stdout)
+        except subprocess.TimeoutExpired:
+            return None
+        except Exception as e:
+            logger.warning(f"Native speedtest failed: {e}")
+            return None
+
+    def _run_speedtest_cli(self, timeout: int, netns=None) -> Optional[Dict[str, float]]:
+        """Shell out to speedtest-cli --json."""
         try:
             logger.info("Running speedtest via speedtest-cli...")
             
@@ -33,8 +89,11 @@ class SpeedTest:
             
             # Run speedtest-cli with JSON output
             # Use smaller timeout for the command call to ensure we don't hang forever
+            cmd = ["speedtest-cli", "--json", "--secure", "--timeout", "30"]
+            if netns:
+                cmd = netns.wrap(cmd)
             result = subprocess.run(
-                ["speedtest-cli", "--json", "--secure", "--timeout", "30"],
+                cmd,
                 capture_output=True,
                 text=True,
                 timeout=timeout
@@ -54,7 +113,8 @@ class SpeedTest:
             return {
                 'download_mbps': download_mbps,
                 'upload_mbps': upload_mbps,
-                'ping_ms': ping_ms
+                'ping_ms': ping_ms,
+                'bytes_total': int(data.get('bytes_sent', 0)) + int(data.get('bytes_received', 0))
             }
             
         except subprocess.TimeoutExpired:
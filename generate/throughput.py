@@ -0,0 +1,345 @@
+"""In-process HTTP throughput measurement with parallel streams.
+
+Replaces the speedtest-cli round trip (server discovery, config download,
+latency selection) with direct transfers against a known target endpoint.
+Run as ``python -m generate.throughput --json`` to measure from inside a
+network namespace.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK = 64 * 1024
+CONVERGENCE_WINDOW = 4  # Samples compared when checking for a stable rate
+REQUEST_BYTES = 25_000_000  # Size of each download request / upload body per stream
+# ThroughputEngine keyword arguments, each also a --flag of main()
+ENGINE_OPTIONS = ('target', 'streams', 'duration', 'max_bytes', 'interval', 'min_duration', 'cv_threshold',
+                  'latency_probes', 'timeout')
+
+# Named target endpoints. "{bytes}" in a download URL is replaced by the request size.
+TARGETS: Dict[str, Dict[str, str]] = {
+    'cloudflare': {
+        'download': 'https://speed.cloudflare.com/__down?bytes={bytes}',
+        'upload': 'https://speed.cloudflare.com/__up',
+        'latency': 'https://speed.cloudflare.com/__down?bytes=0',
+    },
+}
+
+
+def register_target(name: str, download: str, upload: str, latency: Optional[str] = None) -> None:
+    """Register a named target endpoint set."""
+    TARGETS[name] = {'download': download, 'upload': upload, 'latency': latency or download.format(bytes=0)}
+
+
+def resolve_target(target: str) -> Dict[str, str]:
+    """Return endpoint URLs for a registered target name or a base URL of a LocalThroughputServer."""
+    if target in TARGETS:
+        return TARGETS[target]
+    if target.startswith(('http://', 'https://')):
+        base = target.rstrip('/')
+        return {
+            'download': base + '/download?bytes={bytes}',
+            'upload': base + '/upload',
+            'latency': base + '/download?bytes=0',
+        }
+    raise ValueError(f"Unknown throughput target: {target}. Pick from: {', '.join(TARGETS)} or a base URL")
+
+
+def _connect(url: str, timeout: float) -> http.client.HTTPConnection:
+    parsed = urlparse(url)
+    cls = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+    return cls(parsed.hostname, parsed.port, timeout=timeout)
+
+
+def _path(url: str) -> str:
+    parsed = urlparse(url)
+    return parsed.path + ('?' + parsed.query if parsed.query else '')
+
+
+class ThroughputEngine:
+    """Measure download, upload and latency over parallel HTTP streams."""
+
+    def __init__(self, target: str = 'cloudflare', streams: int = 4, duration: float = 10.0,
+                 max_bytes: Optional[int] = None, interval: float = 0.5,
+                 min_duration: float = 2.0, cv_threshold: float = 0.1,
+                 latency_probes: int = 5, timeout: float = 10.0):
+        """
+        Args:
+            target: Registered target name or base URL of a LocalThroughputServer
+            streams: Number of parallel connections per direction
+            duration: Maximum seconds to run each direction
+            max_bytes: Optional byte budget per direction (stops early when reached)
+            interval: Sampling interval in seconds
+            min_duration: Seconds to run before a direction may stop on convergence
+            cv_threshold: Stop once the coefficient of variation of the last
+                CONVERGENCE_WINDOW samples drops below this (0 disables)
+            latency_probes: Number of small requests used for the latency measurement
+            timeout: Socket timeout in seconds
+        """
+        self.endpoints = resolve_target(target)
+        self.streams = max(1, int(streams))
+        self.duration = float(duration)
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self.interval = float(interval)
+        self.min_duration = min(float(min_duration), self.duration)
+        self.cv_threshold = float(cv_threshold)
+        self.latency_probes = max(1, int(latency_probes))
+        self.timeout = float(timeout)
+
+    def measure_latency(self) -> Optional[float]:
+        """Median request round trip over one kept-alive connection, in ms."""
+        url = self.endpoints['latency']
+        conn = _connect(url, self.timeout)
+        rtts = []
+        try:
+            for _ in range(self.latency_probes + 1):
+                start = time.perf_counter()
+                conn.request('GET', _path(url))
+                conn.getresponse().read()
+                rtts.append((time.perf_counter() - start) * 1000)
+        except (OSError, http.client.HTTPException) as e:
+            logger.warning(f"Latency probe failed: {e}")
+        finally:
+            conn.close()
+        # The first request includes the TCP/TLS handshake
+        rtts = rtts[1:]
+        return round(statistics.median(rtts), 2) if rtts else None
+
+    def _download_stream(self, counters: List[int], idx: int, stop: threading.Event) -> None:
+        url = self.endpoints['download'].format(bytes=REQUEST_BYTES)
+        while not stop.is_set():
+            conn = _connect(url, self.timeout)
+            try:
+                conn.request('GET', _path(url))
+                resp = conn.getresponse()
+                while not stop.is_set():
+                    data = resp.read(READ_CHUNK)
+                    if not data:
+                        break
+                    counters[idx] += len(data)
+            except (OSError, http.client.HTTPException):
+                if not stop.is_set():
+                    time.sleep(0.1)
+            finally:
+                conn.close()
+
+    def _upload_stream(self, counters: List[int], idx: int, stop: threading.Event) -> None:
+        url = self.endpoints['upload']
+        payload = b'\0' * READ_CHUNK
+        while not stop.is_set():
+            conn = _connect(url, self.timeout)
+            try:
+                conn.putrequest('POST', _path(url))
+                conn.putheader('Content-Type', 'application/octet-stream')
+                conn.putheader('Content-Length', str(REQUEST_BYTES))
+                conn.endheaders()
+                sent = 0
+                while sent < REQUEST_BYTES and not stop.is_set():
+                    n = min(READ_CHUNK, REQUEST_BYTES - sent)
+                    conn.send(payload[:n])
+                    sent += n
+                    counters[idx] += n
+                if sent >= REQUEST_BYTES:
+                    conn.getresponse().read()
+            except (OSError, http.client.HTTPException):
+                if not stop.is_set():
+                    time.sleep(0.1)
+            finally:
+                conn.close()
+
+    def _converged(self, samples: List[float]) -> bool:
+        """True if the last CONVERGENCE_WINDOW samples vary less than cv_threshold."""
+        # The first sample covers TCP slow start and is never part of the window
+        window = samples[1:][-CONVERGENCE_WINDOW:]
+        if self.cv_threshold <= 0 or len(window) < CONVERGENCE_WINDOW:
+            return False
+        mean = statistics.fmean(window)
+        return mean > 0 and statistics.pstdev(window) / mean < self.cv_threshold
+
+    def _measure(self, stream_fn) -> Dict:
+        """Run *stream_fn* on all streams and sample the aggregate rate every interval."""
+        counters = [0] * self.streams
+        stop = threading.Event()
+        threads = [threading.Thread(target=stream_fn, args=(counters, i, stop), daemon=True)
+                   for i in range(self.streams)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+
+        samples = []
+        last_total = 0
+        last_time = start
+        converged = False
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            total = sum(counters)
+            samples.append(round((total - last_total) * 8 / (now - last_time) / 1_000_000, 2))
+            last_total, last_time = total, now
+            if now - start >= self.duration:
+                break
+            if now - start >= self.min_duration and self._converged(samples):
+                converged = True
+                break
+            if self.max_bytes and total >= self.max_bytes:
+                break
+        stop.set()
+        elapsed = last_time - start
+        for t in threads:
+            t.join(timeout=self.timeout)
+
+        if converged:
+            # Steady-state rate, excluding the slow-start ramp
+            mbps = round(statistics.fmean(samples[-CONVERGENCE_WINDOW:]), 2)
+        else:
+            mbps = round(last_total * 8 / elapsed / 1_000_000, 2) if elapsed > 0 else 0.0
+        return {
+            'mbps': mbps,
+            'bytes': last_total,
+            'duration_s': round(elapsed, 2),
+            'converged': converged,
+            'samples': samples,
+        }
+
+    def measure_download(self) -> Dict:
+        return self._measure(self._download_stream)
+
+    def measure_upload(self) -> Dict:
+        return self._measure(self._upload_stream)
+
+    def run(self) -> Optional[Dict]:
+        """Measure latency, download and upload. Returns None if nothing was transferred."""
+        probe_start = time.perf_counter()
+        ping_ms = self.measure_latency()
+        latency_probe_s = round(time.perf_counter() - probe_start, 3)
+        download = self.measure_download()
+        upload = self.measure_upload()
+        if not download['bytes'] and not upload['bytes']:
+            return None
+        return {
+            'download_mbps': download['mbps'],
+            'upload_mbps': upload['mbps'],
+            'ping_ms': ping_ms,
+            'bytes_total': download['bytes'] + upload['bytes'],
+            'download_duration_s': download['duration_s'],
+            'upload_duration_s': upload['duration_s'],
+            'converged': download['converged'] and upload['converged'],
+            'latency_probe_s': latency_probe_s,
+            'download_samples': download['samples'],
+            'upload_samples': upload['samples'],
+        }
+
+
+class _ThroughputHandler(BaseHTTPRequestHandler):
+    """GET /download?bytes=N streams N zero bytes; POST /upload discards the body."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        size = int(query.get('bytes', ['0'])[0])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        chunk = b'\0' * READ_CHUNK
+        try:
+            while size > 0:
+                n = min(size, READ_CHUNK)
+                self.wfile.write(chunk[:n])
+                size -= n
+        except OSError:
+            self.close_connection = True
+
+    def do_POST(self):
+        remaining = int(self.headers.get('Content-Length', 0))
+        try:
+            while remaining > 0:
+                data = self.rfile.read(min(remaining, READ_CHUNK))
+                if not data:
+                    self.close_connection = True
+                    return
+                remaining -= len(data)
+        except OSError:
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalThroughputServer:
+    """Loopback throughput target for tests and LAN baselines.
+
+    Usage::
+
+        with LocalThroughputServer() as server:
+            ThroughputEngine(target=server.url).run()
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self._server = ThreadingHTTPServer((host, port), _ThroughputHandler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'LocalThroughputServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Measure HTTP throughput to a target endpoint')
+    parser.add_argument('--target', default='cloudflare')
+    parser.add_argument('--streams', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--max-bytes', type=int, default=None)
+    parser.add_argument('--min-duration', type=float, default=2.0)
+    parser.add_argument('--cv-threshold', type=float, default=0.1)
+    parser.add_argument('--interval', type=float, default=0.5)
+    parser.add_argument('--latency-probes', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+    args = parser.parse_args(argv)
+
+    engine = ThroughputEngine(**{key: getattr(args, key) for key in ENGINE_OPTIONS})
+    result = engine.run()
+    if result is None:
+        return 1
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"DL={result['download_mbps']} Mbps, UL={result['upload_mbps']} Mbps, ping={result['ping_ms']} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
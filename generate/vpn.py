@@ -2,27 +2,56 @@
 
 import os
 import re
+import select
+import shutil
+import socket
 import subprocess
+import tempfile
 import time
 import logging
 import signal
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 ROUTING_TABLE_ID = "100"
 ROUTING_RULE_PRIORITY = "100"
+OPENVPN_BIN = os.environ.get('OPENVPN_BIN', 'openvpn')
+# Management-interface states reached once the TLS handshake and authentication are done
+HANDSHAKE_DONE_STATES = ('GET_CONFIG', 'ASSIGN_IP', 'ADD_ROUTES', 'CONNECTED')
+TEARDOWN_GRACE_S = 5  # SIGTERM grace period before SIGKILL
 
 
 class VPNManager:
     """Manage OpenVPN connections."""
     
-    def __init__(self):
+    def __init__(self, dev: str = "tun0", table_id: str = ROUTING_TABLE_ID,
+                 rule_priority: str = ROUTING_RULE_PRIORITY, netns=None):
+        """
+        Args:
+            dev: Name of the tun device OpenVPN should create
+            table_id: Policy routing table used to keep web access off the tunnel
+            rule_priority: Priority of the policy routing rule
+            netns: Optional NetNamespace to run the tunnel in (no host routing changes)
+        """
         self.process: Optional[subprocess.Popen] = None
         self.connected = False
+        self.dev = dev
+        self.table_id = str(table_id)
+        self.rule_priority = str(rule_priority)
+        self.netns = netns
+        self.last_timings: Dict[str, float] = {}
+        self.last_failure: Optional[str] = None
+        self.last_output = ''
+        self._state_times: Dict[str, float] = {}
+        self._mgmt: Optional[socket.socket] = None
         self._original_gw: Optional[str] = None
         self._original_dev: Optional[str] = None
         self._eth0_ip: Optional[str] = None
+
+    def _wrap(self, cmd: List[str]) -> List[str]:
+        """Prefix *cmd* so it runs in this manager's namespace, if any."""
+        return self.netns.wrap(cmd) if self.netns else cmd
         
     def connect(self, ovpn_file: str, username: str, password: str, timeout: int = 30) -> bool:
         """
@@ -35,7 +64,10 @@ class VPNManager:
             timeout: Connection timeout in seconds
             
         Returns:
-            True if connection successful, False otherwise
+            True if connection successful, False otherwise. Per-phase connect
+            durations (spawn, handshake, auth, route setup, total) are left in
+            ``last_timings``, the failure reason in ``last_failure`` and the
+            tail of the OpenVPN output in ``last_output``.
         """
         if self.connected:
             logger.warning("VPN already connected, disconnecting first")
@@ -45,102 +77,235 @@ class VPNManager:
             logger.error(f"OpenVPN config file not found: {ovpn_file}")
             return False
         
+        self.last_timings = {}
+        self.last_failure = None
+        self.last_output = ''
+        self._state_times = {}
         auth_file = None
+        mgmt_dir = None
+        server = None
         try:
             # Create unique auth file
-            import tempfile
             with tempfile.NamedTemporaryFile(mode='w', prefix='vpn_auth_', delete=False) as f:
                 auth_file = f.name
                 f.write(f"{username}\n{password}\n")
             os.chmod(auth_file, 0o600)
+
+            # OpenVPN connects back to this socket and holds until we release it,
+            # so no state event can be missed
+            mgmt_dir = tempfile.mkdtemp(prefix='vpn_mgmt_')
+            mgmt_path = os.path.join(mgmt_dir, 'mgmt.sock')
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(mgmt_path)
+            server.listen(1)
             
             # Start OpenVPN process without --daemon to manage it directly
-            self._save_original_route()
-            cmd = [
-                "openvpn",
+            if not self.netns:
+                self._save_original_route()
+            cmd = self._wrap([
+                OPENVPN_BIN,
                 "--config", ovpn_file,
                 "--auth-user-pass", auth_file,
                 "--nobind",
-                "--writepid", "/tmp/openvpn.pid"
-            ]
+                "--dev", self.dev,
+                "--dev-type", "tun",
+                "--writepid", f"/tmp/openvpn-{self.dev}.pid",
+                "--management", mgmt_path, "unix",
+                "--management-client",
+                "--management-hold"
+            ])
             
             # Use subprocess.Popen - capture output for diagnostics
             popen_kwargs = dict(
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
             )
             if hasattr(os, 'setsid'):
                 popen_kwargs['preexec_fn'] = os.setsid  # Unix only — create process group
+            start = time.monotonic()
             self.process = subprocess.Popen(cmd, **popen_kwargs)
-            
-            # Wait for connection to establish
-            for i in range(timeout):
-                if self.process.poll() is not None:
-                    err_output = ''
-                    out_output = ''
-                    if self.process.stdout:
-                        try:
-                            out_output = self.process.stdout.read().decode('utf-8', errors='ignore').strip()
-                        except Exception:
-                            pass
-                    if self.process.stderr:
-                        try:
-                            err_output = self.process.stderr.read().decode('utf-8', errors='ignore').strip()
-                        except Exception:
-                            pass
-                    combined = (out_output + '\n' + err_output).strip()
-                    if 'AUTH_FAILED' in combined:
-                        logger.warning(f"VPN auth failed for {os.path.basename(ovpn_file)} — server rejected credentials")
-                    elif combined:
-                        logger.warning(f"OpenVPN exited with code {self.process.returncode}: {combined[:200]}")
-                    return False
-                
-                time.sleep(1)
-                if self._verify_connection():
-                    self.connected = True
-                    logger.info("VPN connection established on tun0")
+
+            if self._await_connected(server, start + timeout, ovpn_file):
+                self.connected = True
+                if not self.netns:
                     self._preserve_web_access()
-                    return True
-                    
-            self.disconnect()
+                self._record_connect_timings(start)
+                logger.info(f"VPN connection established on {self.dev} in {self.last_timings['connect_s']}s")
+                return True
+
+            if self.process.poll() is None:
+                self.disconnect()
             return False
             
-        except subprocess.TimeoutExpired:
-            logger.error("OpenVPN command timed out")
-            return False
         except Exception as e:
             logger.error(f"VPN connection error: {e}")
             return False
         finally:
-            # Clean up auth file
+            # Clean up auth file and management socket path (an accepted connection stays open)
             if auth_file and os.path.exists(auth_file):
                 os.remove(auth_file)
+            if server:
+                server.close()
+            if mgmt_dir:
+                shutil.rmtree(mgmt_dir, ignore_errors=True)
+
+    def _await_connected(self, server: socket.socket, deadline: float, ovpn_file: str) -> bool:
+        """Follow management-interface events until the tunnel is CONNECTED or fails."""
+        name = os.path.basename(ovpn_file)
+        stdout_fd = self.process.stdout.fileno()
+        conn = None
+        mgmt_open = True
+        released = None
+        buf = b''
+        output = b''
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.last_failure = 'timeout'
+                    logger.warning(f"VPN connect timed out for {name}")
+                    return False
+                watch = [stdout_fd]
+                if mgmt_open:
+                    watch.append(conn if conn is not None else server)
+                ready, _, _ = select.select(watch, [], [], remaining)
+
+                if stdout_fd in ready:
+                    chunk = os.read(stdout_fd, 4096)
+                    if not chunk:
+                        # Output closed: OpenVPN exited before reaching CONNECTED
+                        self.process.wait(timeout=5)
+                        combined = output.decode('utf-8', errors='ignore').strip()
+                        if 'AUTH_FAILED' in combined:
+                            self.last_failure = 'auth_failed'
+                            logger.warning(f"VPN auth failed for {name} — server rejected credentials")
+                        else:
+                            self.last_failure = self.last_failure or 'exited'
+                            if combined:
+                                logger.warning(f"OpenVPN exited with code {self.process.returncode}: {combined[-200:]}")
+                        return False
+                    output = (output + chunk)[-4096:]
+
+                if conn is None and server in ready:
+                    conn, _ = server.accept()
+                    conn.sendall(b"state on\nhold release\n")
+                    released = time.monotonic()
+                    self._state_times['RELEASED'] = released
+                elif conn is not None and conn in ready:
+                    data = conn.recv(4096)
+                    if not data:
+                        # Management closed; the process exit is picked up on stdout
+                        conn.close()
+                        conn = None
+                        mgmt_open = False
+                        continue
+                    buf += data
+                    while b'\n' in buf:
+                        line, buf = buf.split(b'\n', 1)
+                        state = self._handle_mgmt_line(line.decode('utf-8', errors='ignore').strip(), released, name)
+                        if state is not None:
+                            if state:
+                                self._mgmt, conn = conn, None
+                            return state
+        finally:
+            self.last_output = output.decode('utf-8', errors='ignore')
+            if conn is not None:
+                conn.close()
+
+    def _record_connect_timings(self, start: float) -> None:
+        """Derive per-phase connect durations from the management state timeline."""
+        now = time.monotonic()
+        times = self._state_times
+        self.last_timings['connect_s'] = round(now - start, 3)
+        if 'RELEASED' in times:
+            self.last_timings['spawn_s'] = round(times['RELEASED'] - start, 3)
+        if 'AUTH' in times and 'GET_CONFIG' in times:
+            self.last_timings['auth_s'] = round(times['GET_CONFIG'] - times['AUTH'], 3)
+        # Address/route application plus our policy routing for web access
+        routes_start = times.get('ASSIGN_IP') or times.get('ADD_ROUTES')
+        if routes_start:
+            self.last_timings['route_setup_s'] = round(now - routes_start, 3)
+
+    def _handle_mgmt_line(self, line: str, released: Optional[float], name: str) -> Optional[bool]:
+        """React to one management-interface line: True when usable, False on failure, None otherwise."""
+        if line.startswith('>STATE:'):
+            # >STATE:<unix time>,<state>,<reason>,<local ip>,<remote ip>,...
+            fields = line[len('>STATE:'):].split(',')
+            state = fields[1] if len(fields) > 1 else ''
+            reason = fields[2] if len(fields) > 2 else ''
+            self._state_times.setdefault(state, time.monotonic())
+            if state in HANDSHAKE_DONE_STATES and 'handshake_s' not in self.last_timings and released:
+                self.last_timings['handshake_s'] = round(time.monotonic() - released, 3)
+            if state == 'CONNECTED':
+                if reason == 'ERROR':
+                    self.last_failure = 'connect_error'
+                    logger.warning(f"OpenVPN connected with errors for {name} (routes not fully applied)")
+                    return False
+                return True
+            if state in ('RECONNECTING', 'EXITING'):
+                self.last_failure = 'auth_failed' if reason == 'auth-failure' else (reason or state.lower())
+                logger.warning(f"OpenVPN {state.lower()} for {name} before connecting: {reason}")
+                return False
+        elif line.startswith('>PASSWORD:Verification Failed'):
+            self.last_failure = 'auth_failed'
+            logger.warning(f"VPN auth failed for {name} — server rejected credentials")
+            return False
+        elif line.startswith('>FATAL:'):
+            self.last_failure = 'fatal'
+            logger.warning(f"OpenVPN fatal error for {name}: {line[len('>FATAL:'):]}")
+            return False
+        return None
                 
     def disconnect(self) -> None:
-        """Disconnect from VPN."""
-        self._restore_routing()
+        """Disconnect from VPN and wait until the tunnel is fully torn down.
+
+        The teardown duration is recorded as ``last_timings['teardown_s']``.
+        """
+        start = time.monotonic()
         try:
             if self.process:
-                # Kill the process group (Unix) or just the process (Windows)
-                if hasattr(os, 'killpg'):
-                    try:
-                        os.killpg(os.getpgid(self.process.pid), signal.SIGTERM)
-                    except (ProcessLookupError, OSError):
-                        self.process.terminate()
-                else:
-                    self.process.terminate()
-                self.process.wait(timeout=5)
-                self.process = None
-            
-            # Fallback cleanup
-            subprocess.run(["killall", "openvpn"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            time.sleep(1)
-            self.connected = False
+                self._stop_process()
+            if self._mgmt:
+                self._mgmt.close()
+                self._mgmt = None
+            if not self.netns:
+                self._restore_routing()
+            if self._tun_exists():
+                logger.warning(f"{self.dev} still present after OpenVPN exited, removing it")
+                subprocess.run(self._wrap(["ip", "link", "del", "dev", self.dev]), capture_output=True)
         except Exception as e:
-            # Last resort
-            subprocess.run(["killall", "-9", "openvpn"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            logger.warning(f"VPN teardown error on {self.dev}: {e}")
+        finally:
             self.connected = False
-            
+            self.last_timings['teardown_s'] = round(time.monotonic() - start, 3)
+
+    def _stop_process(self) -> None:
+        """SIGTERM this manager's OpenVPN process group, escalating to SIGKILL after TEARDOWN_GRACE_S."""
+        process = self.process
+        try:
+            if process.poll() is None:
+                self._signal_process(signal.SIGTERM)
+                try:
+                    process.wait(timeout=TEARDOWN_GRACE_S)
+                except subprocess.TimeoutExpired:
+                    logger.warning(f"OpenVPN on {self.dev} ignored SIGTERM, killing it")
+                    self._signal_process(signal.SIGKILL)
+                    process.wait()
+        finally:
+            if process.stdout:
+                process.stdout.close()
+            self.process = None
+
+    def _signal_process(self, sig: int) -> None:
+        # Kill the process group (Unix) or just the process (Windows)
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(os.getpgid(self.process.pid), sig)
+            else:
+                self.process.send_signal(sig)
+        except (ProcessLookupError, OSError):
+            pass
+
     def _save_original_route(self) -> None:
         """Save the original default gateway and eth0 IP before VPN connects."""
         try:
@@ -172,40 +337,40 @@ class VPNManager:
             logger.warning("Missing routing info, cannot preserve web access")
             return
         try:
-            # Add default route to custom table via original gateway
-            subprocess.run(
-                ["ip", "route", "add", "default", "via", self._original_gw,
-                 "dev", self._original_dev, "table", ROUTING_TABLE_ID],
-                capture_output=True
-            )
-            # Traffic FROM our container IP uses the custom table
-            subprocess.run(
-                ["ip", "rule", "add", "from", self._eth0_ip,
-                 "table", ROUTING_TABLE_ID, "priority", ROUTING_RULE_PRIORITY],
-                capture_output=True
-            )
+            self._ip_batch([
+                # Default route in the custom table via the original gateway
+                f"route add default via {self._original_gw} dev {self._original_dev} table {self.table_id}",
+                # Traffic FROM our container IP uses the custom table
+                f"rule add from {self._eth0_ip} table {self.table_id} priority {self.rule_priority}",
+            ])
         except Exception as e:
             logger.warning(f"Failed to add policy route: {e}")
 
     def _restore_routing(self) -> None:
         """Remove policy routing rules added by _preserve_web_access."""
         try:
-            subprocess.run(
-                ["ip", "rule", "del", "table", ROUTING_TABLE_ID],
-                capture_output=True
-            )
-            subprocess.run(
-                ["ip", "route", "flush", "table", ROUTING_TABLE_ID],
-                capture_output=True
-            )
+            self._ip_batch([
+                f"rule del table {self.table_id}",
+                f"route flush table {self.table_id}",
+            ])
         except Exception as e:
             logger.warning(f"Failed to remove policy route: {e}")
 
-    def _verify_connection(self) -> bool:
-        """Verify VPN connection by checking for tun interface."""
+    @staticmethod
+    def _ip_batch(commands: List[str]) -> None:
+        """Apply several ip(8) commands with one process (-force keeps going past errors)."""
+        subprocess.run(
+            ["ip", "-force", "-batch", "-"],
+            input="\n".join(commands) + "\n",
+            capture_output=True,
+            text=True
+        )
+
+    def _tun_exists(self) -> bool:
+        """True if this manager's tun device is present."""
         try:
             result = subprocess.run(
-                ["ip", "addr", "show", "tun0"],
+                self._wrap(["ip", "link", "show", "dev", self.dev]),
                 capture_output=True,
                 text=True
             )
@@ -1,21 +1,205 @@
 """VPN speedtest helper - batch processing logic."""
 
 import os
-import json
 import sys
+import queue
 import logging
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from pathlib import Path
 
 from generate.vpn import VPNManager
 from generate.speedtest import SpeedTest
+from generate.netns import NetNamespace
+from generate.ovpn_catalog import get_catalog
+from generate import results_store
+from generate.planner import Budget, plan_endpoints
+from generate.retry import RetryPolicy, classify_failure, is_quarantined
 
 MAX_HISTORY = 50  # Keep last N history entries per server
+MAX_CONCURRENCY = 32  # Upper bound on parallel tunnels (one namespace each)
+# Per-test timing phases stored in history records under 'timings', in execution order
+PHASES = ('namespace_s', 'retry_s', 'spawn_s', 'handshake_s', 'auth_s', 'route_setup_s', 'connect_s',
+          'latency_probe_s', 'download_s', 'upload_s', 'speedtest_s', 'teardown_s', 'total_s')
 logger = logging.getLogger(__name__)
 
-def _perform_vpn_speedtests_batch(endpoints_dict, ovpn_dir, username, password, progress, batch_size=20, interactive=True, selected_domains=None, formatting=None, stop_event=None, results_file=None, source='user'):
-    """Perform VPN speedtests on endpoints that have matching .ovpn files with batch processing."""
+
+def _record_outcome(endpoints_dict, domain, event, result, now_iso, source, detail=None, timings=None,
+                    failure_class=None, attempts=1, policy=None):
+    """Store a speedtest outcome (success or failure event) on the endpoint's result entry.
+
+    With a RetryPolicy, the entry's failure streak and quarantine are updated too.
+    """
+    entry = endpoints_dict.get(domain)
+    if not isinstance(entry, Mapping):
+        return
+    history = entry.setdefault('history', [])
+    if event == 'success':
+        entry.pop('failure_class', None)
+        if policy:
+            policy.record(entry, None)
+        entry['rx_speed_mbps'] = result['download_mbps']
+        entry['tx_speed_mbps'] = result['upload_mbps']
+        entry['speedtest_timestamp'] = now_iso
+        entry['tunnel_latency_ms'] = result.get('ping_ms')
+        entry['download_duration_s'] = result.get('download_duration_s')
+        entry['upload_duration_s'] = result.get('upload_duration_s')
+        entry.pop('speedtest_failed_timestamp', None)
+        entry.pop('speedtest_failed_reason', None)
+        history.append({'timestamp': now_iso, 'event': 'success', 'source': source,
+                        'download_mbps': result['download_mbps'], 'upload_mbps': result['upload_mbps'],
+                        'ping_ms': result.get('ping_ms'), 'bytes_total': result.get('bytes_total'),
+                        'download_duration_s': result.get('download_duration_s'),
+                        'upload_duration_s': result.get('upload_duration_s')})
+    else:
+        entry['speedtest_failed_timestamp'] = now_iso
+        entry['speedtest_failed_reason'] = event
+        record = {'timestamp': now_iso, 'event': event, 'source': source}
+        if detail:
+            record['detail'] = detail
+        if failure_class:
+            entry['failure_class'] = failure_class
+            record['failure_class'] = failure_class
+            if policy:
+                policy.record(entry, failure_class, datetime.fromisoformat(now_iso))
+        history.append(record)
+    if attempts > 1:
+        history[-1]['attempts'] = attempts
+    if timings:
+        history[-1]['timings'] = timings
+    del history[:-MAX_HISTORY]
+
+
+def _save_results(endpoints_dict, results_file):
+    """Incremental save of the results file after each server."""
+    if not results_file:
+        return
+    try:
+        results_store.save(results_file, endpoints_dict)
+    except Exception:
+        pass
+
+
+def _run_endpoint_test(vpn_manager, speedtest, ovpn_file, username, password):
+    """Connect, measure and disconnect one endpoint. Returns (event, result, timings)."""
+    event, result = 'vpn_failed', None
+    started = time.monotonic()
+    speedtest_s = None
+    try:
+        if vpn_manager.connect(ovpn_file, username, password):
+            speedtest_start = time.monotonic()
+            result = speedtest.run_speedtest(netns=vpn_manager.netns)
+            speedtest_s = round(time.monotonic() - speedtest_start, 3)
+            event = 'success' if result else 'speedtest_failed'
+    finally:
+        vpn_manager.disconnect()
+    timings = dict(vpn_manager.last_timings)
+    if speedtest_s is not None:
+        timings['speedtest_s'] = speedtest_s
+    if result:
+        # Breakdown reported by the native engine
+        for phase, key in (('latency_probe_s', 'latency_probe_s'), ('download_s', 'download_duration_s'),
+                           ('upload_s', 'upload_duration_s')):
+            if result.get(key) is not None:
+                timings[phase] = result[key]
+    timings['total_s'] = round(time.monotonic() - started, 3)
+    return event, result or None, timings
+
+
+def _run_with_retries(vpn_manager, speedtest, ovpn_file, username, password, policy, stop_event=None):
+    """Run one endpoint, retrying transient failures with backoff.
+
+    Returns (event, result, timings, failure_class, attempts); failure_class is
+    None on success. Timings are those of the final attempt, with the time spent
+    on earlier attempts and backoff as 'retry_s' and 'total_s' covering all of it.
+    """
+    started = time.monotonic()
+    attempt = 1
+    while True:
+        attempt_start = time.monotonic()
+        event, result, timings = _run_endpoint_test(vpn_manager, speedtest, ovpn_file, username, password)
+        failure_class = None
+        if event != 'success':
+            failure_class = classify_failure(event, vpn_manager.last_failure, vpn_manager.last_output)
+        if failure_class is None or not policy.should_retry(failure_class, attempt):
+            break
+        logger.info(f"{os.path.basename(ovpn_file)}: {failure_class} failure, retry {attempt}/{policy.max_retries} in {policy.delay(attempt):g}s")
+        if not policy.wait(attempt, stop_event):
+            break
+        attempt += 1
+    if attempt > 1:
+        timings['retry_s'] = round(attempt_start - started, 3)
+        timings['total_s'] = round(time.monotonic() - started, 3)
+    return event, result, timings, failure_class, attempt
+
+
+def _add_phase_totals(phase_totals, timings):
+    for phase, seconds in (timings or {}).items():
+        if phase in PHASES and isinstance(seconds, (int, float)):
+            phase_totals[phase] += seconds
+
+
+def phase_percentiles(endpoints_dict, since=None, source=None, percentiles=(50, 90, 99)):
+    """Aggregate per-phase timing percentiles over history records.
+
+    Args:
+        endpoints_dict: Results dict (domain -> entry)
+        since: Optional ISO timestamp; only records at or after it count
+        source: Optional history source filter ('user', 'scheduled', ...)
+
+    Returns:
+        Dict with 'records' (number of records with timings) and 'phases'
+        (phase -> count, mean, total_s and p<N> values), in PHASES order.
+    """
+    samples = defaultdict(list)
+    records = 0
+    for entry in endpoints_dict.values():
+        if not isinstance(entry, Mapping):
+            continue
+        for record in entry.get('history', []):
+            timings = record.get('timings')
+            if not timings:
+                continue
+            if since and record.get('timestamp', '') < since:
+                continue
+            if source and record.get('source') != source:
+                continue
+            records += 1
+            for phase, seconds in timings.items():
+                if isinstance(seconds, (int, float)):
+                    samples[phase].append(seconds)
+
+    phases = {}
+    for phase in PHASES:
+        values = sorted(samples.get(phase, []))
+        if not values:
+            continue
+        stats = {'count': len(values), 'mean': round(sum(values) / len(values), 3),
+                 'total_s': round(sum(values), 3)}
+        for p in percentiles:
+            # Linear interpolation between closest ranks
+            k = (len(values) - 1) * p / 100
+            lo = int(k)
+            hi = min(lo + 1, len(values) - 1)
+            stats[f'p{p}'] = round(values[lo] + (values[hi] - values[lo]) * (k - lo), 3)
+        phases[phase] = stats
+    return {'records': records, 'phases': phases}
+
+
+def _perform_vpn_speedtests_batch(endpoints_dict, ovpn_dir, username, password, progress, batch_size=20, interactive=True, selected_domains=None, formatting=None, stop_event=None, results_file=None, source='user', concurrency=1, engine='speedtest-cli', engine_options=None, time_budget_s=None, data_budget_mb=None, retry_options=None, respect_quarantine=True):
+    """Perform VPN speedtests on endpoints that have matching .ovpn files with batch processing.
+
+    Endpoints are tested in planner order (see generate.planner). With a time or
+    data budget the run stops before starting a test the budget can't cover.
+    Transient failures are retried per *retry_options* (RetryPolicy kwargs) and
+    quarantined endpoints are skipped unless *respect_quarantine* is False.
+    """
     batch_size = max(1, min(9999, int(batch_size)))
+    concurrency = max(1, min(MAX_CONCURRENCY, int(concurrency)))
     
     # Find matching .ovpn files
     ovpn_path = Path(ovpn_dir)
@@ -23,16 +207,7 @@ def _perform_vpn_speedtests_batch(endpoints_dict, ovpn_dir, username, password,
         logger.warning(f"VPN config directory not found: {ovpn_dir}")
         return
         
-    # Map domains to .ovpn files
-    ovpn_files = {}
-    for ovpn_file in ovpn_path.glob("*.ovpn"):
-        # Extract domain from filename (e.g., "ad1.nordvpn.com.udp.ovpn" -> "ad1.nordvpn.com")
-        filename = ovpn_file.stem  # Remove .ovpn
-        if filename.endswith('.udp') or filename.endswith('.tcp'):
-            domain = filename.rsplit('.', 1)[0]
-        else:
-            domain = filename
-        ovpn_files[domain] = str(ovpn_file)
+    ovpn_files = get_catalog(ovpn_path).domain_files()
     
     # Filter endpoints based on selection
     if selected_domains:
@@ -46,23 +221,36 @@ def _perform_vpn_speedtests_batch(endpoints_dict, ovpn_dir, username, password,
     if not matched_endpoints:
         logger.info("No VPN config files found for any scanned endpoints")
         return
+
+    policy = RetryPolicy(**(retry_options or {}))
+    if respect_quarantine:
+        quarantined = [domain for domain, data in matched_endpoints.items() if is_quarantined(data)]
+        for domain in quarantined:
+            del matched_endpoints[domain]
+        if quarantined:
+            logger.info(f"Skipping {len(quarantined)} quarantined endpoints")
+        if not matched_endpoints:
+            return _summarize(0, 0, 0, 0, 0)
     
-    # Sort by latency (best performers first)
-    # Handle both old list format [latency, ip, country, city] and new dict format
-    def get_latency(entry):
-        if isinstance(entry, dict):
-            return entry.get('latency_ms', 9999)
-        elif isinstance(entry, (list, tuple)) and len(entry) > 0:
-            return entry[0]
-        return 9999
-
-    sorted_endpoints = sorted(matched_endpoints.items(), key=lambda x: get_latency(x[1]))
+    # Rank by expected value: latency, staleness, result variance, country coverage
+    sorted_endpoints = plan_endpoints(matched_endpoints.items())
+    budget = Budget(time_budget_s, int(data_budget_mb * 1_000_000) if data_budget_mb else None)
+    if budget.limited:
+        logger.info(f"Speedtest budget: time={time_budget_s or '-'}s, data={data_budget_mb or '-'}MB")
     
     print(f"Performing VPN speedtests on {len(sorted_endpoints)} endpoints...", file=sys.stderr, flush=True)
     logger.info(f"Performing VPN speedtests on {len(sorted_endpoints)} endpoints...")
+
+    if concurrency > 1:
+        return _perform_vpn_speedtests_parallel(
+            sorted_endpoints, ovpn_files, endpoints_dict, username, password, progress,
+            concurrency=concurrency, stop_event=stop_event, results_file=results_file, source=source,
+            speedtest=SpeedTest(engine, engine_options), budget=budget, policy=policy
+        )
     
     vpn_manager = VPNManager()
-    speedtest = SpeedTest()
+    speedtest = SpeedTest(engine, engine_options)
+    phase_totals = defaultdict(float)
     
     # Process in batches
     total_count = len(sorted_endpoints)
@@ -87,75 +275,48 @@ def _perform_vpn_speedtests_batch(endpoints_dict, ovpn_dir, username, password,
         for idx, (domain, data) in enumerate(batch, start=batch_start + 1):
             if stop_event and stop_event.is_set():
                 break
+            if not budget.allows_next():
+                break
             progress['done'] = idx
             try:
-                # Safely get latency for display
-                latency = data.get('latency_ms', 0) if isinstance(data, dict) else (data[0] if isinstance(data, list) and len(data) > 0 else 0)
+                latency = data.get('latency_ms') or 0
                 
                 print(f"[{idx}/{total_count}] Testing {domain} (latency: {latency:.2f}ms)...", file=sys.stderr, flush=True)
                 logger.info(f"[{idx}/{total_count}] Testing {domain} (latency: {latency:.2f}ms)...")
                 
-                # Connect to VPN
+                # Connect, run speedtest and disconnect
                 ovpn_file = ovpn_files[domain]
                 now_iso = datetime.now(timezone.utc).isoformat()
-                if vpn_manager.connect(ovpn_file, username, password):
-                    # Run speedtest
-                    result = speedtest.run_speedtest()
-                    if result:
-                        if isinstance(endpoints_dict[domain], dict):
-                            endpoints_dict[domain]['rx_speed_mbps'] = result['download_mbps']
-                            endpoints_dict[domain]['tx_speed_mbps'] = result['upload_mbps']
-                            endpoints_dict[domain]['speedtest_timestamp'] = now_iso
-                            endpoints_dict[domain].pop('speedtest_failed_timestamp', None)
-                            endpoints_dict[domain].pop('speedtest_failed_reason', None)
-                            history = endpoints_dict[domain].setdefault('history', [])
-                            history.append({'timestamp': now_iso, 'event': 'success', 'source': source,
-                                            'download_mbps': result['download_mbps'], 'upload_mbps': result['upload_mbps']})
-                            del history[:-MAX_HISTORY]
-                        
-                        print(f"\u2713 {domain}: DL={result['download_mbps']} Mbps, UL={result['upload_mbps']} Mbps", file=sys.stderr, flush=True)
-                        logger.info(f"\u2713 {domain}: DL={result['download_mbps']} Mbps, UL={result['upload_mbps']} Mbps")
-                        succeeded += 1
-                    else:
-                        if isinstance(endpoints_dict[domain], dict):
-                            endpoints_dict[domain]['speedtest_failed_timestamp'] = now_iso
-                            endpoints_dict[domain]['speedtest_failed_reason'] = 'speedtest_failed'
-                            history = endpoints_dict[domain].setdefault('history', [])
-                            history.append({'timestamp': now_iso, 'event': 'speedtest_failed', 'source': source})
-                            del history[:-MAX_HISTORY]
-                        logger.info(f"\u2717 {domain}: Speedtest failed (no result)")
-                        speedtest_failed += 1
+                started = time.monotonic()
+                event, result, timings, failure_class, attempts = _run_with_retries(
+                    vpn_manager, speedtest, ovpn_file, username, password, policy, stop_event)
+                budget.charge(time.monotonic() - started, (result or {}).get('bytes_total', 0))
+                _add_phase_totals(phase_totals, timings)
+                _record_outcome(endpoints_dict, domain, event, result, now_iso, source, timings=timings,
+                                failure_class=failure_class, attempts=attempts, policy=policy)
+                if event == 'success':
+                    print(f"\u2713 {domain}: DL={result['download_mbps']} Mbps, UL={result['upload_mbps']} Mbps", file=sys.stderr, flush=True)
+                    logger.info(f"\u2713 {domain}: DL={result['download_mbps']} Mbps, UL={result['upload_mbps']} Mbps")
+                    succeeded += 1
+                elif event == 'speedtest_failed':
+                    logger.info(f"\u2717 {domain}: Speedtest failed (no result)")
+                    speedtest_failed += 1
                 else:
-                    if isinstance(endpoints_dict[domain], dict):
-                        endpoints_dict[domain]['speedtest_failed_timestamp'] = now_iso
-                        endpoints_dict[domain]['speedtest_failed_reason'] = 'vpn_failed'
-                        history = endpoints_dict[domain].setdefault('history', [])
-                        history.append({'timestamp': now_iso, 'event': 'vpn_failed', 'source': source})
-                        del history[:-MAX_HISTORY]
-                    logger.info(f"\u2717 {domain}: VPN connection failed")
+                    logger.info(f"\u2717 {domain}: VPN connection failed ({failure_class})")
                     vpn_failed += 1
-                    
-                # Disconnect VPN
-                vpn_manager.disconnect()
 
                 # Incremental save after each server
-                if results_file:
-                    try:
-                        with open(results_file, 'w', encoding='utf-8') as rf:
-                            json.dump(endpoints_dict, rf, indent=2)
-                    except Exception:
-                        pass
+                _save_results(endpoints_dict, results_file)
                 
             except Exception as e:
-                if isinstance(endpoints_dict.get(domain), dict):
-                    now_err = datetime.now(timezone.utc).isoformat()
-                    endpoints_dict[domain]['speedtest_failed_timestamp'] = now_err
-                    endpoints_dict[domain]['speedtest_failed_reason'] = 'error'
-                    history = endpoints_dict[domain].setdefault('history', [])
-                    history.append({'timestamp': now_err, 'event': 'error', 'source': source, 'detail': str(e)[:200]})
-                    del history[:-MAX_HISTORY]
+                _record_outcome(endpoints_dict, domain, 'error', None,
+                                datetime.now(timezone.utc).isoformat(), source, detail=str(e)[:200])
                 errors += 1
                 vpn_manager.disconnect()
+
+        if budget.exhausted_reason:
+            logger.info(f"Speedtest {budget.exhausted_reason} budget exhausted, stopping")
+            break
         
         # Ask user if they want to continue (only in interactive mode)
         if interactive and batch_end < total_count:
@@ -182,8 +343,107 @@ def _perform_vpn_speedtests_batch(endpoints_dict, ovpn_dir, username, password,
                     formatting.output('reset')
                 break
 
-    # Summary report
+    return _summarize(total_count, succeeded, vpn_failed, speedtest_failed, errors, budget, phase_totals)
+
+
+def _summarize(total_count, succeeded, vpn_failed, speedtest_failed, errors, budget=None, phase_totals=None):
+    """Log the summary line and return the report dict."""
     tested = succeeded + vpn_failed + speedtest_failed + errors
     summary = f"VPN Speedtest Report: {tested}/{total_count} tested — {succeeded} succeeded, {vpn_failed} VPN connection failed, {speedtest_failed} speedtest failed, {errors} errors"
+    if budget and budget.exhausted_reason:
+        summary += f" ({budget.exhausted_reason} budget exhausted)"
     logger.info(summary)
-    return {'total': total_count, 'tested': tested, 'succeeded': succeeded, 'vpn_failed': vpn_failed, 'speedtest_failed': speedtest_failed, 'errors': errors}
+    report = {'total': total_count, 'tested': tested, 'succeeded': succeeded, 'vpn_failed': vpn_failed, 'speedtest_failed': speedtest_failed, 'errors': errors}
+    if budget and budget.limited:
+        report['budget'] = budget.summary()
+    if phase_totals:
+        report['phase_totals_s'] = {p: round(phase_totals[p], 1) for p in PHASES if p in phase_totals}
+        logger.info("Phase totals: " + ", ".join(f"{p[:-2]} {s}s" for p, s in report['phase_totals_s'].items()))
+    return report
+
+
+def _perform_vpn_speedtests_parallel(sorted_endpoints, ovpn_files, endpoints_dict, username, password, progress, concurrency=4, stop_event=None, results_file=None, source='user', speedtest=None, budget=None, policy=None):
+    """Run up to *concurrency* tunnels at once, each in its own network namespace.
+
+    Every worker slot owns one namespace and tun device (``tun<slot>``) for the
+    whole run, so tunnels never share routes and no host routing is changed.
+    """
+    total_count = len(sorted_endpoints)
+    progress['total'] = total_count
+    progress['done'] = 0
+    counts = {'success': 0, 'vpn_failed': 0, 'speedtest_failed': 0, 'error': 0}
+    lock = threading.Lock()
+    slots = queue.Queue()
+    for slot in range(concurrency):
+        slots.put(slot)
+    namespaces = {}
+    speedtest = speedtest or SpeedTest()
+    budget = budget or Budget()
+    policy = policy or RetryPolicy()
+    phase_totals = defaultdict(float)
+
+    print(f"Running {concurrency} tunnels in parallel", file=sys.stderr, flush=True)
+    logger.info(f"Running {concurrency} tunnels in parallel")
+
+    def _get_namespace(slot, timings):
+        ns = namespaces.get(slot)
+        if ns is None:
+            ns_start = time.monotonic()
+            ns = NetNamespace(slot)
+            if not ns.create():
+                raise RuntimeError(f"Could not create network namespace {ns.name}")
+            namespaces[slot] = ns
+            timings['namespace_s'] = round(time.monotonic() - ns_start, 3)
+        return ns
+
+    def _worker(domain):
+        if stop_event and stop_event.is_set():
+            return
+        slot = slots.get()
+        with lock:
+            if not budget.allows_next(parallel=concurrency):
+                slots.put(slot)
+                return
+        detail = None
+        timings = {}
+        failure_class, attempts = None, 1
+        now_iso = datetime.now(timezone.utc).isoformat()
+        started = time.monotonic()
+        try:
+            logger.info(f"[slot {slot}] Testing {domain}...")
+            vpn_manager = VPNManager(dev=f"tun{slot}", netns=_get_namespace(slot, timings))
+            event, result, test_timings, failure_class, attempts = _run_with_retries(
+                vpn_manager, speedtest, ovpn_files[domain], username, password, policy, stop_event)
+            timings.update(test_timings)
+        except Exception as e:
+            event, result, detail = 'error', None, str(e)[:200]
+        finally:
+            slots.put(slot)
+
+        with lock:
+            budget.charge(time.monotonic() - started, (result or {}).get('bytes_total', 0))
+            _add_phase_totals(phase_totals, timings)
+            _record_outcome(endpoints_dict, domain, event, result, now_iso, source, detail=detail, timings=timings,
+                            failure_class=failure_class, attempts=attempts, policy=policy)
+            counts[event] += 1
+            progress['done'] += 1
+            if event == 'success':
+                logger.info(f"\u2713 {domain}: DL={result['download_mbps']} Mbps, UL={result['upload_mbps']} Mbps")
+            else:
+                logger.info(f"\u2717 {domain}: {event} ({failure_class or 'unclassified'})")
+            _save_results(endpoints_dict, results_file)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(_worker, domain) for domain, _data in sorted_endpoints]
+            for future in as_completed(futures):
+                future.result()
+        if stop_event and stop_event.is_set():
+            logger.info("VPN speedtest stopped by user signal")
+        elif budget.exhausted_reason:
+            logger.info(f"Speedtest {budget.exhausted_reason} budget exhausted, stopping")
+    finally:
+        for ns in namespaces.values():
+            ns.destroy()
+
+    return _summarize(total_count, counts['success'], counts['vpn_failed'], counts['speedtest_failed'], counts['error'], budget, phase_totals)
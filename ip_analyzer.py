@@ -1,5 +1,11 @@
 #!/usr/bin/env python3
-"""CLI for scanning endpoint latency and reporting by location."""
+"""CLI for scanning endpoint latency and reporting by location.
+
+Only argument parsing is imported up front: the scanner (GeoIP readers,
+thread pools, subprocess pings, VPN helpers) and the report engine are
+imported by the mode that uses them, so report runs start without loading
+the scan stack and vice versa.
+"""
 
 import argparse
 import logging
@@ -7,12 +13,14 @@ import re
 import sys
 from pathlib import Path
 
-from generate.scan import Scanner
-from generate.report import Analyze
+from generate.aggregate import FIELDS as DISTRIBUTION_FIELDS
 from format.colors import Format
+from format import export
 
 logger = logging.getLogger(__name__)
 
+formatting = Format()
+
 
 def _normalize_countries(values):
     """Normalize country names for case-insensitive comparison."""
@@ -123,6 +131,30 @@ def options():
                         help='''Sort --country-stats or --city-stats by field/column number. Default is 6 (DL speed, fallback to LATENCY)
                              ''', default=None)
 
+    parser.add_argument('-g', '--geo',
+                        type=str,
+                        nargs='?',
+                        const='',
+                        metavar='COUNTRY[/CITY]',
+                        help='''Roll-up by country; with COUNTRY drill down to its cities, with COUNTRY/CITY to its servers
+''',
+                        default=None)
+
+    parser.add_argument('--distribution',
+                        action='store_true',
+                        help='''With --country-stats/--city-stats, show count/min/median/p90/mean/stddev of latency and speeds
+''',
+                        default=False)
+
+    parser.add_argument('--sort-field',
+                        type=str,
+                        choices=('country', 'city') + DISTRIBUTION_FIELDS,
+                        metavar='FIELD',
+                        help='''Sort --distribution stats by any field, e.g. latency_ms_p90 or rx_speed_mbps_median.
+Default is latency_ms_median
+''',
+                        default=None)
+
     parser.add_argument('-n', '--min-latency',
                         type=float,
                         help='''Filter results by minimum latency (integer/float). Default is 0
@@ -133,6 +165,18 @@ def options():
                         help='''Filter results by maximum latency (integer/float). Default is no limit
                              ''', default=None)
 
+    parser.add_argument('--output',
+                        type=str,
+                        choices=['table', *export.FORMATS],
+                        help='''Report output format. json/ndjson/csv/tsv stream one report's rows with stable field names
+and no color codes. Default is "table"''',
+                        default='table')
+
+    parser.add_argument('--pager',
+                        action='store_true',
+                        help='''Page report output through $PAGER (default "less -R") when writing to a terminal''',
+                        default=False)
+
     parser.add_argument('--include-countries',
                         action='store_true',
                         help='''Optionally include only countries listed in include_countries.list (comma delimited). Others will be skipped.''',
@@ -167,12 +211,28 @@ def options():
                         type=int,
                         help='''Number of VPN speedtests to run per batch before prompting. Default is 20''',
                         default=20)
+
+    parser.add_argument('--vpn-concurrency',
+                        type=int,
+                        help='''Number of VPN tunnels to test in parallel, each in its own network namespace (Linux, needs root). Default is 1''',
+                        default=1)
+
+    parser.add_argument('--vpn-engine',
+                        type=str,
+                        choices=['speedtest-cli', 'native'],
+                        help='''Throughput measurement engine for VPN speedtests. "native" runs parallel HTTP streams in-process. Default is "speedtest-cli"''',
+                        default='speedtest-cli')
+
+    parser.add_argument('--vpn-target',
+                        type=str,
+                        help='''Target for the native engine: a registered name or a base URL. Default is "cloudflare"''',
+                        default='cloudflare')
     return parser
 
 
-def validate_inputs(args, report_args, filter_args, results_limit, sort_by, mn_latency, mx_latency):
+def validate_inputs(args, report_args, filter_args, results_limit, sort_by, mn_latency, mx_latency, argv=None):
     """Validate CLI argument combinations and bounds."""
-    if not len(sys.argv) > 1:
+    if not (sys.argv[1:] if argv is None else argv):
         options().print_help()
         formatting.output('bold', 'red')
         logger.error("*** Error: Pick one of the options ***")
@@ -191,6 +251,22 @@ def validate_inputs(args, report_args, filter_args, results_limit, sort_by, mn_l
         formatting.output('reset')
         sys.exit(1)
 
+    if args.output != 'table':
+        selected = [args.country_stats, args.city_stats, args.geo is not None,
+                    args.results or args.search_country or args.search_city]
+        if sum(bool(s) for s in selected) != 1:
+            formatting.output('bold', 'red')
+            logger.error("Error: --output %s needs exactly one of --results, --country-stats, --city-stats or --geo",
+                         args.output)
+            formatting.output('reset')
+            sys.exit(1)
+
+    if (args.distribution or args.sort_field) and not (args.country_stats or args.city_stats):
+        formatting.output('bold', 'red')
+        logger.error("Error: --distribution and --sort-field apply to --country-stats or --city-stats")
+        formatting.output('reset')
+        sys.exit(1)
+
     if results_limit and results_limit < 1:
         formatting.output('bold', 'red')
         logger.error("Error: --results-limit must be > 0")
@@ -227,8 +303,8 @@ def validate_inputs(args, report_args, filter_args, results_limit, sort_by, mn_l
 
 def perform_scan(args, targets_fle, results_fle, country_exclusions, pings=1, include_countries=None):
     """Run a full scan and write results."""
-    from dotenv import dotenv_values
-    
+    from generate.scan import Scanner
+
     if not (Path('GeoLite2-City.mmdb').is_file() and Path('GeoLite2-Country.mmdb').is_file()):
         formatting.output('bold', 'red')
         logger.error("Error: GeoLite DB files not found in project root.")
@@ -257,6 +333,7 @@ def perform_scan(args, targets_fle, results_fle, country_exclusions, pings=1, in
     vpn_password = ''
     if args.vpn_speedtest:
         if Path(args.vpn_env_file).is_file():
+            from dotenv import dotenv_values
             env_config = dotenv_values(args.vpn_env_file)
             vpn_username = env_config.get('VPN_USERNAME', '')
             vpn_password = env_config.get('VPN_PASSWORD', '')
@@ -274,11 +351,17 @@ def perform_scan(args, targets_fle, results_fle, country_exclusions, pings=1, in
                  vpn_username=vpn_username,
                  vpn_password=vpn_password,
                  vpn_batch_size=args.vpn_batch_size,
-                 vpn_batch_interactive=True)
+                 vpn_batch_interactive=True,
+                 vpn_concurrency=args.vpn_concurrency,
+                 vpn_engine=args.vpn_engine,
+                 vpn_engine_options={'target': args.vpn_target})
 
 
 def produce_report(args, results_file, records_limit, stats_sort_fld, res_sort_fld, mn_latency, mx_latency):
     """Render report output based on results.json and CLI flags."""
+    from generate.report import Analyze, COUNTRY_COL, CITY_COL
+    from format import table
+
     if not Path(results_file).is_file():
         formatting.output('bold', 'red')
         logger.error('Error: Unable to produce report. Latency scan results file "%s" is missing', results_file)
@@ -286,40 +369,57 @@ def produce_report(args, results_file, records_limit, stats_sort_fld, res_sort_f
         formatting.output('reset')
         sys.exit(1)
 
-    if args.country_stats:
-        report.country_stats(sort_by=stats_sort_fld, min_latency_limit=mn_latency, max_latency_limit=mx_latency)
+    report = Analyze(res_fl=results_file)
+    if args.output != 'table':
+        report.formatting.enabled = False
+        report.output_format = args.output
+
+    with table.output(pager=args.pager) as out:
+        report.out = out
+        distribution = args.distribution or args.sort_field
+        if args.country_stats:
+            if distribution:
+                report.distribution_stats(COUNTRY_COL, sort_field=args.sort_field,
+                                          min_latency_limit=mn_latency, max_latency_limit=mx_latency)
+            else:
+                report.country_stats(sort_by=stats_sort_fld, min_latency_limit=mn_latency, max_latency_limit=mx_latency)
+
+        if args.city_stats:
+            if distribution:
+                report.distribution_stats(CITY_COL, sort_field=args.sort_field,
+                                          min_latency_limit=mn_latency, max_latency_limit=mx_latency)
+            else:
+                report.city_stats(sort_by=stats_sort_fld, min_latency_limit=mn_latency, max_latency_limit=mx_latency)
 
-    if args.city_stats:
-        report.city_stats(sort_by=stats_sort_fld, min_latency_limit=mn_latency, max_latency_limit=mx_latency)
+        if args.geo is not None:
+            report.geo_report(args.geo)
 
-    if args.results or args.search_country or args.search_city:
-        report.get_top_performers(limit=records_limit,
-                                  country=args.search_country,
-                                  city=args.search_city,
-                                  sort_by=res_sort_fld,
-                                  min_latency_limit=mn_latency,
-                                  max_latency_limit=mx_latency)
+        if args.results or args.search_country or args.search_city:
+            report.get_top_performers(limit=records_limit,
+                                      country=args.search_country,
+                                      city=args.search_city,
+                                      sort_by=res_sort_fld,
+                                      min_latency_limit=mn_latency,
+                                      max_latency_limit=mx_latency)
 
 
-if __name__ == "__main__":
-    """Entry point."""
-    if sys.version_info < (3,):
-        print('Error: Python 3 is required')
-        sys.exit(1)
+def main(argv=None):
+    """Entry point.
 
+    Args:
+        argv: Command line arguments without the program name; defaults to sys.argv[1:]
+    """
     res_file = 'results.json'
     excl_file = 'exclude_countries.list'
 
-    formatting = Format()
-
-    report = Analyze(res_fl=res_file)
-
-    selections = options().parse_args()
+    selections = options().parse_args(argv)
     logging.basicConfig(
         level=logging.DEBUG if selections.verbose else logging.INFO,
         format='%(message)s'
     )
 
+    formatting.enabled = selections.output == 'table'
+
     targets_file = selections.servers_file
     pings = selections.scan_pings
     top_ips_limit = selections.results_limit
@@ -332,7 +432,8 @@ if __name__ == "__main__":
                          selections.search_country,
                          selections.search_city,
                          selections.country_stats,
-                         selections.city_stats]
+                         selections.city_stats,
+                         selections.geo is not None]
 
     report_filters = [selections.results_limit,
                       selections.min_latency,
@@ -366,7 +467,8 @@ if __name__ == "__main__":
                     top_ips_limit,
                     selections.sort_by,
                     min_latency,
-                    max_latency)
+                    max_latency,
+                    argv=argv)
 
     if selections.scan:
         perform_scan(selections, targets_file, res_file, excl_file, pings, include_countries=include_countries)
@@ -379,3 +481,7 @@ if __name__ == "__main__":
                        res_sort_fld=sort_results,
                        mn_latency=min_latency,
                        mx_latency=max_latency)
+
+
+if __name__ == "__main__":
+    main()
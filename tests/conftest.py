@@ -9,6 +9,7 @@ are mocked to keep the suite fast and deterministic.
 import json
 import os
 import shutil
+import sys
 import tempfile
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -198,3 +199,75 @@ def sample_config(paths):
     with open(paths["config"], "w") as f:
         yaml.dump(cfg, f)
     return cfg
+
+
+# ---------------------------------------------------------------------------
+# Stand-ins for the OpenVPN binary and a speedtest server
+# ---------------------------------------------------------------------------
+
+FAKE_OPENVPN_SCRIPT = """#!{python}
+import signal, socket, sys, time
+args = sys.argv[1:]
+config = open(args[args.index('--config') + 1]).read()
+mgmt = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+mgmt.connect(args[args.index('--management') + 1])
+mgmt_file = mgmt.makefile('rwb', buffering=0)
+
+def state(name, reason=''):
+    mgmt.sendall(('>STATE:%d,%s,%s,10.8.0.2,192.0.2.1\\r\\n' % (time.time(), name, reason)).encode())
+
+mgmt.sendall(b'>HOLD:Waiting for hold release:0\\r\\n')
+while b'hold release' not in mgmt_file.readline():
+    pass
+state('WAIT')
+state('AUTH')
+if 'auth-fail' in config:
+    mgmt.sendall(b">PASSWORD:Verification Failed: 'Auth'\\r\\n")
+    state('EXITING', 'auth-failure')
+    print('AUTH: Received control message: AUTH_FAILED', flush=True)
+    sys.exit(1)
+if 'tls-error' in config:
+    state('RECONNECTING', 'tls-error')
+    while True:
+        time.sleep(0.05)
+if 'ignore-term' in config:
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+else:
+    signal.signal(signal.SIGTERM, lambda *a: sys.exit(0))
+state('GET_CONFIG')
+state('ASSIGN_IP')
+print('Initialization Sequence Completed', flush=True)
+state('CONNECTED', 'SUCCESS')
+while True:
+    time.sleep(0.05)
+"""
+
+
+@pytest.fixture()
+def fake_openvpn(tmp_path, monkeypatch):
+    """Point VPNManager at a fake `openvpn` that reports CONNECTED over the
+    management socket as soon as it is released and runs until SIGTERM.
+
+    A config containing the text ``auth-fail`` makes it fail authentication;
+    ``tls-error`` makes it loop in RECONNECTING; ``ignore-term`` makes it ignore SIGTERM.
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir(exist_ok=True)
+    script = bin_dir / "openvpn"
+    script.write_text(FAKE_OPENVPN_SCRIPT.format(python=sys.executable))
+    script.chmod(0o755)
+
+    import generate.vpn as vpn_mod
+    monkeypatch.setattr(vpn_mod, "OPENVPN_BIN", str(script))
+    # No tunnel is created, so host policy routing must stay untouched
+    monkeypatch.setattr(vpn_mod.VPNManager, "_preserve_web_access", lambda self: None)
+    monkeypatch.setattr(vpn_mod.VPNManager, "_restore_routing", lambda self: None)
+    return script
+
+
+@pytest.fixture()
+def throughput_server():
+    """Loopback HTTP throughput server; yields its base URL."""
+    from generate.throughput import LocalThroughputServer
+    with LocalThroughputServer() as server:
+        yield server.url
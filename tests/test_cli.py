@@ -0,0 +1,102 @@
+"""Tests for the ip_analyzer.py command line: lazy imports, main() and start-up time."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules only a scan (or distribution stats) needs; report runs must not load them
+SCAN_ONLY = ("generate.scan", "generate.georeader", "geoip2", "dotenv", "numpy",
+             "concurrent.futures", "subprocess")
+
+
+def _python(code, cwd, *flags):
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=cwd, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def _loaded_after(code, cwd):
+    """Names from SCAN_ONLY + generate.report present in sys.modules after running *code*."""
+    probe = code + "\nimport sys\nprint('LOADED=' + ','.join(m for m in %r if m in sys.modules))" % (
+        SCAN_ONLY + ("generate.report",),)
+    proc = _python(probe, cwd)
+    assert proc.returncode == 0, proc.stderr
+    line = proc.stdout.rsplit("LOADED=", 1)[1].strip()  # report output may leave a color code before it
+    return set(filter(None, line.split(",")))
+
+
+def _import_us(module, cwd):
+    """Best-of-three cumulative import time of *module* in a fresh interpreter, in microseconds."""
+    best = None
+    for _ in range(3):
+        proc = _python(f"import {module}", cwd, "-X", "importtime")
+        assert proc.returncode == 0, proc.stderr
+        line = [l for l in proc.stderr.splitlines() if l.rstrip().endswith("| " + module)][-1]
+        cumulative = int(line.split("|")[1])
+        best = cumulative if best is None else min(best, cumulative)
+    return best
+
+
+@pytest.fixture()
+def results_dir(tmp_path):
+    (tmp_path / "results.json").write_text(json.dumps({
+        "a.example.com": {"latency_ms": 30.0, "ip": "192.0.2.1", "country": "Germany", "city": "Berlin"},
+        "b.example.com": {"latency_ms": 10.0, "ip": "192.0.2.2", "country": "Germany", "city": "Frankfurt"},
+    }))
+    return tmp_path
+
+
+# ===================================================================
+# Lazy imports
+# ===================================================================
+
+class TestLazyImports:
+
+    def test_import_loads_neither_scanner_nor_report(self, tmp_path):
+        assert _loaded_after("import ip_analyzer", tmp_path) == set()
+
+    def test_report_run_skips_scan_stack(self, results_dir):
+        loaded = _loaded_after("import ip_analyzer\nip_analyzer.main(['-r', '-l', '1'])", results_dir)
+        assert loaded == {"generate.report"}
+
+
+# ===================================================================
+# main()
+# ===================================================================
+
+class TestMain:
+
+    def test_report_output(self, results_dir, monkeypatch, capsys):
+        import ip_analyzer
+        monkeypatch.chdir(results_dir)
+        ip_analyzer.main(["-r", "--output", "json"])
+        records = json.loads(capsys.readouterr().out)
+        assert [r["domain"] for r in records] == ["b.example.com", "a.example.com"]
+        assert ip_analyzer.formatting.enabled is False
+        ip_analyzer.main(["-c"])
+        assert ip_analyzer.formatting.enabled is True
+
+    @pytest.mark.parametrize("argv", [[], ["-s", "-r"], ["-l", "5"], ["-r", "-n", "-1"]])
+    def test_invalid_arguments_exit(self, argv, results_dir, monkeypatch, capsys):
+        import ip_analyzer
+        monkeypatch.chdir(results_dir)
+        with pytest.raises(SystemExit) as exc:
+            ip_analyzer.main(argv)
+        assert exc.value.code == 1
+
+
+# ===================================================================
+# Start-up benchmark
+# ===================================================================
+
+class TestStartupTime:
+
+    def test_cli_imports_faster_than_the_scanner_alone(self, tmp_path):
+        cli, scanner = _import_us("ip_analyzer", tmp_path), _import_us("generate.scan", tmp_path)
+        print(f"import ip_analyzer: {cli / 1000:.1f}ms, import generate.scan: {scanner / 1000:.1f}ms")
+        assert cli < scanner
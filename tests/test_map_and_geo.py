@@ -343,3 +343,135 @@ class TestConfigCacheInvalidation:
         # Mutating cfg1 should not affect cfg2
         cfg1['schedule']['vpn_speedtest']['enabled'] = True
         assert cfg2['schedule']['vpn_speedtest']['enabled'] is False
+
+
+class TestReaderRegistry:
+    """Test the shared GeoIP reader registry (generate/georeader.py)."""
+
+    def test_reader_shared_and_swapped_on_file_change(self, tmp_path):
+        import os
+        from generate.georeader import ReaderRegistry
+        db = tmp_path / "City.mmdb"
+        db.write_bytes(b"v1")
+        registry = ReaderRegistry()
+        with patch('geoip2.database.Reader', side_effect=lambda path: MagicMock()) as opener:
+            with registry.lease(str(db)) as first:
+                with registry.lease(str(db)) as again:
+                    assert again is first
+                assert opener.call_count == 1
+
+                # Replace the file while a lookup is in flight
+                new = tmp_path / "City.mmdb.tmp"
+                new.write_bytes(b"v2 database")
+                os.replace(new, db)
+                with registry.lease(str(db)) as second:
+                    assert second is not first
+                first.close.assert_not_called()
+            first.close.assert_called_once()
+            second.close.assert_not_called()
+
+    def test_invalidate_reopens(self, tmp_path):
+        from generate.georeader import ReaderRegistry
+        db = tmp_path / "Country.mmdb"
+        db.write_bytes(b"v1")
+        registry = ReaderRegistry()
+        with patch('geoip2.database.Reader', side_effect=lambda path: MagicMock()):
+            with registry.lease(str(db)) as first:
+                pass
+            registry.invalidate(str(db))
+            first.close.assert_called_once()
+            with registry.lease(str(db)) as second:
+                assert second is not first
+
+
+class _FakeGeoReader:
+    """GeoIP reader stand-in answering from a {network: (country, city)} table."""
+
+    def __init__(self, table):
+        import ipaddress
+        self.table = {ipaddress.ip_network(net): value for net, value in table.items()}
+        self.calls = 0
+
+    def _find(self, ip):
+        import ipaddress
+        from types import SimpleNamespace
+        self.calls += 1
+        for network, (country, city) in self.table.items():
+            if ipaddress.ip_address(ip) in network:
+                return SimpleNamespace(country=SimpleNamespace(name=country), city=SimpleNamespace(name=city),
+                                       traits=SimpleNamespace(network=network))
+        raise ValueError(f"{ip} not found")
+
+    country = city = _find
+
+    def close(self):
+        pass
+
+
+class TestRegeolocate:
+    """Test re-geolocation of stored results (generate/regeo.py, /api/geolite/regeolocate)."""
+
+    TABLE = {"203.0.113.0/24": ("Germany", "Frankfurt"), "198.51.100.0/24": ("France", "Paris")}
+
+    def test_updates_only_changed_entries_with_one_lookup_per_network(self, tmp_path):
+        from generate.regeo import regeolocate
+        results = {
+            "a.example.com": {"ip": "203.0.113.10", "country": "Netherlands", "city": "Amsterdam"},
+            "b.example.com": {"ip": "203.0.113.20", "country": "Germany", "city": "Frankfurt"},
+            "c.example.com": {"ip": "203.0.113.30", "country": "Germany", "city": "Frankfurt"},
+            "d.example.com": {"ip": "198.51.100.5", "country": "France", "city": "Paris"},
+            "e.example.com": {"ip": "192.0.2.1", "country": "Spain", "city": "Madrid"},
+            "no-ip.example.com": {"latency_ms": 5},
+        }
+        reader = _FakeGeoReader(self.TABLE)
+        (tmp_path / "city.mmdb").touch()
+        (tmp_path / "country.mmdb").touch()
+        with patch('geoip2.database.Reader', return_value=reader):
+            summary = regeolocate(results, str(tmp_path / "city.mmdb"), str(tmp_path / "country.mmdb"))
+        assert sorted(summary["changed"]) == ["a.example.com", "e.example.com"]
+        assert summary["checked"] == 5
+        # 3 networks (incl. the unknown IP) for each of the two databases
+        assert summary["lookups"] == 6
+        assert results["a.example.com"]["country"] == "Germany"
+        assert results["e.example.com"]["city"] == "Unknown"
+        assert "country" not in results["no-ip.example.com"]
+
+    def test_regeolocate_endpoint(self, client, paths, sample_results):
+        with open(paths["results"]) as f:
+            data = json.load(f)
+        table = {f"{entry['ip']}/32": ("Iceland", "Reykjavik") for entry in data.values() if entry.get("ip")}
+        with patch('geoip2.database.Reader', return_value=_FakeGeoReader(table)):
+            resp = client.post('/api/geolite/regeolocate')
+        assert resp.status_code == 200
+        body = resp.get_json()
+        assert len(body["changed"]) == body["checked"] > 0
+        with open(paths["results"]) as f:
+            updated = json.load(f)
+        assert all(e["country"] == "Iceland" for e in updated.values() if isinstance(e, dict) and e.get("ip"))
+
+    def test_deferred_while_scan_active_then_run_by_queue(self, client, paths, sample_results, monkeypatch):
+        import web.state as state
+        monkeypatch.setattr(state, "scan_active", True)
+        monkeypatch.setattr(state, "_ensure_queue_processor", lambda: None)
+        assert client.post('/api/geolite/regeolocate').status_code == 202
+        assert client.post('/api/geolite/regeolocate').status_code == 202
+        pending = state._read_queue_file()["pending"]
+        assert [job["type"] for job in pending] == [state.REGEOLOCATE_JOB]
+
+        with open(paths["results"]) as f:
+            table = {f"{e['ip']}/32": ("Iceland", "Reykjavik") for e in json.load(f).values() if e.get("ip")}
+        active = []
+        real_regeolocate = state.regeolocate
+
+        def spy(*args):
+            active.append(state.scan_active)
+            return real_regeolocate(*args)
+        monkeypatch.setattr(state, "scan_active", False)
+        monkeypatch.setattr(state, "regeolocate", spy)
+        with patch('geoip2.database.Reader', return_value=_FakeGeoReader(table)):
+            state._queue_processor_loop()
+        assert active == [True]
+        assert not state.scan_active
+        assert state._read_queue_file()["pending"] == []
+        with open(paths["results"]) as f:
+            assert all(e["country"] == "Iceland" for e in json.load(f).values() if e.get("ip"))
@@ -4,7 +4,9 @@ E2E tests for /api/ovpn/status, /api/ovpn/upload, /api/ovpn/download,
 """
 
 import io
+import json
 import os
+import threading
 import zipfile
 from pathlib import Path
 from unittest.mock import patch, MagicMock
@@ -62,6 +64,29 @@ class TestOvpnUpload:
         data = resp.get_json()
         assert data["count"] == 2  # only UDP
 
+    def test_upload_replaces_only_changed_configs(self, client, paths):
+        ovpn_dir = Path(paths["ovpn_dir"])
+
+        def upload(files):
+            resp = client.post("/api/ovpn/upload", data={"file": (self._make_zip(files), "configs.zip")},
+                               content_type="multipart/form-data")
+            assert resp.status_code == 200
+            return resp.get_json()
+
+        upload({"a.udp.ovpn": "remote a 1194\n", "b.udp.ovpn": "remote b 1194\n", "c.udp.ovpn": "remote c 1194\n"})
+        past = 1_600_000_000
+        os.utime(ovpn_dir / "a.udp.ovpn", (past, past))
+
+        data = upload({"a.udp.ovpn": "remote a 1194\n", "b.udp.ovpn": "remote b2 1194\n", "d.udp.ovpn": "remote d 1194\n"})
+        assert data["added"] == ["d.udp.ovpn"]
+        assert data["changed"] == ["b.udp.ovpn"]
+        assert data["removed"] == ["c.udp.ovpn"]
+        assert data["unchanged"] == 1
+        assert (ovpn_dir / "a.udp.ovpn").stat().st_mtime == past  # not rewritten
+        assert (ovpn_dir / "b.udp.ovpn").read_text() == "remote b2 1194\n"
+        assert not (ovpn_dir / "c.udp.ovpn").exists()
+        assert client.get("/api/ovpn/config/b").get_json()["meta"]["remote"] == "b2"
+
     def test_upload_non_zip(self, client):
         resp = client.post("/api/ovpn/upload", data={
             "file": (io.BytesIO(b"plaintext"), "file.txt")
@@ -120,6 +145,219 @@ class TestOvpnConfig:
         assert resp.status_code in (400, 404)
 
 
+# ===================================================================
+# OVPN catalog
+# ===================================================================
+
+SAMPLE_OVPN = """client
+dev tun
+proto udp
+remote 185.1.2.3 1194
+remote 185.1.2.4 1195 udp
+cipher AES-256-CBC
+auth SHA512
+<tls-auth>
+-----BEGIN OpenVPN Static key V1-----
+-----END OpenVPN Static key V1-----
+</tls-auth>
+key-direction 1
+"""
+
+
+class TestOvpnCatalog:
+
+    def test_parse_ovpn(self):
+        from generate.ovpn_catalog import parse_ovpn
+        info = parse_ovpn(SAMPLE_OVPN)
+        assert info["proto"] == "udp"
+        assert info["remotes"] == [{"host": "185.1.2.3", "port": 1194},
+                                   {"host": "185.1.2.4", "port": 1195, "proto": "udp"}]
+        assert info["cipher"] == "AES-256-CBC"
+        assert info["auth"] == "SHA512"
+        assert info["tls_auth"] is True and info["key_direction"] == "1"
+
+    def test_refresh_skips_unchanged_files(self, tmp_path):
+        from generate.ovpn_catalog import OvpnCatalog
+        (tmp_path / "a.example.com.udp.ovpn").write_text(SAMPLE_OVPN)
+        (tmp_path / "b.example.com.tcp.ovpn").write_text("remote b 443 tcp\n")
+        past = 1_600_000_000
+        for f in tmp_path.glob("*.ovpn"):
+            os.utime(f, (past, past))
+
+        catalog = OvpnCatalog(str(tmp_path))
+        changes = catalog.refresh()
+        assert sorted(changes["added"]) == ["a.example.com.udp.ovpn", "b.example.com.tcp.ovpn"]
+        assert catalog.get("a.example.com")["remote"] == "185.1.2.3"
+        assert catalog.get("b.example.com")["proto"] == "tcp"
+
+        reloaded = OvpnCatalog(str(tmp_path))
+        assert reloaded.load()
+        with patch.object(reloaded, "_index_file", side_effect=AssertionError("re-read")):
+            assert reloaded.refresh() == {"added": [], "changed": [], "removed": []}
+
+        (tmp_path / "b.example.com.tcp.ovpn").unlink()
+        changes = reloaded.refresh()
+        assert changes["removed"] == ["b.example.com.tcp.ovpn"]
+        assert reloaded.get("b.example.com") is None
+
+    def test_second_lookup_does_not_refresh(self, tmp_path):
+        from generate.ovpn_catalog import OvpnCatalog, get_catalog
+        ovpn_dir = tmp_path / "configs"
+        ovpn_dir.mkdir()
+        (ovpn_dir / "a.example.com.udp.ovpn").write_text(SAMPLE_OVPN)
+        (ovpn_dir / ".catalog.json").write_text("{}")  # left behind by older versions
+        past = 1_600_000_000
+        os.utime(ovpn_dir / "a.example.com.udp.ovpn", (past, past))
+        os.utime(ovpn_dir, (past, past))
+
+        catalog = get_catalog(str(ovpn_dir))
+        assert catalog.get("a.example.com") is not None
+        assert os.path.exists(catalog.path) and not catalog.path.startswith(str(ovpn_dir) + os.sep)
+        assert not (ovpn_dir / ".catalog.json").exists()
+        os.utime(ovpn_dir, (past, past))  # removing the legacy file touched the directory
+        catalog.refresh()
+        saved = os.stat(catalog.path).st_mtime_ns
+        with patch.object(OvpnCatalog, "refresh", side_effect=AssertionError("re-scanned")):
+            for _ in range(5):
+                assert get_catalog(str(ovpn_dir)) is catalog
+        assert os.stat(catalog.path).st_mtime_ns == saved
+
+    def test_lookup_picks_up_config_edited_in_place(self, tmp_path):
+        from generate.ovpn_catalog import get_catalog
+        ovpn_dir = tmp_path / "configs"
+        ovpn_dir.mkdir()
+        config = ovpn_dir / "a.example.com.udp.ovpn"
+        config.write_text("remote 185.1.2.3 1194\n")
+        past = 1_600_000_000
+        os.utime(config, (past, past))
+        os.utime(ovpn_dir, (past, past))
+        assert get_catalog(str(ovpn_dir)).get("a.example.com")["remote"] == "185.1.2.3"
+
+        config.write_text("remote 185.9.9.9 1194\n")  # same size, directory mtime unchanged
+        os.utime(config, (past + 60, past + 60))
+        os.utime(ovpn_dir, (past, past))
+        assert get_catalog(str(ovpn_dir)).get("a.example.com")["remote"] == "185.9.9.9"
+
+    def test_prefers_udp_config(self, tmp_path):
+        from generate.ovpn_catalog import OvpnCatalog
+        (tmp_path / "x.example.com.tcp.ovpn").write_text("remote x 443\n")
+        (tmp_path / "x.example.com.udp.ovpn").write_text("remote x 1194\n")
+        catalog = OvpnCatalog(str(tmp_path))
+        catalog.refresh()
+        assert catalog.domain_files() == {"x.example.com": str(tmp_path / "x.example.com.udp.ovpn")}
+
+    def test_config_endpoint_returns_metadata(self, client, paths):
+        (Path(paths["ovpn_dir"]) / "meta.example.com.udp.ovpn").write_text(SAMPLE_OVPN)
+        data = client.get("/api/ovpn/config/meta.example.com").get_json()
+        assert data["filename"] == "meta.example.com.udp.ovpn"
+        assert data["meta"]["remote"] == "185.1.2.3"
+        assert data["meta"]["port"] == 1194
+        assert data["meta"]["cipher"] == "AES-256-CBC"
+        assert len(data["meta"]["sha256"]) == 64
+
+
+# ===================================================================
+# OpenVPN handshake probe (/api/ovpn/probe)
+# ===================================================================
+
+STATIC_KEY = bytes(range(256))
+
+
+def _probe_config(port, proto="udp", tls_auth=True):
+    text = f"client\nproto {proto}\nremote 127.0.0.1 {port}\nauth SHA512\n"
+    if tls_auth:
+        hex_lines = "\n".join(STATIC_KEY[i:i + 16].hex() for i in range(0, 256, 16))
+        text += ("<tls-auth>\n-----BEGIN OpenVPN Static key V1-----\n" + hex_lines
+                 + "\n-----END OpenVPN Static key V1-----\n</tls-auth>\nkey-direction 1\n")
+    return text
+
+
+class TestOvpnProbe:
+
+    def test_udp_probe_with_tls_auth(self, tmp_path):
+        from generate.ovpn_probe import LocalOvpnResponder, client_hmac_key, probe_config
+        key = client_hmac_key(STATIC_KEY, "1", "sha512")
+        assert key == STATIC_KEY[192:256]
+        with LocalOvpnResponder(hmac_key=key, digest="sha512") as responder:
+            path = tmp_path / "a.udp.ovpn"
+            path.write_text(_probe_config(responder.port))
+            result = probe_config(str(path))
+        assert result["status"] == "ok"
+        assert result["rtt_ms"] is not None and result["rtt_ms"] >= 0
+        assert responder.received == 1
+
+    def test_wrong_key_is_dropped(self):
+        from generate.ovpn_probe import LocalOvpnResponder, probe
+        with LocalOvpnResponder(hmac_key=b"k" * 20) as responder:
+            result = probe("127.0.0.1", responder.port, hmac_key=b"x" * 20, timeout=0.3)
+        assert result["status"] == "timeout"
+        assert result["rtt_ms"] is None
+
+    def test_tcp_probe(self):
+        from generate.ovpn_probe import LocalOvpnResponder, probe
+        with LocalOvpnResponder(proto="tcp") as responder:
+            result = probe("127.0.0.1", responder.port, proto="tcp")
+        assert result["status"] == "ok"
+        assert "connect_ms" in result
+
+    def test_api_stores_handshake_rtt(self, client, paths):
+        from generate.ovpn_probe import LocalOvpnResponder, client_hmac_key
+        ovpn_dir = Path(paths["ovpn_dir"])
+        with open(paths["results"], "w") as f:
+            json.dump({"up.example.com": {"latency_ms": 10}, "down.example.com": {"latency_ms": 20}}, f)
+        key = client_hmac_key(STATIC_KEY, "1", "sha512")
+        with LocalOvpnResponder(hmac_key=key, digest="sha512") as responder:
+            (ovpn_dir / "up.example.com.udp.ovpn").write_text(_probe_config(responder.port))
+            (ovpn_dir / "down.example.com.udp.ovpn").write_text(_probe_config(responder.port, tls_auth=False))
+            started = []
+            real_thread = threading.Thread
+
+            def thread(*args, **kwargs):
+                started.append(real_thread(*args, **kwargs))
+                return started[-1]
+            with patch("web.app.threading.Thread", side_effect=thread):
+                resp = client.post("/api/ovpn/probe", json={"timeout": 0.3})
+            assert resp.status_code == 200
+            assert resp.get_json() == {"status": "started", "targets": 2}
+            started[0].join(10)
+        import web.state as state
+        assert state.scan_progress["status"] == "completed" and "1/2" in state.scan_progress["message"]
+        assert not state.scan_active
+        with open(paths["results"]) as f:
+            results = json.load(f)
+        assert results["up.example.com"]["handshake_rtt_ms"] is not None
+        assert results["down.example.com"]["handshake_rtt_ms"] is None
+        assert results["down.example.com"]["handshake_status"] == "timeout"
+
+    def test_api_rejects_bad_domains(self, client, paths, sample_results):
+        for domains in ("server1.example.com", [1, 2]):
+            resp = client.post("/api/ovpn/probe", json={"domains": domains})
+            assert resp.status_code == 400
+            assert "domains" in resp.get_json()["message"]
+
+    def test_probe_keeps_results_written_meanwhile(self, paths, monkeypatch):
+        import web.state as state
+        from generate import ovpn_probe, results_store
+        with open(paths["results"], "w") as f:
+            json.dump({"a.example.com": {"latency_ms": 10}}, f)
+
+        def probe_many(targets, **kwargs):
+            assert state._is_scan_active()
+            results = results_store.load(paths["results"])
+            results["a.example.com"]["rx_speed_mbps"] = 50.0
+            results["new.example.com"] = {"latency_ms": 5}
+            results_store.save(paths["results"], results)
+            return {"a.example.com": {"status": ovpn_probe.OK, "rtt_ms": 12.5}}
+        monkeypatch.setattr(ovpn_probe, "probe_many", probe_many)
+
+        state._run_ovpn_probe_sync({"a.example.com": "a.ovpn"}, 1.0)
+        with open(paths["results"]) as f:
+            results = json.load(f)
+        assert results["a.example.com"]["rx_speed_mbps"] == 50.0
+        assert results["a.example.com"]["handshake_rtt_ms"] == 12.5
+        assert "new.example.com" in results
+
+
 # ===================================================================
 # /api/ovpn/download
 # ===================================================================
@@ -138,7 +376,7 @@ class TestOvpnDownload:
         zf_buf.seek(0)
 
         mock_resp = MagicMock()
-        mock_resp.content = zf_buf.read()
+        mock_resp.iter_content.return_value = [zf_buf.read()]
         mock_resp.raise_for_status = MagicMock()
 
         with patch("web.app.http_requests.get", return_value=mock_resp):
@@ -147,6 +385,8 @@ class TestOvpnDownload:
             })
         assert resp.status_code == 200
         assert resp.get_json()["count"] == 1
+        assert resp.get_json()["added"] == ["s1.udp.ovpn"]
+        mock_resp.close.assert_called_once()
 
 
 # ===================================================================
@@ -162,7 +402,7 @@ class TestGeoliteStatus:
             "published_at": "2026-03-20T00:00:00Z",
             "assets": []
         }
-        mock_resp = MagicMock()
+        mock_resp = MagicMock(status_code=200, headers={})
         mock_resp.json.return_value = mock_release
         mock_resp.raise_for_status = MagicMock()
 
@@ -173,6 +413,26 @@ class TestGeoliteStatus:
         assert "city_last_modified" in data
         assert data["latest_release_tag"] == "2026.03.20"
 
+    def test_status_uses_cached_release(self, client, paths):
+        mock_resp = MagicMock(status_code=200, headers={"ETag": '"v1"'})
+        mock_resp.json.return_value = {"tag_name": "2026.03.20", "published_at": "2026-03-20T00:00:00Z", "assets": []}
+
+        with patch("web.app.http_requests.get", return_value=mock_resp) as get:
+            client.get("/api/geolite/status")
+            with patch("web.state._save_geolite_manifest") as save:
+                data = client.get("/api/geolite/status").get_json()
+            assert not save.called  # cache hit: the manifest is left alone
+            assert get.call_count == 1
+            assert data["latest_release_tag"] == "2026.03.20"
+            assert data["release_checked_at"] is not None
+
+            # A forced re-check revalidates with the stored ETag
+            mock_resp.status_code = 304
+            data = client.get("/api/geolite/status?refresh=1").get_json()
+        assert get.call_count == 2
+        assert get.call_args.kwargs["headers"]["If-None-Match"] == '"v1"'
+        assert data["latest_release_tag"] == "2026.03.20"
+
 
 # ===================================================================
 # /api/geolite/update
@@ -192,7 +452,7 @@ class TestGeoliteUpdate:
         }
 
         def fake_get(url, **kwargs):
-            resp = MagicMock()
+            resp = MagicMock(status_code=200, headers={})
             resp.raise_for_status = MagicMock()
             if "releases" in url:
                 resp.json.return_value = mock_release
@@ -208,3 +468,43 @@ class TestGeoliteUpdate:
         data = resp.get_json()
         assert "GeoLite2-City.mmdb" in data["updated"]
         assert "GeoLite2-Country.mmdb" in data["updated"]
+
+    def _release(self, city_content, **asset_fields):
+        import hashlib
+        asset = {"id": 1, "name": "GeoLite2-City.mmdb", "browser_download_url": "https://example.com/city.mmdb",
+                 "size": len(city_content), "updated_at": "2026-03-20T00:00:00Z",
+                 "digest": "sha256:" + hashlib.sha256(city_content).hexdigest()}
+        asset.update(asset_fields)
+        return {"tag_name": "2026.03.20", "assets": [asset]}
+
+    def _fake_get(self, release, content, calls):
+        def fake_get(url, **kwargs):
+            calls.append(url)
+            resp = MagicMock(status_code=200, headers={"ETag": '"e1"'})
+            if "releases" in url:
+                resp.json.return_value = release
+            else:
+                resp.iter_content = MagicMock(return_value=[content])
+            return resp
+        return fake_get
+
+    def test_unchanged_release_is_not_downloaded_again(self, client, paths):
+        content = b"city db v1"
+        release = self._release(content)
+        calls = []
+        with patch("web.app.http_requests.get", side_effect=self._fake_get(release, content, calls)):
+            first = client.post("/api/geolite/update").get_json()
+            second = client.post("/api/geolite/update").get_json()
+        assert first["updated"] == ["GeoLite2-City.mmdb"]
+        assert second["updated"] == [] and second["unchanged"] == ["GeoLite2-City.mmdb"]
+        assert [u for u in calls if "city" in u] == ["https://example.com/city.mmdb"]
+
+    def test_checksum_mismatch_keeps_existing_db(self, client, paths):
+        Path(paths["city_db"]).write_bytes(b"old db")
+        release = self._release(b"expected content")
+        with patch("web.app.http_requests.get", side_effect=self._fake_get(release, b"tampered", [])):
+            resp = client.post("/api/geolite/update")
+        assert resp.status_code == 500
+        assert "checksum mismatch" in resp.get_json()["message"]
+        assert Path(paths["city_db"]).read_bytes() == b"old db"
+        assert not os.path.exists(paths["city_db"] + ".tmp")
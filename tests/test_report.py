@@ -0,0 +1,199 @@
+"""Tests for the CLI report engine (generate.report.Analyze)."""
+import io
+import json
+import logging
+import os
+from unittest.mock import patch
+
+import pytest
+
+
+@pytest.fixture()
+def results_file(tmp_path):
+    data = {
+        "a.example.com": {"latency_ms": 30.0, "ip": "192.0.2.1", "country": "Germany", "city": "Berlin"},
+        "b.example.com": {"latency_ms": 10.0, "ip": "192.0.2.2", "country": "Germany", "city": "Frankfurt",
+                          "rx_speed_mbps": 90.0, "tx_speed_mbps": 20.0},
+        "c.example.com": [20.0, "192.0.2.3", "United States", "New York"],
+        "d.example.com": {"latency_ms": None, "country": None},
+    }
+    path = tmp_path / "results.json"
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+class TestAnalyze:
+
+    def test_reports_share_one_parse(self, results_file):
+        from generate.report import Analyze
+        report = Analyze(results_file)
+        with patch.object(Analyze, "read_json_file", wraps=Analyze.read_json_file) as read:
+            report.country_stats()
+            report.city_stats()
+            report.get_top_performers()
+        assert read.call_count == 1
+
+    def test_rows_are_normalized(self, results_file):
+        from generate.report import Analyze
+        rows = Analyze(results_file).rows
+        assert rows[1] == ("b.example.com", 10.0, "192.0.2.2", "Germany", "Frankfurt", 90.0, 20.0)
+        assert rows[2] == ("c.example.com", 20.0, "192.0.2.3", "United States", "New York", None, None)
+        assert rows[3] == ("d.example.com", 0.0, "N/A", "Unknown", "Unknown", None, None)
+
+    def test_rows_are_built_from_parsed_dicts(self, results_file):
+        """The CLI path converts each entry once: dict -> row, no ResultRecord in between."""
+        from generate.report import Analyze
+        from generate.records import ResultRecord
+        with patch.object(ResultRecord, "from_dict", side_effect=AssertionError("record built")):
+            report = Analyze(results_file)
+            assert len(report.rows) == 4
+            assert report.get_top_performers(limit=1, sort_by=1)[0][0] == "d.example.com"
+
+    def test_search_and_group_stats_use_indexes(self, results_file):
+        from generate.report import Analyze, COUNTRY_COL, CITY_COL
+        report = Analyze(results_file)
+        top = report.get_top_performers(country="GERM", sort_by=1)
+        assert [row[0] for row in top] == ["b.example.com", "a.example.com"]
+        assert report.get_top_performers(country="germany", city="berlin")[0][0] == "a.example.com"
+        assert report._group_stats(COUNTRY_COL, 0, float("inf")) == [
+            ("Germany", 2, 10.0), ("United States", 1, 20.0), ("Unknown", 1, 0.0)]
+        assert report._group_stats(CITY_COL, 15, 25) == [("New York", 1, 20.0)]
+
+    def test_reloads_when_file_changes(self, results_file):
+        from generate.report import Analyze
+        report = Analyze(results_file)
+        assert len(report.rows) == 4
+        with open(results_file, "w") as f:
+            json.dump({"e.example.com": {"latency_ms": 5, "country": "France", "city": "Paris"}}, f)
+        os.utime(results_file, ns=(0, 0))
+        assert [row[0] for row in report.rows] == ["e.example.com"]
+        assert list(report._index(3)) == ["France"]
+
+    def test_tables_go_to_out_and_logging_keeps_summaries(self, results_file, caplog):
+        from generate.report import Analyze
+        report = Analyze(results_file)
+        report.out = io.StringIO()
+        with caplog.at_level(logging.INFO, logger="generate.report"):
+            report.get_top_performers(limit=2, sort_by=1)
+        lines = report.out.getvalue().splitlines()
+        assert lines[0].split() == ["#", "ENDPOINT", "LATENCY", "IP", "COUNTRY", "CITY", "DL(Mbps)", "UL(Mbps)"]
+        assert lines[1].split() == ["1", "d.example.com", "0.0", "N/A", "Unknown", "Unknown", "N/A", "N/A"]
+        assert len(lines) == 3
+        assert "\033" not in report.out.getvalue()
+        assert not any("example.com" in r.getMessage() for r in caplog.records)
+        assert any(r.getMessage() == "Found: 2 results" for r in caplog.records)
+
+
+    @pytest.mark.parametrize("fmt", ["json", "ndjson", "csv", "tsv"])
+    def test_machine_output_formats(self, results_file, fmt):
+        import csv
+        from generate.report import Analyze, ROW_FIELDS
+        report = Analyze(results_file)
+        report.out = io.StringIO()
+        report.output_format = fmt
+        report.get_top_performers(country="germany", sort_by=1)
+        text = report.out.getvalue()
+        assert "\033" not in text
+        if fmt == "json":
+            records = json.loads(text)
+        elif fmt == "ndjson":
+            records = [json.loads(line) for line in text.splitlines()]
+        else:
+            records = list(csv.DictReader(io.StringIO(text), delimiter="\t" if fmt == "tsv" else ","))
+        assert [r["domain"] for r in records] == ["b.example.com", "a.example.com"]
+        assert list(records[0]) == list(ROW_FIELDS)
+
+    def test_machine_output_stats_and_empty(self, results_file):
+        from generate.report import Analyze
+        report = Analyze(results_file)
+        report.out = io.StringIO()
+        report.output_format = "json"
+        report.country_stats(sort_by=0)
+        assert json.loads(report.out.getvalue())[0] == {"country": "Germany", "servers": 2, "min_latency_ms": 10.0}
+        report.out = io.StringIO()
+        report.get_top_performers(country="nowhere")
+        assert json.loads(report.out.getvalue()) == []
+
+
+    def test_distribution_stats(self, results_file):
+        from generate.report import Analyze, CITY_COL
+        report = Analyze(results_file)
+        report.out = io.StringIO()
+        groups = report.distribution_stats(sort_field="servers")
+        assert [(g["country"], g["servers"]) for g in groups] == [("Germany", 2), ("United States", 1), ("Unknown", 1)]
+        assert groups[0]["latency_ms_median"] == 20.0
+        assert groups[2]["latency_ms_count"] == 0 and groups[2]["latency_ms_min"] is None
+        with pytest.raises(ValueError):
+            report.distribution_stats(CITY_COL, sort_field="bogus")
+
+
+class TestAggregate:
+
+    def test_numpy_and_fallback_agree(self, monkeypatch):
+        import random
+        import generate.aggregate as aggregate
+        if aggregate._numpy() is None:
+            pytest.skip("numpy not installed")
+        rng = random.Random(7)
+        keys = [rng.choice("abcde") for _ in range(500)]
+        metrics = {"latency_ms": [rng.choice([None, 0, rng.uniform(1, 300)]) for _ in keys],
+                   "rx_speed_mbps": [rng.choice([None, rng.uniform(1, 900)]) for _ in keys]}
+        vectorized = aggregate.distribution(keys, metrics)
+        monkeypatch.setattr(aggregate, "np", None)
+        fallback = aggregate.distribution(keys, metrics)
+        assert [g.keys() for g in fallback] == [g.keys() for g in vectorized]
+        for slow, fast in zip(fallback, vectorized):
+            for field, value in slow.items():
+                assert fast[field] == (value if value is None or isinstance(value, str) else pytest.approx(value))
+
+    def test_known_values_and_sorting(self):
+        from generate.aggregate import distribution, sort_groups
+        groups = distribution(["x", "x", "x", "y"], {"latency_ms": [1, 2, 10, None]}, key_name="country")
+        x = groups[0]
+        assert (x["latency_ms_count"], x["latency_ms_min"], x["latency_ms_median"]) == (3, 1.0, 2.0)
+        assert x["latency_ms_p90"] == pytest.approx(8.4)
+        assert x["latency_ms_mean"] == pytest.approx(13 / 3)
+        assert groups[1]["latency_ms_median"] is None
+        assert [g["country"] for g in sort_groups(groups, "latency_ms_median", reverse=True)] == ["x", "y"]
+        with pytest.raises(ValueError):
+            sort_groups(groups, "nope")
+
+
+    def test_city_stats_and_geo_report_group_cities_per_country(self, tmp_path):
+        from generate.report import Analyze, CITY_COL
+        path = tmp_path / "results.json"
+        path.write_text(json.dumps({
+            "a.example.com": {"latency_ms": 5.0, "country": "Germany", "city": "Frankfurt"},
+            "b.example.com": {"latency_ms": 9.0, "country": "United States", "city": "Frankfurt"},
+            "c.example.com": {"latency_ms": 7.0, "country": "Germany", "city": "Frankfurt"},
+        }))
+        report = Analyze(str(path))
+        report.out = io.StringIO()
+        report.output_format = "ndjson"
+        report.city_stats()
+        records = [json.loads(line) for line in report.out.getvalue().splitlines()]
+        assert records == [{"city": "Frankfurt", "country": "Germany", "servers": 2, "min_latency_ms": 5.0},
+                           {"city": "Frankfurt", "country": "United States", "servers": 1, "min_latency_ms": 9.0}]
+        assert len(report.distribution_stats(CITY_COL)) == 2
+
+        assert [c["servers"] for c in report.geo_report("")] == [2, 1]
+        assert report.geo_report("united states")[0]["city"] == "Frankfurt"
+        assert [row[0] for row in report.geo_report("Germany/frankfurt")] == ["a.example.com", "c.example.com"]
+        assert report.geo_report("Germany/Berlin") is None
+
+
+class TestTable:
+
+    def test_widths_from_one_pass_and_chunked_writes(self, monkeypatch):
+        import format.table as table_mod
+        monkeypatch.setattr(table_mod, "CHUNK_ROWS", 2)
+        out = io.StringIO()
+        writes = []
+        monkeypatch.setattr(out, "write", lambda text: writes.append(text))
+        rows = iter([("a", 1), ("longer-name", 22), ("b", 3)])
+        table = table_mod.Table([("NAME", lambda r: r[0]), ("N", lambda r: r[1])])
+        assert table.render(rows, out=out, color=False) == 3
+        assert len(writes) == 3  # header + two chunks
+        lines = "".join(writes).splitlines()
+        assert lines[1] == "1     a             1"
+        assert lines[2] == "2     longer-name   22"
@@ -1,11 +1,15 @@
 """
 E2E tests for /api/results, /api/results/export, /api/countries, /api/results/geo, /api/top-servers,
-/api/statistics, /api/statistics/domains, /api/prune-stale, and /api/v1/top/* endpoints.
+/api/statistics, /api/statistics/domains, /api/statistics/distribution, /api/statistics/geo, /api/prune-stale,
+and /api/v1/top/* endpoints, plus migration of legacy results.json layouts.
 """
 
 import json
+import os
 from unittest.mock import MagicMock, patch
 
+import pytest
+
 
 # ===================================================================
 # /api/results
@@ -32,6 +36,167 @@ class TestResults:
         assert resp.status_code == 500
 
 
+
+# ===================================================================
+# Results schema migration (generate.results_store)
+# ===================================================================
+
+class TestResultsSchema:
+
+    def test_legacy_entries_migrated_once_on_first_read(self, client, paths):
+        with open(paths["results"], "w") as f:
+            json.dump({"old.example.com": [25.0, "192.0.2.1", "US", "NYC"],
+                       "new.example.com": {"latency_ms": 10, "ip": "192.0.2.2", "country": "DE", "city": "Berlin"},
+                       "bad.example.com": "invalid"}, f)
+        data = client.get("/api/results").get_json()
+        assert data["old.example.com"] == {"latency_ms": 25.0, "ip": "192.0.2.1", "country": "US", "city": "NYC",
+                                           "rx_speed_mbps": None, "tx_speed_mbps": None}
+        assert "bad.example.com" not in data
+        with open(paths["results"]) as f:
+            assert json.load(f) == data  # Persisted: later reads see the current layout
+        counts = {c["country"]: c["count"] for c in client.get("/api/countries").get_json()}
+        assert counts == {"DE": 1, "US": 1}
+
+    def test_list_of_objects_layout(self, client, paths):
+        with open(paths["results"], "w") as f:
+            json.dump([{"domain": "a.example.com", "latency_ms": 5, "country": "FR", "city": "Paris"}], f)
+        top = client.get("/api/v1/top/latency").get_json()
+        assert [(t["domain"], t["country"]) for t in top] == [("a.example.com", "FR")]
+
+    def test_current_file_checked_once_and_not_rewritten(self, client, paths, sample_results):
+        from generate import results_store
+        mtime = os.stat(paths["results"]).st_mtime_ns
+        with patch.object(results_store, "schema_version", wraps=results_store.schema_version) as check:
+            client.get("/api/results")
+            client.get("/api/statistics")
+        assert check.call_count == 1
+        assert os.stat(paths["results"]).st_mtime_ns == mtime
+
+    def test_unknown_layout_rejected(self):
+        from generate import results_store
+        assert results_store.migrate({"a": {"latency_ms": 1}}) == {"a": {"latency_ms": 1}}
+        with pytest.raises(ValueError):
+            results_store.migrate("invalid")
+
+
+# ===================================================================
+# Result records (generate.records)
+# ===================================================================
+
+class TestResultRecord:
+
+    ENTRY = {"latency_ms": 12.5, "ip": "192.0.2.1", "country": "Österreich", "city": "Wien",
+             "rx_speed_mbps": None, "history": [{"event": "success", "timings": {"connect": 1.5}}],
+             "quarantine": {"until": "2026-01-01T00:00:00+00:00", "strikes": 1}}
+
+    def test_behaves_like_the_result_dict(self):
+        from generate.records import ResultRecord
+        record = ResultRecord.from_dict("a.example.com", self.ENTRY)
+        assert not hasattr(record, "__dict__")
+        assert record == self.ENTRY and dict(record) == self.ENTRY
+        assert list(record) == list(self.ENTRY)
+        assert record.get("tx_speed_mbps", "n/a") == "n/a" and "tx_speed_mbps" not in record
+        record["tx_speed_mbps"] = 3.0
+        record.setdefault("handshake_status", "ok")
+        assert record.pop("quarantine")["strikes"] == 1
+        del record["rx_speed_mbps"]
+        assert "rx_speed_mbps" not in record and len(record) == 7
+        with pytest.raises(KeyError):
+            record["rx_speed_mbps"]
+
+    def test_serializes_like_json_dumps(self):
+        from generate import results_store
+        from generate.records import ResultRecord
+        results = {"a.example.com": ResultRecord.from_dict("a.example.com", self.ENTRY),
+                   "b.example.com": ResultRecord("b.example.com"), "c.example.com": {"latency_ms": 1}}
+        plain = {domain: dict(entry) for domain, entry in results.items()}
+        assert results_store.dumps(results, indent=2) == json.dumps(plain, indent=2)
+        assert results_store.dumps(results) == json.dumps(plain)
+        for indent in (None, 2):
+            assert (results_store.dumps(results, indent=indent, ensure_ascii=False)
+                    == json.dumps(plain, indent=indent, ensure_ascii=False))
+        assert results_store.dumps({}) == "{}"
+        assert results["a.example.com"].values_for(("ip", "tx_speed_mbps")) == ["192.0.2.1", ""]
+
+    def test_snapshot_shared_until_the_file_changes(self, client, paths, sample_results):
+        from generate import results_store
+        first = results_store.snapshot(paths["results"])
+        assert results_store.snapshot(paths["results"]) is first
+        fresh = results_store.load(paths["results"])
+        assert fresh == first and fresh["server1.example.com"] is not first["server1.example.com"]
+        fresh["server1.example.com"]["latency_ms"] = 1.0
+        results_store.save(paths["results"], fresh)
+        assert results_store.snapshot(paths["results"])["server1.example.com"]["latency_ms"] == 1.0
+        assert client.get("/api/results").get_json()["server1.example.com"]["latency_ms"] == 1.0
+
+# ===================================================================
+# Columnar results table
+# ===================================================================
+
+class TestResultsTable:
+
+    def _results(self):
+        import random
+        rng = random.Random(11)
+        results = {}
+        for i in range(300):
+            entry = {"latency_ms": rng.choice([None, 0, rng.randint(1, 300)]), "country": rng.choice(["DE", "FR", "JP", None]),
+                     "rx_speed_mbps": rng.choice([None, 0, rng.randint(1, 20)]), "tx_speed_mbps": rng.choice([None, rng.uniform(1, 9)])}
+            if rng.random() < 0.3:
+                entry["speedtest_failed_timestamp"] = "2026-01-02T00:00:00"
+            if rng.random() < 0.5:
+                entry["speedtest_timestamp"] = rng.choice(["2026-01-01T00:00:00", "2026-01-03T00:00:00"])
+            results[f"s{i}.example.com"] = entry
+        return results
+
+    def _queries(self, table):
+        everything = table.mask()
+        filtered = table.mask(countries={"de", "jp"}, include_failed=False, present=("rx_speed_mbps",))
+        return (table.countries, table.order("latency_ms", everything, missing=9999),
+                table.order("rx_speed_mbps", filtered, descending=True),
+                table.best_per_country("rx_speed_mbps", table.mask(positive=("rx_speed_mbps",))),
+                table.best_per_country("latency_ms", table.mask(positive=("latency_ms",)), highest=False),
+                table.count_per_country(table.mask(include_failed=False)),
+                table.rows(table.mask(rows=[5, 1, 9], ranges={"latency_ms": (1, 150)})),
+                table.value("tx_speed_mbps", 3), table.any(table.mask(countries={"xx"})))
+
+    def test_numpy_and_fallback_agree(self, monkeypatch):
+        import generate.aggregate as aggregate
+        import generate.columnar as columnar
+        from generate.columnar import ResultsTable
+        if aggregate._numpy() is None:
+            pytest.skip("numpy not installed")
+        monkeypatch.setattr(columnar, "NUMPY_MIN_ROWS", 0)
+        vectorized = self._queries(ResultsTable.from_results(self._results()))
+        monkeypatch.setattr(aggregate, "np", None)
+        assert self._queries(ResultsTable.from_results(self._results())) == vectorized
+
+    def test_routes_match_without_numpy(self, client, paths, monkeypatch):
+        import generate.aggregate as aggregate
+        import generate.columnar as columnar
+        import web.state as state
+        monkeypatch.setattr(columnar, "NUMPY_MIN_ROWS", 0)
+        with open(paths["results"], "w") as f:
+            json.dump(self._results(), f)
+        urls = ["/api/statistics?top=10", "/api/top-servers?include_failed=1", "/api/v1/top/latency?n=20&country=de",
+                "/api/v1/top/download?n=-5", "/api/v1/top/upload?include_failed=true"]
+        responses = [client.get(url).get_json() for url in urls]
+        monkeypatch.setattr(aggregate, "np", None)
+        monkeypatch.setattr(state, "_results_views", {})
+        assert [client.get(url).get_json() for url in urls] == responses
+        assert responses[0]["total_countries"] == len(responses[0]["top"])
+
+    def test_built_once_per_results_version(self, client, paths, sample_results):
+        import web.state as state
+        from generate import results_store
+        table = state._results_table()
+        assert state._results_table() is table and table.size == len(sample_results)
+        results = results_store.load(paths["results"])
+        del results["server1.example.com"]
+        results_store.save(paths["results"], results)
+        assert state._results_table().size == len(sample_results) - 1
+        assert "server1.example.com" not in [s["domain"] for s in client.get("/api/v1/top/latency?n=10").get_json()]
+
 # ===================================================================
 # /api/results/export/<fmt>
 # ===================================================================
@@ -54,6 +219,13 @@ class TestExportResults:
         data = json.loads(resp.data)
         assert "server1.example.com" in data
 
+    def test_export_json_keeps_unicode(self, client, paths):
+        results = {"a.example.com": {"latency_ms": 1.0, "country": "Österreich", "city": "São Paulo"}}
+        with open(paths["results"], "w") as f:
+            json.dump(results, f)
+        resp = client.get("/api/results/export/json")
+        assert resp.data.decode("utf-8") == json.dumps(results, indent=2, ensure_ascii=False)
+
     def test_export_csv(self, client, sample_results):
         resp = client.get("/api/results/export/csv")
         assert resp.status_code == 200
@@ -204,6 +376,78 @@ class TestStatisticsDomains:
         assert "server4.example.com" in data["failed"]
 
 
+# ===================================================================
+# /api/statistics/distribution
+# ===================================================================
+
+class TestStatisticsDistribution:
+
+    def test_no_results(self, client):
+        data = client.get("/api/statistics/distribution").get_json()
+        assert data["groups"] == []
+
+    def test_per_country_distribution(self, client, sample_results):
+        data = client.get("/api/statistics/distribution").get_json()
+        assert data["sort"] == "latency_ms_median"
+        us, de = data["groups"]  # ascending median latency
+        assert us["country"] == "United States" and us["servers"] == 2
+        assert us["latency_ms_min"] == 15.0
+        assert us["latency_ms_median"] == pytest.approx(20.2)
+        assert us["latency_ms_stddev"] == pytest.approx(5.2)
+        assert us["rx_speed_mbps_count"] == 1 and us["rx_speed_mbps_p90"] == 120.5
+        assert de["rx_speed_mbps_count"] == 1  # rx=0 is not a measurement
+
+    def test_sort_order_and_city_filter(self, client, sample_results):
+        data = client.get("/api/statistics/distribution?sort=rx_speed_mbps_median").get_json()
+        assert [g["country"] for g in data["groups"]] == ["United States", "Germany"]  # speeds descend
+        data = client.get("/api/statistics/distribution?sort=rx_speed_mbps_median&order=asc").get_json()
+        assert [g["country"] for g in data["groups"]] == ["Germany", "United States"]
+        data = client.get("/api/statistics/distribution?by=city&country=Germany&sort=city").get_json()
+        assert [g["city"] for g in data["groups"]] == ["Berlin", "Frankfurt"]
+
+    @pytest.mark.parametrize("query", ["by=region", "sort=bogus", "order=up", "by=country&sort=city"])
+    def test_rejects_bad_params(self, client, query):
+        assert client.get(f"/api/statistics/distribution?{query}").status_code == 400
+
+# ===================================================================
+# /api/statistics/geo
+# ===================================================================
+
+class TestStatisticsGeo:
+
+    def test_no_results(self, client):
+        assert client.get("/api/statistics/geo").get_json() == {"level": "countries", "items": []}
+
+    def test_roll_up_and_drill_down(self, client, sample_results):
+        data = client.get("/api/statistics/geo").get_json()
+        assert data["level"] == "countries"
+        us, de = data["items"]  # best latency first
+        assert (us["country"], us["cities"], us["servers"]) == ("United States", 2, 2)
+        assert (us["best_latency"], us["best_latency_server"]) == (15.0, "server3.example.com")
+        assert (de["best_download"], de["best_download_server"]) == (85.3, "server2.example.com")
+
+        data = client.get("/api/statistics/geo?country=germany").get_json()
+        assert data["level"] == "cities" and data["country"] == "Germany"
+        assert [c["city"] for c in data["items"]] == ["Frankfurt", "Berlin"]
+
+        data = client.get("/api/statistics/geo?country=Germany&city=BERLIN").get_json()
+        assert data["level"] == "servers"
+        assert [s["domain"] for s in data["items"]] == ["server4.example.com"]
+
+    def test_same_city_name_in_two_countries_stays_apart(self, client, paths):
+        with open(paths["results"], "w") as f:
+            json.dump({"a.example.com": {"latency_ms": 5, "country": "Germany", "city": "Frankfurt"},
+                       "b.example.com": {"latency_ms": 9, "country": "United States", "city": "Frankfurt"}}, f)
+        data = client.get("/api/statistics/geo?country=United States").get_json()
+        assert [(c["city"], c["servers"]) for c in data["items"]] == [("Frankfurt", 1)]
+        groups = client.get("/api/statistics/distribution?by=city").get_json()["groups"]
+        assert [(g["country"], g["city"]) for g in groups] == [("Germany", "Frankfurt"), ("United States", "Frankfurt")]
+
+    def test_errors(self, client, sample_results):
+        assert client.get("/api/statistics/geo?city=Berlin").status_code == 400
+        assert client.get("/api/statistics/geo?country=Atlantis").status_code == 404
+        assert client.get("/api/statistics/geo?country=Germany&city=Paris").status_code == 404
+
 # ===================================================================
 # /api/prune-stale
 # ===================================================================
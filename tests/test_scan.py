@@ -1,6 +1,7 @@
 """
 E2E tests for /api/scan/start, /api/scan/status, /api/scan/stop,
-/api/vpn-speedtest, and /api/queue/*.
+/api/vpn-speedtest, /api/queue/*, the scan negative cache and merging
+rescanned servers into existing results.
 """
 
 import json
@@ -117,6 +118,14 @@ class TestVpnSpeedtest:
         assert resp.status_code == 200
         assert resp.get_json()["status"] == "started"
 
+    def test_invalid_overrides_rejected(self, client, sample_results):
+        with patch("threading.Thread") as mock_thread:
+            for body in ({"concurrency": "x"}, {"time_budget_minutes": "abc"}, {"data_budget_mb": [1]}):
+                resp = client.post("/api/vpn-speedtest", json=body)
+                assert resp.status_code == 400
+                assert next(iter(body)) in resp.get_json()["message"]
+            assert not mock_thread.called
+
 
 # ===================================================================
 # /api/queue/*
@@ -209,3 +218,132 @@ class TestQueue:
         resp = client.post("/api/queue/clear")
         assert resp.status_code == 200
         assert state_mod.scan_active is True
+
+
+# ===================================================================
+# Negative cache of failed scan targets
+# ===================================================================
+
+class TestNegativeCache:
+
+    def test_backoff_doubles_and_success_clears(self, tmp_path):
+        from datetime import datetime, timedelta, timezone
+        from generate.negcache import NegativeCache
+        cache = NegativeCache(str(tmp_path / "failed.json"), backoff_hours=1, max_backoff_hours=3)
+        now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        cache.update(failed=["a.com"], succeeded=[], now=now)
+        assert cache.partition(["a.com", "b.com"], now=now) == (["b.com"], ["a.com"])
+        assert cache.partition(["a.com"], now=now + timedelta(minutes=61)) == (["a.com"], [])
+
+        entries = cache.update(failed=["a.com"], succeeded=[], now=now + timedelta(hours=2))
+        assert entries["a.com"]["failures"] == 2
+        assert entries["a.com"]["retry_at"] == (now + timedelta(hours=4)).isoformat()
+        assert entries["a.com"]["first_failed"] == now.isoformat()
+        assert cache.backoff(5) == 3  # capped
+
+        cache.update(failed=[], succeeded=["a.com"])
+        assert cache.load() == {}
+
+    def test_scan_skips_backed_off_targets_and_keeps_servers_list(self, paths, monkeypatch):
+        from contextlib import nullcontext
+        import generate.scan as scan_mod
+        import web.state as state
+        with open(paths["servers"], "w") as f:
+            f.write("bad.example.com\ngood.example.com\n")
+        for db in (state.GEOIP_CITY, state.GEOIP_COUNTRY):
+            open(db, "w").close()
+        monkeypatch.setattr(scan_mod.georeader, "lease", lambda path: nullcontext())
+        scanned = []
+
+        def fake_inner(self, domains, *args, **kwargs):
+            scanned.append(list(domains))
+            ok = {d: {"latency_ms": 10} for d in domains if d != "bad.example.com"}
+            return ok, {d for d in domains if d == "bad.example.com"}
+        monkeypatch.setattr(scan_mod.Scanner, "_scan_inner", fake_inner)
+
+        state.run_scan_in_background(1, 1000, 1)
+        state.run_scan_in_background(1, 1000, 1)
+        assert scanned == [["bad.example.com", "good.example.com"], ["good.example.com"]]
+        with open(paths["servers"]) as f:
+            assert f.read() == "bad.example.com\ngood.example.com\n"
+
+    def test_failed_servers_keep_their_results(self, paths, monkeypatch):
+        from contextlib import nullcontext
+        import socket
+        import generate.scan as scan_mod
+        import web.state as state
+        with open(paths["servers"], "w") as f:
+            f.write("bad.example.com\ngood.example.com\n")
+        old = {"latency_ms": 50.0, "ip": "192.0.2.1", "country": "Germany", "city": "Berlin", "rx_speed_mbps": 80.0}
+        with open(paths["results"], "w") as f:
+            json.dump({"bad.example.com": old}, f)
+        for db in (state.GEOIP_CITY, state.GEOIP_COUNTRY):
+            open(db, "w").close()
+
+        def resolve(domain):
+            if domain == "bad.example.com":
+                raise socket.gaierror("no such host")
+            return domain, [], ["192.0.2.9"]
+        monkeypatch.setattr(scan_mod.georeader, "lease", lambda path: nullcontext())
+        monkeypatch.setattr(scan_mod.socket, "gethostbyname_ex", resolve)
+        monkeypatch.setattr(scan_mod.Scanner, "_ping_avg_latency", staticmethod(lambda ip, n, t: 12.0))
+
+        state.run_scan_in_background(1, 1000, 1)
+        with open(paths["results"]) as f:
+            results = json.load(f)
+        assert results["bad.example.com"] == old
+        assert results["good.example.com"]["latency_ms"] == 12.0
+        assert list(state._negative_cache().load()) == ["bad.example.com"]
+
+    def test_failed_servers_api(self, client, paths):
+        import web.state as state
+        state._negative_cache().update(failed=["a.com", "b.com"], succeeded=[])
+        data = client.get("/api/servers/failed").get_json()
+        assert data["count"] == 2 and data["suppressed"] == 2
+        assert {e["domain"] for e in data["servers"]} == {"a.com", "b.com"}
+
+        resp = client.delete("/api/servers/failed", json={"domains": ["a.com"]})
+        assert resp.get_json()["removed"] == 1
+        assert client.delete("/api/servers/failed", json={"domains": "b.com"}).status_code == 400
+        assert client.delete("/api/servers/failed").get_json()["removed"] == 1
+        assert client.get("/api/servers/failed").get_json()["count"] == 0
+
+
+# ===================================================================
+# Rescan merge
+# ===================================================================
+
+class TestRescanMerge:
+
+    KEPT = {
+        "rx_speed_mbps": 88.5, "tx_speed_mbps": 20.1, "speedtest_timestamp": "2026-01-01T00:00:00+00:00",
+        "tunnel_latency_ms": 35.2, "download_duration_s": 4.5, "upload_duration_s": 3.25,
+        "history": [{"event": "success"}],
+        "quarantine": {"until": "2999-01-01T00:00:00+00:00", "strikes": 3},
+        "consecutive_failures": 3, "failure_class": "auth",
+        "handshake_rtt_ms": 41.7, "handshake_status": "ok", "handshake_probe_timestamp": "2026-01-02T00:00:00+00:00",
+    }
+
+    def test_rescan_keeps_fields_the_scan_does_not_measure(self, paths, monkeypatch):
+        from contextlib import nullcontext
+        import generate.scan as scan_mod
+        import web.state as state
+        from generate.retry import is_quarantined
+        with open(paths["servers"], "w") as f:
+            f.write("a.example.com\n")
+        with open(paths["results"], "w") as f:
+            json.dump({"a.example.com": {"latency_ms": 99.0, "ip": "192.0.2.1", "country": "Old",
+                                         "city": "Old", **self.KEPT}}, f)
+        for db in (state.GEOIP_CITY, state.GEOIP_COUNTRY):
+            open(db, "w").close()
+        monkeypatch.setattr(scan_mod.georeader, "lease", lambda path: nullcontext())
+        monkeypatch.setattr(scan_mod.socket, "gethostbyname_ex", lambda d: (d, [], ["192.0.2.9"]))
+        monkeypatch.setattr(scan_mod.Scanner, "_ping_avg_latency", staticmethod(lambda ip, n, t: 12.0))
+
+        state.run_scan_in_background(1, 1000, 1)
+        with open(paths["results"]) as f:
+            entry = json.load(f)["a.example.com"]
+        assert entry["latency_ms"] == 12.0 and entry["ip"] == "192.0.2.9" and entry["country"] == "Unknown"
+        assert {key: entry.get(key) for key in self.KEPT} == self.KEPT
+        assert is_quarantined(entry)
+
@@ -1,8 +1,12 @@
 """
-E2E tests for /api/servers (GET and POST).
+E2E tests for /api/servers (GET and POST), /api/servers/changes and the
+servers update commands.
 """
 
 import json
+import time
+
+import pytest
 
 
 class TestGetServers:
@@ -51,3 +55,96 @@ class TestPostServers:
         resp = client.post("/api/servers", json={"servers": ""})
         data = resp.get_json()
         assert data["count"] == 0
+
+
+class TestServersUpdateCommands:
+
+    def test_commands_run_concurrently_and_produce_changeset(self, client, paths):
+        import web.state as state
+        with open(paths["servers"], "w") as f:
+            f.write("keep.example.com\ngone.example.com\n")
+        commands = [
+            {"label": "a", "command": "sleep 0.5; printf 'keep.example.com\\nnew1.example.com\\n'"},
+            {"label": "b", "command": "sleep 0.5; printf 'new2.example.com\\n\\nkeep.example.com\\n'"},
+        ]
+        start = time.monotonic()
+        changes = state._run_servers_update_commands(commands)
+        assert time.monotonic() - start < 0.9  # not 2 x 0.5s
+        assert changes["count"] == 3
+        assert changes["added"] == ["new1.example.com", "new2.example.com"]
+        assert changes["removed"] == ["gone.example.com"]
+        assert [c["hosts"] for c in changes["commands"]] == [2, 2]
+        with open(paths["servers"]) as f:
+            assert f.read().splitlines() == ["keep.example.com", "new1.example.com", "new2.example.com"]
+
+        resp = client.get("/api/servers/changes")
+        assert resp.status_code == 200
+        assert resp.get_json()["removed"] == ["gone.example.com"]
+
+    def test_timeout_fails_without_touching_list(self, paths):
+        import web.state as state
+        with open(paths["servers"], "w") as f:
+            f.write("keep.example.com\n")
+        commands = [
+            {"label": "fast", "command": "echo fast.example.com"},
+            {"label": "slow", "command": "echo slow.example.com; sleep 5", "timeout": 0.3},
+        ]
+        start = time.monotonic()
+        with pytest.raises(RuntimeError, match="'slow' timed out"):
+            state._run_servers_update_commands(commands)
+        assert time.monotonic() - start < 3
+        with open(paths["servers"]) as f:
+            assert f.read() == "keep.example.com\n"
+
+    def test_failed_command_reports_stderr(self, paths):
+        import web.state as state
+        with pytest.raises(RuntimeError, match="exited with code 3: boom"):
+            state._run_servers_update_commands([{"label": "bad", "command": "echo boom >&2; exit 3"}])
+
+    def test_no_changeset_yet(self, client):
+        assert client.get("/api/servers/changes").status_code == 404
+
+    def test_update_queues_scan_of_added_servers_only(self, paths, monkeypatch):
+        import web.state as state
+        import web.scheduler as scheduler
+        with open(paths["servers"], "w") as f:
+            f.write("keep.example.com\n")
+        config = state.load_config()
+        config["schedule"]["servers_update"]["commands"] = [
+            {"label": "a", "command": "printf 'keep.example.com\\nnew.example.com\\n'", "enabled": True}]
+        config["schedule"]["servers_update"]["speedtest_new"] = True
+        state.save_config(config)
+        monkeypatch.setattr(state, "_ensure_queue_processor", lambda: None)
+        scheduler.scheduled_servers_update()
+        pending = state._read_queue_file()["pending"]
+        assert pending == [{"domains": ["new.example.com"], "type": "latency_scan",
+                            "label": "New servers", "options": {"vpn_speedtest": True}}]
+
+    def test_queued_latency_scan_targets_only_its_domains(self, paths, monkeypatch):
+        import web.state as state
+        seen = {}
+
+        def fake_scan(pings, timeout, workers, vpn_speedtest=False, countries=None, domains=None):
+            seen.update(domains=domains, vpn_speedtest=vpn_speedtest)
+        monkeypatch.setattr(state, "run_scan_in_background", fake_scan)
+        state._queue_add_job(["new.example.com"], "latency_scan", "New servers", {"vpn_speedtest": False})
+        state._queue_processor_loop()
+        assert seen == {"domains": ["new.example.com"], "vpn_speedtest": False}
+        assert state._read_queue_file()["pending"] == []
+
+    def test_targeted_scan_does_not_mark_the_scheduled_scan_as_run(self, paths, monkeypatch):
+        from contextlib import nullcontext
+        import generate.scan as scan_mod
+        import web.state as state
+        with open(paths["servers"], "w") as f:
+            f.write("old.example.com\nnew.example.com\n")
+        for db in (state.GEOIP_CITY, state.GEOIP_COUNTRY):
+            open(db, "w").close()
+        monkeypatch.setattr(scan_mod.georeader, "lease", lambda path: nullcontext())
+        monkeypatch.setattr(scan_mod.Scanner, "_scan_inner",
+                            lambda self, domains, *args, **kwargs: ({d: {"latency_ms": 10} for d in domains}, set()))
+
+        state.run_scan_in_background(1, 1000, 1, domains=["new.example.com"])
+        assert "last_run" not in state.load_config()["schedule"].get("latency_scan", {})
+        state.run_scan_in_background(1, 1000, 1)
+        assert state.load_config()["schedule"]["latency_scan"]["last_run"]
@@ -0,0 +1,482 @@
+"""
+Tests for the VPN speedtest pipeline: VPNManager, network namespaces and
+parallel batch runs (fake openvpn + loopback throughput server).
+"""
+
+import json
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from generate.netns import NetNamespace
+from generate.planner import Budget, plan_endpoints
+from generate.retry import RetryPolicy, classify_failure, is_quarantined
+from generate.speedtest import SpeedTest
+from generate.throughput import ThroughputEngine, resolve_target
+from generate.vpn import VPNManager
+from generate.vpn_batch_helper import _perform_vpn_speedtests_batch, phase_percentiles
+
+
+def _write_ovpn(ovpn_dir, domains, body="client\nremote {domain} 1194\n"):
+    for d in domains:
+        with open(f"{ovpn_dir}/{d}.udp.ovpn", "w") as f:
+            f.write(body.format(domain=d))
+
+
+def _endpoints(domains):
+    return {d: {"latency_ms": 10.0 + i, "ip": f"192.0.2.{i + 1}", "country": "Germany",
+                "city": "Berlin", "rx_speed_mbps": None, "tx_speed_mbps": None}
+            for i, d in enumerate(domains)}
+
+
+@pytest.fixture()
+def fake_netns(monkeypatch):
+    """Skip real namespace setup; commands run on the host."""
+    monkeypatch.setattr(NetNamespace, "create", lambda self: True)
+    monkeypatch.setattr(NetNamespace, "destroy", lambda self: None)
+    monkeypatch.setattr(NetNamespace, "wrap", lambda self, cmd: list(cmd))
+
+
+# ===================================================================
+# NetNamespace
+# ===================================================================
+
+class TestNetNamespace:
+
+    def test_names_and_subnet_per_slot(self):
+        ns = NetNamespace(3)
+        assert ns.name == "gipa3"
+        assert ns.host_ip == "10.231.3.1"
+        assert ns.ns_ip == "10.231.3.2"
+
+    def test_wrap_prefixes_ip_netns_exec(self):
+        ns = NetNamespace(0)
+        assert ns.wrap(["speedtest-cli", "--json"]) == ["ip", "netns", "exec", "gipa0", "speedtest-cli", "--json"]
+
+    def test_slot_out_of_range(self):
+        with pytest.raises(ValueError):
+            NetNamespace(256)
+
+
+# ===================================================================
+# VPNManager (management interface)
+# ===================================================================
+
+class TestVPNManagerConnect:
+
+    def test_connect_on_connected_state_records_timings(self, paths, fake_openvpn, fake_netns):
+        _write_ovpn(paths["ovpn_dir"], ["a.example.com"])
+        vpn = VPNManager(netns=NetNamespace(0))
+        try:
+            assert vpn.connect(f"{paths['ovpn_dir']}/a.example.com.udp.ovpn", "user", "pass") is True
+            assert vpn.connected
+            assert 0 < vpn.last_timings["connect_s"] < 5
+            assert 0 <= vpn.last_timings["handshake_s"] <= vpn.last_timings["connect_s"]
+        finally:
+            vpn.disconnect()
+        assert vpn.process is None
+
+    def test_auth_failure_reported(self, paths, fake_openvpn, fake_netns):
+        _write_ovpn(paths["ovpn_dir"], ["bad.example.com"], body="client\n# auth-fail\n")
+        vpn = VPNManager(netns=NetNamespace(0))
+        assert vpn.connect(f"{paths['ovpn_dir']}/bad.example.com.udp.ovpn", "user", "pass") is False
+        assert vpn.last_failure == "auth_failed"
+        vpn.disconnect()
+
+    def test_reconnecting_fails_fast(self, paths, fake_openvpn, fake_netns):
+        _write_ovpn(paths["ovpn_dir"], ["tls.example.com"], body="client\n# tls-error\n")
+        vpn = VPNManager(netns=NetNamespace(0))
+        start = time.time()
+        assert vpn.connect(f"{paths['ovpn_dir']}/tls.example.com.udp.ovpn", "user", "pass", timeout=20) is False
+        assert time.time() - start < 5
+        assert vpn.last_failure == "tls-error"
+        assert vpn.process is None
+
+
+class TestVPNManagerDisconnect:
+
+    def test_teardown_waits_for_exit_and_records_time(self, paths, fake_openvpn, fake_netns):
+        _write_ovpn(paths["ovpn_dir"], ["a.example.com"])
+        vpn = VPNManager(netns=NetNamespace(0))
+        assert vpn.connect(f"{paths['ovpn_dir']}/a.example.com.udp.ovpn", "user", "pass")
+        process = vpn.process
+        vpn.disconnect()
+        assert process.returncode is not None
+        assert vpn.process is None and not vpn.connected
+        assert vpn.last_timings["teardown_s"] < 1
+
+    def test_sigterm_ignored_escalates_to_sigkill(self, paths, fake_openvpn, fake_netns, monkeypatch):
+        import generate.vpn as vpn_mod
+        monkeypatch.setattr(vpn_mod, "TEARDOWN_GRACE_S", 0.3)
+        _write_ovpn(paths["ovpn_dir"], ["stuck.example.com"], body="client\n# ignore-term\n")
+        vpn = VPNManager(netns=NetNamespace(0))
+        assert vpn.connect(f"{paths['ovpn_dir']}/stuck.example.com.udp.ovpn", "user", "pass")
+        process = vpn.process
+        vpn.disconnect()
+        assert process.returncode == -9
+        assert vpn.last_timings["teardown_s"] < 3
+
+    def test_routing_cleanup_is_one_batched_call(self, monkeypatch):
+        import generate.vpn as vpn_mod
+        calls = []
+        monkeypatch.setattr(vpn_mod.subprocess, "run", lambda cmd, **kw: calls.append((cmd, kw.get("input"))))
+        VPNManager(table_id="123")._restore_routing()
+        assert len(calls) == 1
+        cmd, script = calls[0]
+        assert cmd == ["ip", "-force", "-batch", "-"]
+        assert "rule del table 123" in script and "route flush table 123" in script
+
+
+# ===================================================================
+# Parallel speedtests
+# ===================================================================
+
+class TestParallelSpeedtests:
+
+    def test_runs_tunnels_concurrently_within_cap(self, paths, fake_openvpn, fake_netns,
+                                                  throughput_server, monkeypatch):
+        domains = [f"de{i}.example.com" for i in range(6)]
+        _write_ovpn(paths["ovpn_dir"], domains)
+        endpoints = _endpoints(domains)
+
+        lock = threading.Lock()
+        active = {"now": 0, "peak": 0}
+        namespaces = set()
+
+        def fake_speedtest(timeout=60, netns=None):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+                namespaces.add(netns.name)
+            start = time.time()
+            with urllib.request.urlopen(f"{throughput_server}/download?bytes=2000000") as resp:
+                size = len(resp.read())
+            time.sleep(0.2)
+            with lock:
+                active["now"] -= 1
+            mbps = round(size * 8 / (time.time() - start) / 1_000_000, 2)
+            return {"download_mbps": mbps, "upload_mbps": mbps / 2, "ping_ms": 1.0}
+
+        monkeypatch.setattr(SpeedTest, "run_speedtest", staticmethod(fake_speedtest))
+        progress = {}
+        report = _perform_vpn_speedtests_batch(
+            endpoints, paths["ovpn_dir"], "user", "pass", progress,
+            interactive=False, results_file=paths["results"], concurrency=3
+        )
+
+        assert report["succeeded"] == 6
+        assert progress["done"] == 6
+        assert 2 <= active["peak"] <= 3
+        assert namespaces <= {"gipa0", "gipa1", "gipa2"}
+        for d in domains:
+            assert endpoints[d]["rx_speed_mbps"] > 0
+            assert endpoints[d]["history"][-1]["event"] == "success"
+            assert "connect_s" in endpoints[d]["history"][-1]["timings"]
+            assert "teardown_s" in endpoints[d]["history"][-1]["timings"]
+
+    def test_auth_failure_recorded_per_server(self, paths, fake_openvpn, fake_netns, monkeypatch):
+        _write_ovpn(paths["ovpn_dir"], ["ok.example.com"])
+        _write_ovpn(paths["ovpn_dir"], ["bad.example.com"], body="client\n# auth-fail\n")
+        endpoints = _endpoints(["ok.example.com", "bad.example.com"])
+        monkeypatch.setattr(SpeedTest, "run_speedtest", staticmethod(
+            lambda timeout=60, netns=None: {"download_mbps": 50.0, "upload_mbps": 10.0, "ping_ms": 5.0}))
+
+        report = _perform_vpn_speedtests_batch(
+            endpoints, paths["ovpn_dir"], "user", "pass", {},
+            interactive=False, concurrency=2
+        )
+        assert report["succeeded"] == 1
+        assert report["vpn_failed"] == 1
+        assert endpoints["bad.example.com"]["speedtest_failed_reason"] == "vpn_failed"
+
+    def test_namespace_setup_failure_is_an_error(self, paths, fake_openvpn, monkeypatch):
+        monkeypatch.setattr(NetNamespace, "create", lambda self: False)
+        monkeypatch.setattr(NetNamespace, "destroy", lambda self: None)
+        _write_ovpn(paths["ovpn_dir"], ["a.example.com"])
+        endpoints = _endpoints(["a.example.com"])
+        report = _perform_vpn_speedtests_batch(
+            endpoints, paths["ovpn_dir"], "user", "pass", {},
+            interactive=False, concurrency=2
+        )
+        assert report["errors"] == 1
+        assert endpoints["a.example.com"]["speedtest_failed_reason"] == "error"
+
+
+# ===================================================================
+# Native throughput engine
+# ===================================================================
+
+class TestThroughputEngine:
+
+    def test_measures_download_upload_and_latency(self, throughput_server):
+        engine = ThroughputEngine(target=throughput_server, streams=2, duration=1, interval=0.25)
+        result = engine.run()
+        assert result["download_mbps"] > 0
+        assert result["upload_mbps"] > 0
+        assert result["ping_ms"] is not None
+        assert result["bytes_total"] > 0
+        assert len(result["download_samples"]) >= 2
+
+    def test_byte_budget_stops_early(self, throughput_server):
+        engine = ThroughputEngine(target=throughput_server, streams=2, duration=30,
+                                  max_bytes=5_000_000, interval=0.1)
+        start = time.time()
+        download = engine.measure_download()
+        assert time.time() - start < 10
+        assert download["bytes"] >= 5_000_000
+
+    def test_stops_early_once_converged(self):
+        engine = ThroughputEngine(target="http://127.0.0.1:9", streams=1, duration=30,
+                                  interval=0.05, min_duration=0.2, cv_threshold=0.1)
+
+        def steady_stream(counters, idx, stop):
+            while not stop.is_set():
+                counters[idx] += 50_000
+                time.sleep(0.005)
+
+        result = engine._measure(steady_stream)
+        assert result["converged"] is True
+        assert result["duration_s"] < 5
+        assert result["mbps"] > 0
+
+    def test_convergence_disabled_runs_full_duration(self):
+        engine = ThroughputEngine(target="http://127.0.0.1:9", duration=0.6, interval=0.1,
+                                  min_duration=0, cv_threshold=0)
+
+        def steady_stream(counters, idx, stop):
+            while not stop.is_set():
+                counters[idx] += 10_000
+                time.sleep(0.005)
+
+        result = engine._measure(steady_stream)
+        assert result["converged"] is False
+        assert result["duration_s"] >= 0.6
+
+    def test_unknown_target(self):
+        with pytest.raises(ValueError):
+            resolve_target("nope")
+
+    def test_native_engine_records_tunnel_latency(self, paths, fake_openvpn, throughput_server):
+        _write_ovpn(paths["ovpn_dir"], ["a.example.com"])
+        endpoints = _endpoints(["a.example.com"])
+        report = _perform_vpn_speedtests_batch(
+            endpoints, paths["ovpn_dir"], "user", "pass", {}, interactive=False,
+            engine="native", engine_options={"target": throughput_server, "streams": 2, "duration": 1}
+        )
+        assert report["succeeded"] == 1
+        entry = endpoints["a.example.com"]
+        assert entry["rx_speed_mbps"] > 0
+        assert entry["tunnel_latency_ms"] is not None
+        assert entry["history"][-1]["bytes_total"] > 0
+        assert 0 < entry["download_duration_s"] <= 1.5
+        assert entry["history"][-1]["upload_duration_s"] is not None
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError):
+            SpeedTest(engine="iperf")
+
+    def test_native_engine_in_namespace_accepts_every_engine_option(self, throughput_server):
+        class PassThroughNamespace:
+            def wrap(self, cmd):
+                return cmd
+        options = {"target": throughput_server, "streams": 1, "duration": 0.5, "max_bytes": 1_000_000,
+                   "interval": 0.1, "min_duration": 0.2, "cv_threshold": 0, "latency_probes": 2, "timeout": 5,
+                   "unknown": 1}
+        result = SpeedTest(engine="native", engine_options=options).run_speedtest(timeout=30, netns=PassThroughNamespace())
+        assert result is not None
+        assert result["download_mbps"] > 0
+
+
+# ===================================================================
+# Planner and budgets
+# ===================================================================
+
+class TestPlanner:
+
+    def test_never_tested_ranks_before_recently_tested(self):
+        now = datetime.now(timezone.utc)
+        endpoints = {
+            "fresh.example.com": {"latency_ms": 10, "country": "Germany",
+                                  "speedtest_timestamp": now.isoformat()},
+            "new.example.com": {"latency_ms": 10, "country": "France"},
+        }
+        assert plan_endpoints(endpoints.items(), now)[0][0] == "new.example.com"
+
+    def test_low_latency_wins_when_otherwise_equal(self):
+        endpoints = {"slow.example.com": {"latency_ms": 300, "country": "Germany"},
+                     "fast.example.com": {"latency_ms": 5, "country": "France"}}
+        assert plan_endpoints(endpoints.items())[0][0] == "fast.example.com"
+
+    def test_spreads_across_countries(self):
+        endpoints = {f"de{i}.example.com": {"latency_ms": 5 + i, "country": "Germany"} for i in range(5)}
+        endpoints["fr1.example.com"] = {"latency_ms": 40, "country": "France"}
+        order = [d for d, _ in plan_endpoints(endpoints.items())]
+        assert order.index("fr1.example.com") <= 2
+
+    def test_time_budget_exhausted(self):
+        budget = Budget(time_budget_s=0.5)
+        budget.charge(1.0)
+        assert budget.allows_next() is False
+        assert budget.exhausted_reason == "time"
+
+    def test_data_budget_stops_run_cleanly(self, paths, fake_openvpn, fake_netns, monkeypatch):
+        domains = [f"de{i}.example.com" for i in range(5)]
+        _write_ovpn(paths["ovpn_dir"], domains)
+        endpoints = _endpoints(domains)
+        monkeypatch.setattr(SpeedTest, "run_speedtest", staticmethod(
+            lambda timeout=60, netns=None: {"download_mbps": 50.0, "upload_mbps": 10.0,
+                                            "ping_ms": 5.0, "bytes_total": 100_000_000}))
+        report = _perform_vpn_speedtests_batch(
+            endpoints, paths["ovpn_dir"], "user", "pass", {}, interactive=False, data_budget_mb=250
+        )
+        assert report["tested"] == 2
+        assert report["budget"]["exhausted"] == "data"
+        assert report["budget"]["bytes_used"] == 200_000_000
+
+
+# ===================================================================
+# Per-phase timings
+# ===================================================================
+
+class TestPhaseTimings:
+
+    def test_history_records_phase_breakdown(self, paths, fake_openvpn, fake_netns, monkeypatch):
+        _write_ovpn(paths["ovpn_dir"], ["a.example.com"])
+        endpoints = _endpoints(["a.example.com"])
+        monkeypatch.setattr(SpeedTest, "run_speedtest", staticmethod(
+            lambda timeout=60, netns=None: {"download_mbps": 50.0, "upload_mbps": 10.0, "ping_ms": 5.0,
+                                            "download_duration_s": 2.0, "upload_duration_s": 3.0}))
+        report = _perform_vpn_speedtests_batch(endpoints, paths["ovpn_dir"], "user", "pass", {},
+                                               interactive=False, concurrency=2)
+        timings = endpoints["a.example.com"]["history"][-1]["timings"]
+        for phase in ("namespace_s", "spawn_s", "handshake_s", "auth_s", "route_setup_s",
+                      "connect_s", "speedtest_s", "teardown_s", "total_s"):
+            assert phase in timings, phase
+        assert timings["download_s"] == 2.0 and timings["upload_s"] == 3.0
+        assert timings["total_s"] >= timings["connect_s"]
+        assert report["phase_totals_s"]["download_s"] == 2.0
+
+    def test_percentiles_filtered_by_source(self):
+        history = [{"timestamp": f"2026-01-0{i + 1}T00:00:00+00:00", "event": "success", "source": "scheduled",
+                    "timings": {"connect_s": float(i + 1), "total_s": 10.0}} for i in range(5)]
+        history.append({"timestamp": "2026-01-09T00:00:00+00:00", "event": "vpn_failed", "source": "user",
+                        "timings": {"connect_s": 100.0}})
+        stats = phase_percentiles({"a.example.com": {"history": history}}, source="scheduled")
+        assert stats["records"] == 5
+        assert stats["phases"]["connect_s"]["p50"] == 3.0
+        assert stats["phases"]["connect_s"]["p90"] == 4.6
+        assert stats["phases"]["total_s"]["total_s"] == 50.0
+        assert list(stats["phases"]) == ["connect_s", "total_s"]
+
+    def test_phases_api(self, client, paths):
+        results = {"a.example.com": {"latency_ms": 10.0, "country": "Germany", "history": [
+            {"timestamp": "2026-01-01T00:00:00+00:00", "event": "success", "source": "user",
+             "timings": {"connect_s": 2.5, "teardown_s": 0.1}}]}}
+        with open(paths["results"], "w") as f:
+            json.dump(results, f)
+        data = client.get("/api/vpn-speedtest/phases?since=2025-12-31").get_json()
+        assert data["records"] == 1
+        assert data["phases"]["connect_s"]["p50"] == 2.5
+        assert client.get("/api/vpn-speedtest/phases?since=2026-02-01").get_json()["records"] == 0
+
+
+# ===================================================================
+# Failure classification, retries and quarantine
+# ===================================================================
+
+class TestRetryAndQuarantine:
+
+    @pytest.mark.parametrize("event,reason,output,expected", [
+        ("speedtest_failed", None, "", "measurement"),
+        ("vpn_failed", "auth_failed", "", "auth"),
+        ("vpn_failed", "exited", "AUTH: Received control message: AUTH_FAILED", "auth"),
+        ("vpn_failed", "timeout", "", "timeout"),
+        ("vpn_failed", "exited", "RESOLVE: Cannot resolve host address: x", "no_route"),
+        ("vpn_failed", "tls-error", "", "tunnel_down"),
+    ])
+    def test_classify_failure(self, event, reason, output, expected):
+        assert classify_failure(event, reason, output) == expected
+
+    def test_transient_failure_retried_with_backoff(self, paths, fake_openvpn, fake_netns):
+        _write_ovpn(paths["ovpn_dir"], ["tls.example.com"], body="client\n# tls-error\n")
+        endpoints = _endpoints(["tls.example.com"])
+        report = _perform_vpn_speedtests_batch(
+            endpoints, paths["ovpn_dir"], "user", "pass", {}, interactive=False,
+            retry_options={"max_retries": 2, "backoff_s": 0.01}
+        )
+        assert report["vpn_failed"] == 1
+        entry = endpoints["tls.example.com"]
+        assert entry["failure_class"] == "tunnel_down"
+        assert entry["history"][-1]["attempts"] == 3
+        assert "retry_s" in entry["history"][-1]["timings"]
+        assert entry["consecutive_failures"] == 1
+        assert not is_quarantined(entry)
+
+    def test_auth_failure_not_retried_and_quarantined(self, paths, fake_openvpn, fake_netns):
+        _write_ovpn(paths["ovpn_dir"], ["bad.example.com"], body="client\n# auth-fail\n")
+        endpoints = _endpoints(["bad.example.com"])
+        _perform_vpn_speedtests_batch(endpoints, paths["ovpn_dir"], "user", "pass", {}, interactive=False)
+        entry = endpoints["bad.example.com"]
+        assert "attempts" not in entry["history"][-1]
+        assert entry["quarantine"]["failure_class"] == "auth"
+        assert is_quarantined(entry)
+
+        report = _perform_vpn_speedtests_batch(endpoints, paths["ovpn_dir"], "user", "pass", {}, interactive=False)
+        assert report["tested"] == 0
+        report = _perform_vpn_speedtests_batch(endpoints, paths["ovpn_dir"], "user", "pass", {},
+                                               interactive=False, respect_quarantine=False)
+        assert report["tested"] == 1
+
+    def test_quarantine_cooldown_increases_and_success_clears(self):
+        policy = RetryPolicy(quarantine_hours=2)
+        now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        entry = {}
+        policy.record(entry, "auth", now)
+        assert datetime.fromisoformat(entry["quarantine"]["until"]) == now + timedelta(hours=2)
+        policy.record(entry, "auth", now)
+        assert datetime.fromisoformat(entry["quarantine"]["until"]) == now + timedelta(hours=4)
+        assert entry["quarantine"]["strikes"] == 2
+        policy.record(entry, None)
+        assert "quarantine" not in entry and "consecutive_failures" not in entry
+
+    def test_transient_quarantined_after_repeated_runs(self):
+        policy = RetryPolicy()
+        entry = {}
+        for _ in range(2):
+            policy.record(entry, "timeout")
+        assert "quarantine" not in entry
+        policy.record(entry, "timeout")
+        assert is_quarantined(entry)
+
+
+# ===================================================================
+# Speedtest options (config + request overrides)
+# ===================================================================
+
+class TestSpeedtestOptions:
+
+    def test_default_concurrency(self, paths):
+        import web.state as state_mod
+        assert state_mod._speedtest_options()["concurrency"] == 1
+
+    def test_override_clamped(self, paths):
+        import web.state as state_mod
+        assert state_mod._speedtest_options({"concurrency": 500})["concurrency"] == state_mod.MAX_SPEEDTEST_CONCURRENCY
+        assert state_mod._speedtest_options({"concurrency": 0})["concurrency"] == 1
+
+    def test_engine_options_from_config(self, paths):
+        import web.state as state_mod
+        opts = state_mod._speedtest_options({"engine": "native", "streams": 99, "max_mb": 50})
+        assert opts["engine"] == "native"
+        assert opts["engine_options"]["streams"] == state_mod.MAX_SPEEDTEST_STREAMS
+        assert opts["engine_options"]["max_bytes"] == 50_000_000
+        assert state_mod._speedtest_options({"engine": "bogus"})["engine"] == "speedtest-cli"
+
+    def test_budget_overrides(self, paths):
+        import web.state as state_mod
+        opts = state_mod._speedtest_options({"time_budget_minutes": 5, "data_budget_mb": 0})
+        assert opts["time_budget_s"] == 300
+        assert opts["data_budget_mb"] is None
@@ -12,6 +12,7 @@ import sys
 import json
 import time
 import logging
+import tempfile
 import threading
 import zipfile
 from datetime import datetime, timezone
@@ -19,10 +20,13 @@ from pathlib import Path
 
 from flask import Flask, render_template, jsonify, request, send_from_directory
 import requests as http_requests
-import geoip2.database
 
 import web.state as state
 from web.state import Scanner
+from generate.aggregate import FIELDS as DISTRIBUTION_FIELDS, METRICS as DISTRIBUTION_METRICS, distribution, sort_groups
+from generate.ovpn_catalog import get_catalog
+from generate.report import ROW_FIELDS
+from generate import georeader, ovpn_probe, results_store
 from web.scheduler import (
     scheduler, apply_schedules, _build_cron_kwargs,
     scheduled_vpn_speedtest, scheduled_latency_scan,
@@ -141,6 +145,18 @@ def vpn_speedtest():
 
     data = request.json or {}
     selected_domains = data.get('domains', [])
+    for key, convert in (('concurrency', int), ('time_budget_minutes', float), ('data_budget_mb', float)):
+        if data.get(key) is not None:
+            try:
+                convert(data[key])
+            except (TypeError, ValueError):
+                return jsonify({"status": "error", "message": f"{key} must be a number"}), 400
+    speedtest_options = state._speedtest_options({
+        'concurrency': data.get('concurrency'),
+        'engine': data.get('engine'),
+        'time_budget_minutes': data.get('time_budget_minutes'),
+        'data_budget_mb': data.get('data_budget_mb')
+    })
 
     def run_vpn_speedtest_background():
         state.stop_event.clear()
@@ -157,11 +173,7 @@ def vpn_speedtest():
             if not os.path.exists(state.RESULTS_FILE):
                 raise FileNotFoundError("Results file not found. Please run a scan first.")
 
-            with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-                results = json.load(f)
-
-            if not isinstance(results, dict):
-                raise ValueError("Results file is in an invalid format.")
+            results = results_store.load(state.RESULTS_FILE)
 
             domains_to_test = selected_domains if selected_domains else list(results.keys())
             missing_domains = [d for d in domains_to_test if d not in results]
@@ -192,7 +204,9 @@ def vpn_speedtest():
                     interactive=False,
                     selected_domains=valid_domains,
                     stop_event=state.stop_event,
-                    results_file=state.RESULTS_FILE
+                    results_file=state.RESULTS_FILE,
+                    respect_quarantine=not selected_domains,
+                    **speedtest_options
                 ) or {}
             else:
                 raise ValueError("None of the selected domains were found in the scan results")
@@ -228,6 +242,20 @@ def vpn_speedtest():
     return jsonify({"status": "started"})
 
 
+@app.route('/api/vpn-speedtest/phases')
+def vpn_speedtest_phases():
+    """Per-phase timing percentiles over speedtest history (optional ?since=ISO&source=)."""
+    from generate.vpn_batch_helper import phase_percentiles
+    if not os.path.exists(state.RESULTS_FILE):
+        return jsonify({'status': 'ok', 'records': 0, 'phases': {}})
+    try:
+        data = results_store.snapshot(state.RESULTS_FILE)
+        stats = phase_percentiles(data, since=request.args.get('since'), source=request.args.get('source'))
+        return jsonify({'status': 'ok', **stats})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
 # ============================================================
 # Queue API
 # ============================================================
@@ -279,12 +307,14 @@ def get_results():
     if not os.path.exists(state.RESULTS_FILE):
         return jsonify({})
     try:
-        with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return jsonify(data)
+        data = results_store.snapshot(state.RESULTS_FILE)
+        return app.response_class(results_store.dumps(data), mimetype='application/json')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Result fields of the CSV export columns after 'Domain'
+CSV_EXPORT_FIELDS = ('ip', 'latency_ms', 'country', 'city', 'rx_speed_mbps', 'tx_speed_mbps')
+
 @app.route('/api/results/export/<fmt>')
 def export_results(fmt):
     """Export all results as CSV or JSON file download."""
@@ -293,14 +323,13 @@ def export_results(fmt):
     if not os.path.exists(state.RESULTS_FILE):
         return jsonify({'status': 'error', 'message': 'No results available'}), 404
     try:
-        with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = results_store.snapshot(state.RESULTS_FILE)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
     if fmt == 'json':
         resp = app.response_class(
-            json.dumps(data, indent=2, ensure_ascii=False),
+            results_store.dumps(data, indent=2, ensure_ascii=False),
             mimetype='application/json',
             headers={'Content-Disposition': 'attachment; filename=results.json'}
         )
@@ -310,18 +339,8 @@ def export_results(fmt):
     writer = csv.writer(buf)
     writer.writerow(['Domain', 'IP', 'Latency (ms)', 'Country', 'City',
                      'Download (Mbps)', 'Upload (Mbps)'])
-    for domain, entry in sorted(data.items()):
-        if not isinstance(entry, dict):
-            continue
-        writer.writerow([
-            domain,
-            entry.get('ip', ''),
-            entry.get('latency_ms', ''),
-            entry.get('country', ''),
-            entry.get('city', ''),
-            entry.get('rx_speed_mbps', ''),
-            entry.get('tx_speed_mbps', ''),
-        ])
+    for domain in sorted(data):
+        writer.writerow([domain] + data[domain].values_for(CSV_EXPORT_FIELDS))
     resp = app.response_class(
         buf.getvalue(),
         mimetype='text/csv',
@@ -336,16 +355,10 @@ def get_countries():
     if not os.path.exists(state.RESULTS_FILE):
         return jsonify([])
     try:
-        with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = results_store.snapshot(state.RESULTS_FILE)
         counts = {}
-        for domain, entry in data.items():
-            if isinstance(entry, dict):
-                country = entry.get('country', 'Unknown')
-            elif isinstance(entry, list) and len(entry) > 2:
-                country = entry[2] or 'Unknown'
-            else:
-                country = 'Unknown'
+        for entry in data.values():
+            country = entry.get('country', 'Unknown')
             counts[country] = counts.get(country, 0) + 1
         result = [{'country': c, 'count': n} for c, n in sorted(counts.items())]
         return jsonify(result)
@@ -365,10 +378,9 @@ def get_server_history(domain):
     if not os.path.exists(state.RESULTS_FILE):
         return jsonify({'status': 'ok', 'history': []})
     try:
-        with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = results_store.snapshot(state.RESULTS_FILE)
         entry = data.get(domain)
-        if not entry or not isinstance(entry, dict):
+        if not entry:
             return jsonify({'status': 'ok', 'history': []})
         return jsonify({'status': 'ok', 'history': entry.get('history', [])})
     except Exception as e:
@@ -387,14 +399,10 @@ def get_results_geo():
     if not os.path.exists(state.GEOIP_CITY):
         return jsonify({'error': 'GeoIP City database not found'}), 500
     try:
-        with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        reader = geoip2.database.Reader(state.GEOIP_CITY)
+        data = results_store.snapshot(state.RESULTS_FILE)
         results = []
-        try:
+        with georeader.lease(state.GEOIP_CITY) as reader:
             for domain, entry in data.items():
-                if not isinstance(entry, dict):
-                    continue
                 ip = entry.get('ip')
                 if not ip:
                     continue
@@ -419,8 +427,6 @@ def get_results_geo():
                     'speedtest_timestamp': entry.get('speedtest_timestamp'),
                     'speedtest_failed_timestamp': entry.get('speedtest_failed_timestamp')
                 })
-        finally:
-            reader.close()
         return jsonify(results)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -669,6 +675,9 @@ def post_config():
         theme = existing.get('theme')
         if theme:
             data['theme'] = theme
+        # The config UI doesn't edit speedtest tuning; keep what's in config.yaml
+        if 'speedtest' not in data and existing.get('speedtest'):
+            data['speedtest'] = existing['speedtest']
         state.save_config(data)
     apply_schedules()
     return jsonify({'status': 'ok'})
@@ -788,89 +797,37 @@ def get_schedule_next_runs():
 @app.route('/api/statistics')
 def get_statistics():
     """Return per-country statistics."""
-    if not os.path.exists(state.RESULTS_FILE):
-        return jsonify({'countries': [], 'top5': []})
-    try:
-        with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except Exception:
+    table = state._results_table()
+    if table is None:
         return jsonify({'countries': [], 'top5': []})
 
-    countries = {}
-    for domain, entry in data.items():
-        if not isinstance(entry, dict):
-            continue
-        country = entry.get('country', 'Unknown')
-        if country not in countries:
-            countries[country] = {
-                'country': country,
-                'servers': 0,
-                'lowest_latency': None, 'lowest_latency_server': None,
-                'highest_download': None, 'highest_download_server': None,
-                'highest_upload': None, 'highest_upload_server': None,
-                'succeeded': 0, 'failed': 0, 'untested': 0,
-                'untested_domains': [], 'failed_domains': []
-            }
-        c = countries[country]
-        c['servers'] += 1
-        lat = entry.get('latency_ms')
-        rx = entry.get('rx_speed_mbps')
-        tx = entry.get('tx_speed_mbps')
-        ts = entry.get('speedtest_timestamp')
-        fts = entry.get('speedtest_failed_timestamp')
-        if lat is not None and lat > 0:
-            if c['lowest_latency'] is None or lat < c['lowest_latency']:
-                c['lowest_latency'] = lat
-                c['lowest_latency_server'] = domain
-        has_recent_failure = fts and (not ts or fts > ts)
-        has_speed = rx is not None and rx > 0
-        if has_recent_failure:
-            c['failed'] += 1
-            c['failed_domains'].append(domain)
-        elif has_speed:
-            c['succeeded'] += 1
-            if c['highest_download'] is None or rx > c['highest_download']:
-                c['highest_download'] = rx
-                c['highest_download_server'] = domain
-        else:
-            c['untested'] += 1
-            c['untested_domains'].append(domain)
-        if tx is not None and tx > 0:
-            if c['highest_upload'] is None or tx > c['highest_upload']:
-                c['highest_upload'] = tx
-                c['highest_upload_server'] = domain
-
-    stats_list = sorted(countries.values(), key=lambda x: x['country'])
-    for s in stats_list:
-        del s['untested_domains']
-        del s['failed_domains']
+    succeeded = table.mask(include_failed=False, positive=('rx_speed_mbps',))
+    servers = table.count_per_country(table.mask())
+    not_failed = table.count_per_country(table.mask(include_failed=False))
+    failed_counts = [total - ok for total, ok in zip(servers, not_failed)]
+    succeeded_counts = table.count_per_country(succeeded)
+    countries = [{
+        'country': country,
+        'servers': servers[code],
+        'lowest_latency': None, 'lowest_latency_server': None,
+        'highest_download': None, 'highest_download_server': None,
+        'highest_upload': None, 'highest_upload_server': None,
+        'succeeded': succeeded_counts[code], 'failed': failed_counts[code],
+        'untested': servers[code] - succeeded_counts[code] - failed_counts[code],
+    } for code, country in enumerate(table.countries)]
+    for field, column, mask, highest in (
+            ('lowest_latency', 'latency_ms', table.mask(positive=('latency_ms',)), False),
+            ('highest_download', 'rx_speed_mbps', succeeded, True),
+            ('highest_upload', 'tx_speed_mbps', table.mask(positive=('tx_speed_mbps',)), True)):
+        for i in table.best_per_country(column, mask, highest=highest):
+            c = countries[table.country_codes[i]]
+            c[field] = table.records[i][column]
+            c[field + '_server'] = table.domains[i]
+    stats_list = sorted(countries, key=lambda x: x['country'])
 
     top_n = max(1, min(100, request.args.get('top', 5, type=int)))
-    best_per_country = []
-    for domain, entry in data.items():
-        if not isinstance(entry, dict):
-            continue
-        if state._is_failed_server(entry):
-            continue
-        rx = entry.get('rx_speed_mbps')
-        if rx and rx > 0:
-            best_per_country.append({
-                'domain': domain,
-                'country': entry.get('country', 'Unknown'),
-                'city': entry.get('city', 'Unknown'),
-                'rx_speed_mbps': rx,
-                'tx_speed_mbps': entry.get('tx_speed_mbps'),
-                'latency_ms': entry.get('latency_ms')
-            })
-    best_map = {}
-    for s in best_per_country:
-        c = s['country']
-        if c not in best_map or s['rx_speed_mbps'] > best_map[c]['rx_speed_mbps']:
-            best_map[c] = s
-    top_sorted = sorted(best_map.values(), key=lambda x: x['rx_speed_mbps'], reverse=True)
-    top_list = top_sorted[:top_n] if top_n < len(top_sorted) else top_sorted
-
-    return jsonify({'countries': stats_list, 'top': top_list, 'total_countries': len(best_map)})
+    best = _best_download_per_country(table, include_failed=False)
+    return jsonify({'countries': stats_list, 'top': best[:top_n], 'total_countries': len(best)})
 
 
 @app.route('/api/statistics/domains')
@@ -879,16 +836,13 @@ def get_statistics_domains():
     if not os.path.exists(state.RESULTS_FILE):
         return jsonify({'untested': [], 'failed': []})
     try:
-        with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = results_store.snapshot(state.RESULTS_FILE)
     except Exception:
         return jsonify({'untested': [], 'failed': []})
     country_filter = request.args.get('country')
     untested = []
     failed = []
     for domain, entry in data.items():
-        if not isinstance(entry, dict):
-            continue
         if country_filter and entry.get('country') != country_filter:
             continue
         rx = entry.get('rx_speed_mbps')
@@ -905,39 +859,86 @@ def get_statistics_domains():
     return jsonify({'untested': untested, 'failed': failed})
 
 
-@app.route('/api/top-servers')
-def get_top_servers():
-    """Return top N servers (best download per country)."""
+@app.route('/api/statistics/distribution')
+def get_statistics_distribution():
+    """Return count/min/median/p90/mean/stddev of latency and speeds per country or city."""
+    by = request.args.get('by', 'country')
+    if by not in ('country', 'city'):
+        return jsonify({'status': 'error', 'message': "'by' must be 'country' or 'city'"}), 400
+    sort_field = request.args.get('sort', 'latency_ms_median')
+    if sort_field not in (by, 'country') and sort_field not in DISTRIBUTION_FIELDS:
+        return jsonify({'status': 'error', 'message': f'Unknown sort field: {sort_field}'}), 400
+    order = request.args.get('order')
+    if order not in (None, 'asc', 'desc'):
+        return jsonify({'status': 'error', 'message': "'order' must be 'asc' or 'desc'"}), 400
     if not os.path.exists(state.RESULTS_FILE):
-        return jsonify([])
+        return jsonify({'by': by, 'sort': sort_field, 'groups': []})
     try:
-        with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = results_store.snapshot(state.RESULTS_FILE)
     except Exception:
+        return jsonify({'by': by, 'sort': sort_field, 'groups': []})
+    country_filter = request.args.get('country')
+    entries = [e for e in data.values() if not country_filter or e.get('country') == country_filter]
+    if by == 'city':  # Cities are grouped per country
+        keys = [(e.get('country') or 'Unknown', e.get('city') or 'Unknown') for e in entries]
+    else:
+        keys = [e.get('country') or 'Unknown' for e in entries]
+    groups = distribution(keys, {metric: [e.get(metric) for e in entries] for metric in DISTRIBUTION_METRICS},
+                          key_name=('country', 'city') if by == 'city' else 'country')
+    sort_groups(groups, sort_field, reverse=None if order is None else order == 'desc')
+    return jsonify({'by': by, 'sort': sort_field, 'groups': groups})
+
+@app.route('/api/statistics/geo')
+def get_statistics_geo():
+    """Roll-up per country, drill-down to a country's cities (?country=) or a city's servers (&city=)."""
+    country_name = request.args.get('country', '').strip()
+    city_name = request.args.get('city', '').strip()
+    if city_name and not country_name:
+        return jsonify({'status': 'error', 'message': "'city' requires 'country'"}), 400
+    index = state._results_geo_index()
+    if index is None:
+        return jsonify({'level': 'countries', 'items': []})
+    if not country_name:
+        return jsonify({'level': 'countries', 'items': sort_groups(index.countries(), 'best_latency')})
+    country = index.find_country(country_name)
+    if country is None:
+        return jsonify({'status': 'error', 'message': f'No results for country: {country_name}'}), 404
+    if not city_name:
+        return jsonify({'level': 'cities', 'country': country,
+                        'items': sort_groups(index.cities(country), 'best_latency')})
+    city = index.find_city(country, city_name)
+    if city is None:
+        return jsonify({'status': 'error', 'message': f'No results for city: {city_name}, {country}'}), 404
+    servers = sorted(index.servers(country, city), key=lambda row: row[1])
+    return jsonify({'level': 'servers', 'country': country, 'city': city,
+                    'items': [dict(zip(ROW_FIELDS, row)) for row in servers]})
+
+def _best_download_per_country(table, include_failed):
+    """Fastest-download server of each country, fastest first."""
+    best = table.best_per_country('rx_speed_mbps', table.mask(include_failed=include_failed, positive=('rx_speed_mbps',)))
+    items = []
+    for i in best:
+        entry = table.records[i]
+        items.append({
+            'domain': table.domains[i],
+            'country': entry.get('country', 'Unknown'),
+            'city': entry.get('city', 'Unknown'),
+            'rx_speed_mbps': entry['rx_speed_mbps'],
+            'tx_speed_mbps': entry.get('tx_speed_mbps'),
+            'latency_ms': entry.get('latency_ms')
+        })
+    items.sort(key=lambda x: x['rx_speed_mbps'], reverse=True)
+    return items
+
+@app.route('/api/top-servers')
+def get_top_servers():
+    """Return top N servers (best download per country)."""
+    table = state._results_table()
+    if table is None:
         return jsonify([])
     n = max(1, min(100, request.args.get('n', 5, type=int)))
     include_failed = request.args.get('include_failed', 'false').lower() in ('true', '1', 'yes')
-    best_map = {}
-    for domain, entry in data.items():
-        if not isinstance(entry, dict):
-            continue
-        if not include_failed and state._is_failed_server(entry):
-            continue
-        rx = entry.get('rx_speed_mbps')
-        if rx and rx > 0:
-            c = entry.get('country', 'Unknown')
-            if c not in best_map or rx > best_map[c]['rx_speed_mbps']:
-                best_map[c] = {
-                    'domain': domain,
-                    'country': c,
-                    'city': entry.get('city', 'Unknown'),
-                    'rx_speed_mbps': rx,
-                    'tx_speed_mbps': entry.get('tx_speed_mbps'),
-                    'latency_ms': entry.get('latency_ms')
-                }
-    top_sorted = sorted(best_map.values(), key=lambda x: x['rx_speed_mbps'], reverse=True)
-    result = top_sorted[:n] if n < len(top_sorted) else top_sorted
-    return jsonify(result)
+    return jsonify(_best_download_per_country(table, include_failed)[:n])
 
 
 # ============================================================
@@ -961,57 +962,53 @@ def prune_stale():
 
 @app.route('/api/geolite/status')
 def geolite_status():
-    """Check local GeoLite2 file dates and latest available release."""
-    city_path = Path(state.GEOIP_CITY)
-    country_path = Path(state.GEOIP_COUNTRY)
-
-    local_city_mtime = None
-    local_country_mtime = None
-    if city_path.exists():
-        local_city_mtime = datetime.fromtimestamp(city_path.stat().st_mtime, tz=timezone.utc).isoformat()
-    if country_path.exists():
-        local_country_mtime = datetime.fromtimestamp(country_path.stat().st_mtime, tz=timezone.utc).isoformat()
-
-    latest_release_date = None
-    latest_tag = None
-    update_available = False
-    try:
-        resp = http_requests.get(state.GEOLITE_RELEASE_URL, timeout=10)
-        resp.raise_for_status()
-        release = resp.json()
-        latest_tag = release.get('tag_name', '')
-        latest_release_date = release.get('published_at', '')
-        if local_city_mtime and latest_release_date:
-            local_dt = city_path.stat().st_mtime
-            release_dt = datetime.fromisoformat(latest_release_date.replace('Z', '+00:00')).timestamp()
-            update_available = release_dt > local_dt
-        elif not local_city_mtime:
-            update_available = True
-    except Exception:
-        pass
-
-    return jsonify({
-        'city_last_modified': local_city_mtime,
-        'country_last_modified': local_country_mtime,
-        'latest_release_tag': latest_tag,
-        'latest_release_date': latest_release_date,
-        'update_available': update_available
-    })
+    """Check local GeoLite2 file dates and latest available release (cached, ?refresh=1 to re-check)."""
+    refresh = request.args.get('refresh', 'false').lower() in ('true', '1', 'yes')
+    return jsonify(state._geolite_status(refresh=refresh))
 
 @app.route('/api/geolite/update', methods=['POST'])
 def geolite_update():
-    """Download latest GeoLite2 databases from GitHub releases."""
+    """Download GeoLite2 databases that changed in the latest GitHub release."""
     try:
-        downloaded = state._do_geolite_update()
-        if not downloaded:
+        result = state._do_geolite_update()
+        if not result['updated'] and not result['unchanged']:
             return jsonify({'status': 'error', 'message': 'No matching assets found in release'}), 404
-        state.send_ntfy('geolite_updated', 'GeoLite2 Updated', f'Updated: {", ".join(downloaded)}')
-        return jsonify({'status': 'ok', 'updated': downloaded})
+        if result['updated']:
+            state.send_ntfy('geolite_updated', 'GeoLite2 Updated', f'Updated: {", ".join(result["updated"])}')
+            result['regeolocated'] = _regeolocate_summary()
+        return jsonify({'status': 'ok', **result})
     except Exception as e:
         logging.error(f'GeoLite2 update failed: {e}')
         state.send_ntfy('geolite_update_error', 'GeoLite2 Update Failed', str(e), priority='high')
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def _regeolocate_summary():
+    try:
+        summary = state._regeolocate_results()
+    except Exception as e:
+        logging.error(f'Re-geolocation failed: {e}')
+        return None
+    if not summary or summary.get('queued'):
+        return summary
+    return {'checked': summary['checked'], 'changed': len(summary['changed'])}
+
+@app.route('/api/geolite/regeolocate', methods=['POST'])
+def geolite_regeolocate():
+    """Re-resolve country/city of stored results from the current databases (no probing).
+
+    While a scan is running the job is queued to run after it (202).
+    """
+    try:
+        summary = state._regeolocate_results()
+    except Exception as e:
+        logging.error(f'Re-geolocation failed: {e}')
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    if summary is None:
+        return jsonify({'status': 'error', 'message': 'Results file or GeoIP databases not found'}), 404
+    if summary.get('queued'):
+        return jsonify({'status': 'queued', 'message': 'Scan in progress, re-geolocation will run after it'}), 202
+    return jsonify({'status': 'ok', **summary})
+
 @app.route('/api/servers', methods=['GET'])
 def get_servers():
     """Return the current servers.list content."""
@@ -1034,19 +1031,37 @@ def save_servers():
     logging.info(f'servers.list updated: {len(lines)} entries')
     return jsonify({'status': 'ok', 'count': len(lines)})
 
+@app.route('/api/servers/changes')
+def get_servers_changes():
+    """Return the added/removed changeset of the last servers update run."""
+    changeset = state._load_servers_changeset()
+    if changeset is None:
+        return jsonify({'status': 'error', 'message': 'No servers update has run yet'}), 404
+    return jsonify(changeset)
+
+@app.route('/api/servers/failed', methods=['GET'])
+def get_failed_servers():
+    """Return servers in the scan negative cache with their failure counts and re-check times."""
+    entries = state._negative_cache().status()
+    return jsonify({'count': len(entries), 'suppressed': sum(e['suppressed'] for e in entries), 'servers': entries})
+
+@app.route('/api/servers/failed', methods=['DELETE'])
+def clear_failed_servers():
+    """Forget cached failures (all, or the JSON 'domains' list) so the next scan re-checks them."""
+    domains = (request.get_json(silent=True) or {}).get('domains')
+    if domains is not None and not isinstance(domains, list):
+        return jsonify({'status': 'error', 'message': "'domains' must be a list"}), 400
+    removed = state._negative_cache().clear(domains)
+    return jsonify({'status': 'ok', 'removed': removed})
+
 @app.route('/api/ovpn/status')
 def ovpn_status():
     """Return ovpn folder stats: file count and newest file mtime."""
-    ovpn_path = Path(state.VPN_OVPN_DIR)
-    if not ovpn_path.is_dir():
-        return jsonify({'count': 0, 'last_updated': None})
-    files = list(ovpn_path.glob('*.ovpn'))
-    count = len(files)
+    stats = get_catalog(state.VPN_OVPN_DIR).status()
     newest = None
-    if files:
-        newest_mtime = max(f.stat().st_mtime for f in files)
-        newest = datetime.fromtimestamp(newest_mtime, tz=timezone.utc).isoformat()
-    return jsonify({'count': count, 'last_updated': newest})
+    if stats['newest_mtime'] is not None:
+        newest = datetime.fromtimestamp(stats['newest_mtime'], tz=timezone.utc).isoformat()
+    return jsonify({'count': stats['count'], 'last_updated': newest})
 
 @app.route('/api/ovpn/upload', methods=['POST'])
 def ovpn_upload():
@@ -1057,35 +1072,22 @@ def ovpn_upload():
     if not uploaded.filename.lower().endswith('.zip'):
         return jsonify({'status': 'error', 'message': 'File must be a .zip'}), 400
 
+    fd, tmp_path = tempfile.mkstemp(suffix='.zip', prefix='ovpn_')
+    os.close(fd)
     try:
-        zip_bytes = uploaded.read()
-        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
-            for name in zf.namelist():
-                if os.path.isabs(name) or '..' in name:
-                    return jsonify({'status': 'error', 'message': f'Invalid path in zip: {name}'}), 400
-
-            ovpn_path = Path(state.VPN_OVPN_DIR)
-            ovpn_path.mkdir(parents=True, exist_ok=True)
-
-            for old in ovpn_path.glob('*.ovpn'):
-                old.unlink(missing_ok=True)
-
-            extracted = 0
-            for name in zf.namelist():
-                basename = os.path.basename(name)
-                if basename.lower().endswith('.ovpn') and 'udp' in basename.lower():
-                    target = ovpn_path / basename
-                    target.write_bytes(zf.read(name))
-                    extracted += 1
-
-        logging.info(f'OVPN configs updated: {extracted} UDP files extracted')
-        state.send_ntfy('ovpn_updated', 'OVPN Configs Updated', f'{extracted} UDP configs extracted')
-        return jsonify({'status': 'ok', 'count': extracted})
+        uploaded.save(tmp_path)
+        changes = state._apply_ovpn_zip(tmp_path)
+        state.send_ntfy('ovpn_updated', 'OVPN Configs Updated', state._format_ovpn_changes(changes))
+        return jsonify({'status': 'ok', **changes})
     except zipfile.BadZipFile:
         return jsonify({'status': 'error', 'message': 'Invalid ZIP file'}), 400
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         logging.error(f'OVPN upload failed: {e}')
         return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        os.unlink(tmp_path)
 
 @app.route('/api/ovpn/download', methods=['POST'])
 def ovpn_download():
@@ -1098,9 +1100,9 @@ def ovpn_download():
     if not url:
         return jsonify({'status': 'error', 'message': 'No download URL configured'}), 400
     try:
-        count = state._download_ovpn_from_url(url)
-        state.send_ntfy('ovpn_updated', 'OVPN Configs Updated', f'{count} UDP configs extracted')
-        return jsonify({'status': 'ok', 'count': count})
+        changes = state._download_ovpn_from_url(url)
+        state.send_ntfy('ovpn_updated', 'OVPN Configs Updated', state._format_ovpn_changes(changes))
+        return jsonify({'status': 'ok', **changes})
     except Exception as e:
         logging.error(f'OVPN download failed: {e}')
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1112,105 +1114,119 @@ def ovpn_download():
 
 @app.route('/api/ovpn/config/<domain>')
 def get_ovpn_config(domain):
-    """Return the OVPN config text for a given domain."""
+    """Return the OVPN config text for a given domain, plus its parsed catalog entry."""
     if not all(c.isalnum() or c in '.-' for c in domain):
         return jsonify({'status': 'error', 'message': 'Invalid domain'}), 400
-    ovpn_path = Path(state.VPN_OVPN_DIR)
-    for pattern in [f'{domain}.udp.ovpn', f'{domain}.tcp.ovpn', f'{domain}.ovpn']:
-        candidate = ovpn_path / pattern
-        if candidate.exists():
-            return jsonify({'status': 'ok', 'filename': candidate.name,
-                            'content': candidate.read_text(encoding='utf-8', errors='replace')})
+    catalog = get_catalog(state.VPN_OVPN_DIR)
+    record = catalog.get(domain)
+    if record:
+        try:
+            content = Path(catalog.path_for(domain)).read_text(encoding='utf-8', errors='replace')
+        except FileNotFoundError:
+            record = None
+        else:
+            meta = {k: record[k] for k in ('proto', 'remote', 'port', 'remotes', 'cipher', 'auth',
+                                           'tls_auth', 'tls_crypt', 'sha256')}
+            return jsonify({'status': 'ok', 'filename': record['file'], 'content': content, 'meta': meta})
     return jsonify({'status': 'error', 'message': f'No OVPN config found for {domain}'}), 404
 
 
+@app.route('/api/ovpn/probe', methods=['POST'])
+def probe_ovpn_endpoints():
+    """Start timing one OpenVPN control-channel reset per endpoint; handshake_rtt_ms is stored in the results."""
+    if state._is_scan_active():
+        return jsonify({'status': 'error', 'message': 'Scan already in progress'}), 409
+    if not os.path.exists(state.RESULTS_FILE):
+        return jsonify({'status': 'error', 'message': 'Results file not found. Please run a scan first.'}), 404
+    data = request.json or {}
+    domains = data.get('domains')
+    if domains is not None and (not isinstance(domains, list) or not all(isinstance(d, str) for d in domains)):
+        return jsonify({'status': 'error', 'message': 'domains must be a list of server names'}), 400
+    try:
+        timeout = min(10.0, max(0.1, float(data.get('timeout') or ovpn_probe.DEFAULT_TIMEOUT)))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'timeout must be a number'}), 400
+
+    results = results_store.snapshot(state.RESULTS_FILE)
+    configs = get_catalog(state.VPN_OVPN_DIR).domain_files()
+    targets = {d: configs[d] for d in (domains or results) if d in configs and d in results}
+    if not targets:
+        return jsonify({'status': 'error', 'message': 'No OVPN configs found for the selected servers'}), 400
+
+    thread = threading.Thread(target=state._run_ovpn_probe_sync, args=(targets, timeout))
+    thread.daemon = True
+    thread.start()
+    return jsonify({'status': 'started', 'targets': len(targets)})
+
+
 # ============================================================
 # Top Results API (programmatic)
 # ============================================================
 
+def _top_rows(column, descending, present=(), missing=0.0):
+    """(results table, row numbers ranked by *column*) filtered by the request's
+    countries/include_failed arguments; (None, []) if there are no results."""
+    table = state._results_table()
+    if table is None:
+        return None, []
+    countries = state._parse_countries(request.args)
+    include_failed = request.args.get('include_failed', 'false').lower() in ('true', '1', 'yes')
+    mask = table.mask(countries=countries or None, include_failed=include_failed, present=present)
+    return table, table.order(column, mask, descending=descending, missing=missing)
+
 @app.route('/api/v1/top/latency')
 def top_latency():
     n = request.args.get('n', 5, type=int)
-    countries = state._parse_countries(request.args)
-    include_failed = request.args.get('include_failed', 'false').lower() in ('true', '1', 'yes')
-    if not os.path.exists(state.RESULTS_FILE):
-        return jsonify([])
-    with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    table, rows = _top_rows('latency_ms', descending=False, missing=9999)
     items = []
-    for domain, entry in data.items():
-        if isinstance(entry, dict):
-            if not include_failed and state._is_failed_server(entry):
-                continue
-            if countries and entry.get('country', '').lower() not in countries:
-                continue
-            items.append({
-                'domain': domain,
-                'latency_ms': entry.get('latency_ms', 9999),
-                'ip': entry.get('ip', ''),
-                'country': entry.get('country', ''),
-                'city': entry.get('city', ''),
-                'rx_speed_mbps': entry.get('rx_speed_mbps'),
-                'tx_speed_mbps': entry.get('tx_speed_mbps')
-            })
-    items.sort(key=lambda x: x['latency_ms'])
-    return jsonify(items[:n])
+    for i in rows[:n]:
+        entry = table.records[i]
+        items.append({
+            'domain': table.domains[i],
+            'latency_ms': entry.get('latency_ms', 9999),
+            'ip': entry.get('ip', ''),
+            'country': entry.get('country', ''),
+            'city': entry.get('city', ''),
+            'rx_speed_mbps': entry.get('rx_speed_mbps'),
+            'tx_speed_mbps': entry.get('tx_speed_mbps')
+        })
+    return jsonify(items)
 
 @app.route('/api/v1/top/download')
 def top_download():
     n = request.args.get('n', 5, type=int)
-    countries = state._parse_countries(request.args)
-    include_failed = request.args.get('include_failed', 'false').lower() in ('true', '1', 'yes')
-    if not os.path.exists(state.RESULTS_FILE):
-        return jsonify([])
-    with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    table, rows = _top_rows('rx_speed_mbps', descending=True, present=('rx_speed_mbps',))
     items = []
-    for domain, entry in data.items():
-        if isinstance(entry, dict) and entry.get('rx_speed_mbps') is not None:
-            if not include_failed and state._is_failed_server(entry):
-                continue
-            if countries and entry.get('country', '').lower() not in countries:
-                continue
-            items.append({
-                'domain': domain,
-                'rx_speed_mbps': entry.get('rx_speed_mbps', 0),
-                'tx_speed_mbps': entry.get('tx_speed_mbps', 0),
-                'latency_ms': entry.get('latency_ms', 0),
-                'ip': entry.get('ip', ''),
-                'country': entry.get('country', ''),
-                'city': entry.get('city', '')
-            })
-    items.sort(key=lambda x: x['rx_speed_mbps'], reverse=True)
-    return jsonify(items[:n])
+    for i in rows[:n]:
+        entry = table.records[i]
+        items.append({
+            'domain': table.domains[i],
+            'rx_speed_mbps': entry.get('rx_speed_mbps', 0),
+            'tx_speed_mbps': entry.get('tx_speed_mbps', 0),
+            'latency_ms': entry.get('latency_ms', 0),
+            'ip': entry.get('ip', ''),
+            'country': entry.get('country', ''),
+            'city': entry.get('city', '')
+        })
+    return jsonify(items)
 
 @app.route('/api/v1/top/upload')
 def top_upload():
     n = request.args.get('n', 5, type=int)
-    countries = state._parse_countries(request.args)
-    include_failed = request.args.get('include_failed', 'false').lower() in ('true', '1', 'yes')
-    if not os.path.exists(state.RESULTS_FILE):
-        return jsonify([])
-    with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    table, rows = _top_rows('tx_speed_mbps', descending=True, present=('tx_speed_mbps',))
     items = []
-    for domain, entry in data.items():
-        if isinstance(entry, dict) and entry.get('tx_speed_mbps') is not None:
-            if not include_failed and state._is_failed_server(entry):
-                continue
-            if countries and entry.get('country', '').lower() not in countries:
-                continue
-            items.append({
-                'domain': domain,
-                'tx_speed_mbps': entry.get('tx_speed_mbps', 0),
-                'rx_speed_mbps': entry.get('rx_speed_mbps', 0),
-                'latency_ms': entry.get('latency_ms', 0),
-                'ip': entry.get('ip', ''),
-                'country': entry.get('country', ''),
-                'city': entry.get('city', '')
-            })
-    items.sort(key=lambda x: x['tx_speed_mbps'], reverse=True)
-    return jsonify(items[:n])
+    for i in rows[:n]:
+        entry = table.records[i]
+        items.append({
+            'domain': table.domains[i],
+            'tx_speed_mbps': entry.get('tx_speed_mbps', 0),
+            'rx_speed_mbps': entry.get('rx_speed_mbps', 0),
+            'latency_ms': entry.get('latency_ms', 0),
+            'ip': entry.get('ip', ''),
+            'country': entry.get('country', ''),
+            'city': entry.get('city', '')
+        })
+    return jsonify(items)
 
 
 # ============================================================
@@ -6,7 +6,6 @@ the same globals.
 """
 
 import os
-import json
 import time
 import logging
 import threading
@@ -15,6 +14,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 import web.state as state
+from generate import results_store
 from web.state import Scanner
 
 # ============================================================
@@ -36,9 +36,8 @@ def _resolve_scheduled_domains():
                         'No results.json found. Run a scan first.', priority='high')
         return None, None
     try:
-        with open(state.RESULTS_FILE, 'r', encoding='utf-8') as f:
-            results = json.load(f)
-        all_domains = list(results.keys()) if isinstance(results, dict) else []
+        results = results_store.load(state.RESULTS_FILE)
+        all_domains = list(results.keys())
         if not all_domains:
             logging.error("Scheduled VPN speedtest skipped: no domains in results")
             return None, None
@@ -46,7 +45,7 @@ def _resolve_scheduled_domains():
         vpn_countries = config.get('schedule', {}).get('vpn_speedtest', {}).get('countries', [])
         if vpn_countries:
             country_set = {c.casefold() for c in vpn_countries}
-            all_domains = [d for d in all_domains if isinstance(results.get(d), dict) and results[d].get('country', '').casefold() in country_set]
+            all_domains = [d for d in all_domains if results[d].get('country', '').casefold() in country_set]
             if not all_domains:
                 logging.error("Scheduled VPN speedtest skipped: no servers match selected countries")
                 return None, None
@@ -87,14 +86,21 @@ def scheduled_vpn_speedtest():
             results_json=state.RESULTS_FILE,
             excl_countries_fle='exclude_countries.list'
         )
+        vpn_cfg = state.load_config().get('schedule', {}).get('vpn_speedtest', {})
         report = scanner._perform_vpn_speedtests(
             results, state.VPN_OVPN_DIR, state.VPN_USERNAME, state.VPN_PASSWORD,
             state.scan_progress, batch_size=999, interactive=False,
             selected_domains=all_domains, stop_event=state.stop_event,
-            results_file=state.RESULTS_FILE, source='scheduled'
+            results_file=state.RESULTS_FILE, source='scheduled',
+            **state._speedtest_options({
+                'time_budget_minutes': vpn_cfg.get('time_budget_minutes'),
+                'data_budget_mb': vpn_cfg.get('data_budget_mb')
+            })
         ) or {}
         duration = state._format_duration(time.time() - vpn_start_time)
         report_msg = f"{report.get('succeeded', 0)} succeeded, {report.get('vpn_failed', 0)} VPN failed, {report.get('speedtest_failed', 0)} speedtest failed"
+        if report.get('budget', {}).get('exhausted'):
+            report_msg += f" — {report['budget']['exhausted']} budget reached after {report.get('tested', 0)}/{report.get('total', 0)} servers"
         if state.stop_event.is_set():
             state.scan_progress['status'] = 'completed'
             state.scan_progress['message'] = f'Scheduled VPN speedtest interrupted — {report_msg}'
@@ -128,11 +134,8 @@ def scheduled_latency_scan():
             raise FileNotFoundError(f"GeoIP databases not found at {state.GEOIP_CITY} or {state.GEOIP_COUNTRY}")
 
         config = state.load_config()
-        lat_cfg = config.get('schedule', {}).get('latency_scan', {})
-        lat_countries = lat_cfg.get('countries', [])
-        pings_num = max(1, min(10, int(lat_cfg.get('pings', 1))))
-        timeout_ms = max(100, min(10000, int(lat_cfg.get('timeout', 1000))))
-        workers = max(1, min(100, int(lat_cfg.get('workers', 20))))
+        lat_countries = config.get('schedule', {}).get('latency_scan', {}).get('countries', [])
+        pings_num, timeout_ms, workers = state._latency_scan_options(config)
 
         servers_file, is_temp = state._filtered_servers_file(lat_countries)
         scanner = Scanner(
@@ -140,7 +143,8 @@ def scheduled_latency_scan():
             city_db=state.GEOIP_CITY,
             country_db=state.GEOIP_COUNTRY,
             results_json=state.RESULTS_FILE,
-            excl_countries_fle='exclude_countries.list'
+            excl_countries_fle='exclude_countries.list',
+            negative_cache=state._negative_cache(config)
         )
 
         state.stop_event.clear()
@@ -162,17 +166,8 @@ def scheduled_latency_scan():
             vpn_speedtest=False,
             stop_event=state.stop_event
         )
-        if failed_domains and not is_temp:
-            try:
-                with open(state.SERVERS_FILE, 'r', encoding='utf-8') as f:
-                    lines = [l.strip() for l in f if l.strip()]
-                cleaned = [d for d in lines if d not in failed_domains]
-                if cleaned:
-                    with open(state.SERVERS_FILE, 'w', encoding='utf-8') as f:
-                        f.write('\n'.join(cleaned) + '\n')
-                    state.scan_logger.info(f'Removed {len(failed_domains)} failed servers from servers.list')
-            except Exception as e:
-                logging.error(f"Failed to clean servers.list: {e}")
+        if failed_domains:
+            state.scan_logger.info(f'{len(failed_domains)} servers failed and are backed off from future scans')
         duration = state._format_duration(time.time() - state.scan_start_time)
         total = state.scan_progress.get('total', 0)
         if state.stop_event.is_set():
@@ -204,9 +199,13 @@ def scheduled_latency_scan():
 
 def scheduled_geolite_update():
     try:
-        downloaded = state._do_geolite_update()
-        if downloaded:
-            state.send_ntfy('geolite_updated', 'GeoLite2 Updated', f'Updated: {", ".join(downloaded)}')
+        result = state._do_geolite_update()
+        if result['updated']:
+            state.send_ntfy('geolite_updated', 'GeoLite2 Updated', f'Updated: {", ".join(result["updated"])}')
+            try:
+                state._regeolocate_results()
+            except Exception as e:
+                logging.error(f'Re-geolocation after GeoLite2 update failed: {e}')
     except Exception as e:
         logging.error(f'Scheduled GeoLite2 update failed: {e}')
         state.send_ntfy('geolite_update_error', 'GeoLite2 Update Failed', str(e), priority='high')
@@ -221,8 +220,8 @@ def scheduled_ovpn_update():
         logging.info("Scheduled OVPN update skipped: no download URL configured")
         return
     try:
-        count = state._download_ovpn_from_url(url)
-        state.send_ntfy('ovpn_updated', 'OVPN Configs Updated', f'{count} UDP configs extracted')
+        changes = state._download_ovpn_from_url(url)
+        state.send_ntfy('ovpn_updated', 'OVPN Configs Updated', state._format_ovpn_changes(changes))
     except Exception as e:
         logging.error(f'Scheduled OVPN update failed: {e}')
         state.send_ntfy('ovpn_update_error', 'OVPN Update Failed', str(e), priority='high')
@@ -237,9 +236,17 @@ def scheduled_servers_update():
         logging.info("Scheduled servers update skipped: no commands configured")
         return
     try:
-        count = state._run_servers_update_commands(commands)
-        state.send_ntfy('servers_updated', 'Servers List Updated', f'{count} servers loaded')
-        if config.get('schedule', {}).get('servers_update', {}).get('prune_stale'):
+        changes = state._run_servers_update_commands(commands)
+        state.send_ntfy('servers_updated', 'Servers List Updated',
+                        f"{changes['count']} servers loaded ({len(changes['added'])} added, {len(changes['removed'])} removed)")
+        srv_cfg = config.get('schedule', {}).get('servers_update', {})
+        if changes['added'] and srv_cfg.get('scan_new', True):
+            speedtest_new = bool(srv_cfg.get('speedtest_new'))
+            state._queue_add_job(changes['added'], 'latency_scan', 'New servers', {'vpn_speedtest': speedtest_new})
+            state._ensure_queue_processor()
+            logging.info(f"Queued latency scan{' and speedtest' if speedtest_new else ''} "
+                         f"of {len(changes['added'])} new servers")
+        if srv_cfg.get('prune_stale'):
             try:
                 pruned, remaining = state._prune_stale_results()
                 if pruned:
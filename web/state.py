@@ -15,22 +15,30 @@ import json
 import logging
 import logging.handlers
 import subprocess
-import zipfile
-import io
 import copy
+import hashlib
 import tempfile
 import re as _re
+import signal
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 
 import requests as http_requests
 import yaml
-import geoip2.database
 
 # Add parent directory to sys.path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from generate.scan import Scanner
+from generate import georeader, ovpn_probe
+from generate.ovpn_catalog import apply_zip
+from generate.regeo import regeolocate
+from generate.negcache import NegativeCache
+from generate.columnar import ResultsTable, recently_failed
+from generate.geoindex import GeoIndex
+from generate.report import Analyze
+from generate import results_store
 
 # ============================================================
 # Logging
@@ -122,7 +130,9 @@ DEFAULT_CONFIG = {
             'days': [],
             'dom': 1,
             'time': '03:00',
-            'countries': []
+            'countries': [],
+            'time_budget_minutes': 0,
+            'data_budget_mb': 0
         },
         'latency_scan': {
             'enabled': False,
@@ -134,7 +144,8 @@ DEFAULT_CONFIG = {
             'pings': 1,
             'timeout': 1000,
             'workers': 20,
-            'countries': []
+            'countries': [],
+            'failure_backoff_hours': 1  # Failed servers are re-checked after 1h, 2h, 4h... (max 7 days)
         },
         'geolite_update': {
             'enabled': False,
@@ -161,9 +172,24 @@ DEFAULT_CONFIG = {
             'dom': 1,
             'time': '06:00',
             'commands': [],
-            'prune_stale': False
+            'prune_stale': False,
+            'scan_new': True,       # Queue a latency scan of newly added servers
+            'speedtest_new': False  # ...followed by a VPN speedtest of them
         }
     },
+    'speedtest': {
+        'concurrency': 1,
+        'engine': 'speedtest-cli',
+        'target': 'cloudflare',
+        'streams': 4,
+        'duration': 10,
+        'min_duration': 2,
+        'cv_threshold': 0.1,
+        'max_mb': 0,
+        'retries': 2,
+        'retry_backoff_s': 2,
+        'quarantine_hours': 6
+    },
     'notifications': {
         'ntfy': {
             'enabled': False,
@@ -257,6 +283,43 @@ def _format_duration(seconds):
 
 _config_lock = threading.Lock()
 
+MAX_SPEEDTEST_CONCURRENCY = 32
+MAX_SPEEDTEST_STREAMS = 16
+MAX_SPEEDTEST_DURATION = 60
+
+def _speedtest_options(overrides=None):
+    """Build speedtest kwargs for _perform_vpn_speedtests from config plus per-request overrides."""
+    cfg = dict(load_config().get('speedtest', {}))
+    for key, val in (overrides or {}).items():
+        if val is not None:
+            cfg[key] = val
+    engine = cfg.get('engine', 'speedtest-cli')
+    if engine not in ('speedtest-cli', 'native'):
+        engine = 'speedtest-cli'
+    max_mb = float(cfg.get('max_mb') or 0)
+    # Per-run budgets (0 = unlimited); not part of the speedtest config section
+    time_budget = float((overrides or {}).get('time_budget_minutes') or 0)
+    data_budget = float((overrides or {}).get('data_budget_mb') or 0)
+    return {
+        'concurrency': max(1, min(MAX_SPEEDTEST_CONCURRENCY, int(cfg.get('concurrency', 1)))),
+        'engine': engine,
+        'engine_options': {
+            'target': str(cfg.get('target') or 'cloudflare'),
+            'streams': max(1, min(MAX_SPEEDTEST_STREAMS, int(cfg.get('streams', 4)))),
+            'duration': max(1, min(MAX_SPEEDTEST_DURATION, float(cfg.get('duration', 10)))),
+            'min_duration': max(0, float(cfg.get('min_duration', 2))),
+            'cv_threshold': max(0, float(cfg.get('cv_threshold', 0.1))),
+            'max_bytes': int(max_mb * 1_000_000) if max_mb > 0 else None
+        },
+        'time_budget_s': time_budget * 60 if time_budget > 0 else None,
+        'data_budget_mb': data_budget if data_budget > 0 else None,
+        'retry_options': {
+            'max_retries': max(0, min(5, int(cfg.get('retries', 2)))),
+            'backoff_s': max(0, float(cfg.get('retry_backoff_s', 2))),
+            'quarantine_hours': max(0, float(cfg.get('quarantine_hours', 6)))
+        }
+    }
+
 def _update_last_run(schedule_key):
     """Update last_run timestamp for a schedule."""
     with _config_lock:
@@ -301,6 +364,8 @@ _queue_processor_lock = threading.Lock()
 # File-based state sharing for multi-worker gunicorn
 SCAN_STATE_FILE = os.path.join(tempfile.gettempdir(), 'geo_ip_scan_state.json')
 QUEUE_STATE_FILE = os.path.join(tempfile.gettempdir(), 'geo_ip_queue_state.json')
+# Queue job type that re-geolocates stored results after the running scan
+REGEOLOCATE_JOB = 'regeolocate'
 
 STALE_HEARTBEAT_SECONDS = 30
 
@@ -389,11 +454,19 @@ def _write_queue_file(st):
     except Exception:
         pass
 
-def _queue_add_job(domains, job_type, label):
-    """Append a job to the file-based queue (safe across workers)."""
+def _queue_add_job(domains, job_type, label, options=None):
+    """Append a job to the file-based queue (safe across workers).
+
+    Jobs of type 'latency_scan' scan their domains, REGEOLOCATE_JOB refreshes
+    stored locations; any other type is a VPN speedtest. *options* are passed
+    to the job runner.
+    """
     with _queue_file_lock:
         st = _read_queue_file()
-        st.setdefault("pending", []).append({"domains": domains, "type": job_type, "label": label})
+        job = {"domains": domains, "type": job_type, "label": label}
+        if options:
+            job["options"] = options
+        st.setdefault("pending", []).append(job)
         _write_queue_file(st)
         return len(st["pending"])
 
@@ -459,7 +532,12 @@ def _queue_processor_loop():
             logging.info("Queue: dispatching %d domains (%s)", len(job['domains']), job.get('label', ''))
             scan_logger.info('Queue dispatching %d domains (%s)', len(job['domains']), job.get('label', ''))
             try:
-                _run_vpn_speedtest_sync(job['domains'])
+                if job.get('type') == 'latency_scan':
+                    _run_queued_latency_scan(job['domains'], **job.get('options', {}))
+                elif job.get('type') == REGEOLOCATE_JOB:
+                    _regeolocate_results()
+                else:
+                    _run_vpn_speedtest_sync(job['domains'])
             except Exception as e:
                 logging.error("Queue job failed: %s", e)
                 scan_logger.error('Queue job failed: %s', e)
@@ -489,11 +567,7 @@ def _run_vpn_speedtest_sync(domains):
         if not os.path.exists(RESULTS_FILE):
             raise FileNotFoundError("Results file not found. Please run a scan first.")
 
-        with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
-            results = json.load(f)
-
-        if not isinstance(results, dict):
-            raise ValueError("Results file is in an invalid format.")
+        results = results_store.load(RESULTS_FILE)
 
         valid_domains = [d for d in domains if d in results]
         if not valid_domains:
@@ -520,7 +594,9 @@ def _run_vpn_speedtest_sync(domains):
             interactive=False,
             selected_domains=valid_domains,
             stop_event=stop_event,
-            results_file=RESULTS_FILE
+            results_file=RESULTS_FILE,
+            respect_quarantine=False,  # Queued domains were picked explicitly
+            **_speedtest_options()
         ) or {}
 
         duration = _format_duration(time.time() - vpn_start_time)
@@ -547,10 +623,82 @@ def _run_vpn_speedtest_sync(domains):
         _flush_scan_state()
         _update_last_run('vpn_speedtest')
 
+def _run_queued_latency_scan(domains, vpn_speedtest=False):
+    """Latency-scan only *domains* (blocking), with the scheduled scan's settings. Used by queue processor."""
+    pings, timeout, workers = _latency_scan_options(load_config())
+    scan_logger.info('Latency scan (queued) started: %d domains, vpn=%s', len(domains), vpn_speedtest)
+    run_scan_in_background(pings, timeout, workers, vpn_speedtest=vpn_speedtest, domains=domains)
+
+def _run_ovpn_probe_sync(targets, timeout):
+    """Handshake-probe *targets* ({domain: config path}) and store the results (blocking).
+
+    Holds scan_active like a scan, so no scan or speedtest starts meanwhile;
+    results are re-read just before saving so other changes are kept.
+    """
+    global scan_active, scan_progress, last_error, scan_start_time
+    stop_event.clear()
+    scan_active = True
+    scan_start_time = time.time()
+    scan_progress = {"done": 0, "total": len(targets), "status": "running",
+                     "message": f"Probing {len(targets)} OpenVPN endpoints..."}
+    last_error = None
+    _flush_scan_state()
+
+    flusher = threading.Thread(target=_state_flusher, daemon=True)
+    flusher.start()
+
+    try:
+        probes = ovpn_probe.probe_many(targets, timeout=timeout, stop_event=stop_event)
+        now_iso = datetime.now(timezone.utc).isoformat()
+        results = results_store.load(RESULTS_FILE)
+        for domain, probe in probes.items():
+            entry = results.get(domain)
+            if entry is None:  # Pruned while probing
+                continue
+            entry['handshake_rtt_ms'] = probe['rtt_ms']
+            entry['handshake_status'] = probe['status']
+            entry['handshake_probe_timestamp'] = now_iso
+        results_store.save(RESULTS_FILE, results)
+
+        reachable = sum(1 for p in probes.values() if p['status'] == ovpn_probe.OK)
+        scan_progress['done'] = len(probes)
+        scan_progress['status'] = 'completed'
+        scan_progress['message'] = f'Handshake probe completed — {reachable}/{len(probes)} endpoints answered'
+        logging.info(f'OVPN handshake probe: {reachable}/{len(probes)} endpoints answered')
+    except Exception as e:
+        scan_progress['status'] = 'error'
+        scan_progress['message'] = str(e)
+        last_error = str(e)
+        logging.error("OVPN handshake probe error: %s", e)
+    finally:
+        scan_active = False
+        _flush_scan_state()
+
 # ============================================================
 # Background scan / VPN helpers
 # ============================================================
 
+def _latency_scan_options(config):
+    """(pings, timeout_ms, workers) from the latency_scan schedule, clamped."""
+    lat_cfg = config.get('schedule', {}).get('latency_scan', {})
+    pings_num = max(1, min(10, int(lat_cfg.get('pings', 1))))
+    timeout_ms = max(100, min(10000, int(lat_cfg.get('timeout', 1000))))
+    workers = max(1, min(100, int(lat_cfg.get('workers', 20))))
+    return pings_num, timeout_ms, workers
+
+def _negative_cache(config=None):
+    """Negative cache of servers that failed to scan, stored next to servers.list."""
+    config = config if config is not None else load_config()
+    hours = config.get('schedule', {}).get('latency_scan', {}).get('failure_backoff_hours', 1)
+    return NegativeCache(SERVERS_FILE + '.failed.json', backoff_hours=max(0, float(hours)))
+
+def _domains_servers_file(domains):
+    """Write *domains* to a temp servers file. Returns (path, True); caller deletes it."""
+    tmp = tempfile.NamedTemporaryFile(mode='w', suffix='.list', delete=False, dir='/tmp')
+    tmp.write('\n'.join(domains) + '\n')
+    tmp.close()
+    return tmp.name, True
+
 def _filtered_servers_file(countries):
     """Create a temp servers file with only domains matching the given countries.
     Returns (path, is_temp). Caller must delete temp file after use."""
@@ -560,8 +708,7 @@ def _filtered_servers_file(countries):
     if not os.path.exists(RESULTS_FILE):
         return SERVERS_FILE, False
     try:
-        with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
-            results = json.load(f)
+        results = results_store.snapshot(RESULTS_FILE)
     except Exception:
         return SERVERS_FILE, False
     if not os.path.exists(SERVERS_FILE):
@@ -571,7 +718,7 @@ def _filtered_servers_file(countries):
     filtered = []
     for d in all_domains:
         entry = results.get(d)
-        if isinstance(entry, dict) and entry.get('country', '').casefold() in country_set:
+        if entry and entry.get('country', '').casefold() in country_set:
             filtered.append(d)
     if not filtered:
         return SERVERS_FILE, False
@@ -580,7 +727,8 @@ def _filtered_servers_file(countries):
     tmp.close()
     return tmp.name, True
 
-def run_scan_in_background(pings, timeout, workers, vpn_speedtest=False, countries=None):
+def run_scan_in_background(pings, timeout, workers, vpn_speedtest=False, countries=None, domains=None):
+    """Run a latency scan (blocking). *domains* restricts it to those servers, else *countries* filter servers.list."""
     global scan_active, scan_progress, last_error, scan_start_time
 
     stop_event.clear()
@@ -593,7 +741,7 @@ def run_scan_in_background(pings, timeout, workers, vpn_speedtest=False, countri
     flusher = threading.Thread(target=_state_flusher, daemon=True)
     flusher.start()
 
-    servers_file, is_temp = _filtered_servers_file(countries)
+    servers_file, is_temp = _domains_servers_file(domains) if domains else _filtered_servers_file(countries)
     try:
         if not (os.path.exists(GEOIP_CITY) and os.path.exists(GEOIP_COUNTRY)):
             raise FileNotFoundError(f"GeoIP databases not found at {GEOIP_CITY} or {GEOIP_COUNTRY}")
@@ -603,10 +751,12 @@ def run_scan_in_background(pings, timeout, workers, vpn_speedtest=False, countri
             city_db=GEOIP_CITY,
             country_db=GEOIP_COUNTRY,
             results_json=RESULTS_FILE,
-            excl_countries_fle='exclude_countries.list'
+            excl_countries_fle='exclude_countries.list',
+            negative_cache=_negative_cache()
         )
 
         scan_logger.info(f'Scan started: pings={pings}, timeout={timeout}, workers={workers}, vpn={vpn_speedtest}')
+        speedtest_options = _speedtest_options()
         _results, failed_domains = scanner.scan(
             pings_num=pings,
             timeout_ms=timeout,
@@ -616,20 +766,14 @@ def run_scan_in_background(pings, timeout, workers, vpn_speedtest=False, countri
             vpn_ovpn_dir=VPN_OVPN_DIR,
             vpn_username=VPN_USERNAME,
             vpn_password=VPN_PASSWORD,
-            stop_event=stop_event
+            stop_event=stop_event,
+            vpn_concurrency=speedtest_options['concurrency'],
+            vpn_engine=speedtest_options['engine'],
+            vpn_engine_options=speedtest_options['engine_options'],
+            vpn_retry_options=speedtest_options['retry_options']
         )
-        # Remove failed domains from servers.list (full scans only)
-        if failed_domains and not is_temp:
-            try:
-                with open(SERVERS_FILE, 'r', encoding='utf-8') as f:
-                    lines = [l.strip() for l in f if l.strip()]
-                cleaned = [d for d in lines if d not in failed_domains]
-                if cleaned:
-                    with open(SERVERS_FILE, 'w', encoding='utf-8') as f:
-                        f.write('\n'.join(cleaned) + '\n')
-                    scan_logger.info(f'Removed {len(failed_domains)} failed servers from servers.list')
-            except Exception as e:
-                logging.error(f"Failed to clean servers.list: {e}")
+        if failed_domains:
+            scan_logger.info(f'{len(failed_domains)} servers failed and are backed off from future scans')
         if stop_event.is_set():
             scan_progress['status'] = 'completed'
             scan_progress['message'] = 'Scan interrupted by stop request'
@@ -651,7 +795,8 @@ def run_scan_in_background(pings, timeout, workers, vpn_speedtest=False, countri
     finally:
         scan_active = False
         _flush_scan_state()
-        _update_last_run('latency_scan')
+        if not domains:  # A targeted scan (e.g. new servers) is not the scheduled full scan
+            _update_last_run('latency_scan')
         if is_temp:
             try:
                 os.unlink(servers_file)
@@ -664,67 +809,277 @@ def run_scan_in_background(pings, timeout, workers, vpn_speedtest=False, countri
 GEOLITE_RELEASE_URL = 'https://api.github.com/repos/P3TERX/GeoLite.mmdb/releases/latest'
 GEOLITE_CITY_FILENAME = 'GeoLite2-City.mmdb'
 GEOLITE_COUNTRY_FILENAME = 'GeoLite2-Country.mmdb'
+GEOLITE_MANIFEST_TTL_S = 3600  # Status checks reuse the cached release info this long
+_geolite_lock = threading.Lock()
 
-def _do_geolite_update():
-    """Download latest GeoLite2 databases. Returns list of updated filenames."""
-    logging.info('Fetching latest GeoLite2 release info...')
-    resp = http_requests.get(GEOLITE_RELEASE_URL, timeout=10)
+def _geolite_manifest_path():
+    return os.path.join(os.path.dirname(os.path.abspath(GEOIP_CITY)), '.geolite_manifest.json')
+
+def _load_geolite_manifest():
+    """Cached release info plus the ETag/checksum of each downloaded database."""
+    try:
+        with open(_geolite_manifest_path(), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _save_geolite_manifest(manifest):
+    path = _geolite_manifest_path()
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def _conditional_headers(meta):
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
+def _fetch_geolite_release(manifest, max_age_s=GEOLITE_MANIFEST_TTL_S):
+    """Return the latest release info, from the manifest cache when fresh enough.
+
+    A stale cache is revalidated with If-None-Match; a 304 doesn't count
+    against the GitHub API rate limit.
+    """
+    cached = manifest.get('release')
+    if cached and time.time() - manifest.get('checked_at', 0) < max_age_s:
+        return cached
+    resp = http_requests.get(GEOLITE_RELEASE_URL, timeout=10,
+                             headers=_conditional_headers(manifest) if cached else {})
+    if resp.status_code == 304 and cached:
+        manifest['checked_at'] = time.time()
+        return cached
     resp.raise_for_status()
     release = resp.json()
-    assets = release.get('assets', [])
-
-    downloaded = []
-    for asset in assets:
-        name = asset.get('name', '')
-        if name in (GEOLITE_CITY_FILENAME, GEOLITE_COUNTRY_FILENAME):
-            download_url = asset.get('browser_download_url')
-            if not download_url:
-                continue
-            target = GEOIP_CITY if name == GEOLITE_CITY_FILENAME else GEOIP_COUNTRY
-            logging.info(f'Downloading {name}...')
-            dl = http_requests.get(download_url, timeout=120, stream=True)
-            dl.raise_for_status()
-            tmp_path = target + '.tmp'
-            with open(tmp_path, 'wb') as f:
-                for chunk in dl.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            os.replace(tmp_path, target)
-            downloaded.append(name)
-            logging.info(f'{name} updated successfully')
-    return downloaded
+    manifest['release'] = {
+        'tag_name': release.get('tag_name', ''),
+        'published_at': release.get('published_at', ''),
+        'assets': [{k: asset.get(k) for k in ('id', 'name', 'browser_download_url', 'size', 'digest', 'updated_at')}
+                   for asset in release.get('assets', [])],
+    }
+    manifest['etag'] = resp.headers.get('ETag')
+    manifest['last_modified'] = resp.headers.get('Last-Modified')
+    manifest['checked_at'] = time.time()
+    return manifest['release']
+
+def _geolite_asset_current(asset, target, known):
+    """True if *target* was downloaded from this exact release asset (no request needed)."""
+    return (os.path.exists(target) and asset.get('updated_at') is not None
+            and known.get('asset_id') == asset.get('id') and known.get('asset_updated_at') == asset['updated_at']
+            and known.get('size') == os.path.getsize(target))
+
+def _download_geolite_asset(asset, target, known):
+    """Conditionally download one database, verify it and swap it in.
+
+    Returns:
+        Updated manifest entry, or None if the server reported it unchanged (304)
+
+    Raises:
+        ValueError: If the size or sha256 digest doesn't match the release asset
+    """
+    name = asset['name']
+    headers = _conditional_headers(known) if os.path.exists(target) else {}
+    dl = http_requests.get(asset['browser_download_url'], timeout=120, stream=True, headers=headers)
+    try:
+        if dl.status_code == 304:
+            return None
+        dl.raise_for_status()
+        logging.info(f'Downloading {name}...')
+        tmp_path = target + '.tmp'
+        digest = hashlib.sha256()
+        size = 0
+        with open(tmp_path, 'wb') as f:
+            for chunk in dl.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+        expected = (asset.get('digest') or '').partition('sha256:')[2]
+        problem = None
+        if expected and expected != digest.hexdigest():
+            problem = f'{name} checksum mismatch (expected sha256 {expected}, got {digest.hexdigest()})'
+        elif asset.get('size') and asset['size'] != size:
+            problem = f'{name} size mismatch (expected {asset["size"]} bytes, got {size})'
+        if problem:
+            os.unlink(tmp_path)
+            raise ValueError(problem)
+        os.replace(tmp_path, target)
+        georeader.invalidate(target)
+        return {
+            'etag': dl.headers.get('ETag'),
+            'last_modified': dl.headers.get('Last-Modified'),
+            'sha256': digest.hexdigest(),
+            'size': size,
+            'asset_id': asset.get('id'),
+            'asset_updated_at': asset.get('updated_at'),
+        }
+    finally:
+        dl.close()
+
+def _do_geolite_update():
+    """Download GeoLite2 databases that changed since the last update.
+
+    Returns:
+        Dict with 'updated' and 'unchanged' database filenames; both are
+        empty if the release has no matching assets
+    """
+    with _geolite_lock:
+        manifest = _load_geolite_manifest()
+        logging.info('Fetching latest GeoLite2 release info...')
+        release = _fetch_geolite_release(manifest, max_age_s=0)
+        files = manifest.setdefault('files', {})
+        result = {'updated': [], 'unchanged': []}
+        try:
+            for asset in release.get('assets', []):
+                name = asset.get('name', '')
+                if name not in (GEOLITE_CITY_FILENAME, GEOLITE_COUNTRY_FILENAME) or not asset.get('browser_download_url'):
+                    continue
+                target = GEOIP_CITY if name == GEOLITE_CITY_FILENAME else GEOIP_COUNTRY
+                known = files.get(name, {})
+                entry = None if _geolite_asset_current(asset, target, known) else _download_geolite_asset(asset, target, known)
+                if entry is None:
+                    known.update(asset_id=asset.get('id'), asset_updated_at=asset.get('updated_at'))
+                    files[name] = known
+                    result['unchanged'].append(name)
+                    logging.info(f'{name} is up to date')
+                else:
+                    files[name] = entry
+                    result['updated'].append(name)
+                    logging.info(f'{name} updated successfully')
+        finally:
+            _save_geolite_manifest(manifest)
+        return result
+
+def _regeolocate_results():
+    """Refresh country/city of stored results from the current GeoLite databases.
+
+    Holds scan_active like a scan, so no scan writes results meanwhile. If a
+    scan, speedtest or probe is running (a latency scan may still hold the old
+    reader), a 'regeolocate' job is queued to run once it finishes instead.
+
+    Returns:
+        regeolocate() summary, {'queued': True} if deferred, or None if there
+        are no results or databases
+    """
+    global scan_active, scan_progress, last_error, scan_start_time
+    if not (os.path.exists(RESULTS_FILE) and os.path.exists(GEOIP_CITY) and os.path.exists(GEOIP_COUNTRY)):
+        return None
+    if _is_scan_active():
+        _queue_regeolocate()
+        return {'queued': True}
+
+    stop_event.clear()
+    scan_active = True
+    scan_start_time = time.time()
+    scan_progress = {"done": 0, "total": 0, "status": "running", "message": "Re-geolocating stored results..."}
+    last_error = None
+    _flush_scan_state()
+    try:
+        results = results_store.load(RESULTS_FILE)
+        summary = regeolocate(results, GEOIP_CITY, GEOIP_COUNTRY)
+        if summary['changed']:
+            results_store.save(RESULTS_FILE, results)
+        scan_progress['done'] = scan_progress['total'] = summary['checked']
+        scan_progress['status'] = 'completed'
+        scan_progress['message'] = f"Re-geolocation completed — {len(summary['changed'])}/{summary['checked']} locations changed"
+        return summary
+    except Exception as e:
+        scan_progress['status'] = 'error'
+        scan_progress['message'] = str(e)
+        last_error = str(e)
+        raise
+    finally:
+        scan_active = False
+        _flush_scan_state()
+
+def _queue_regeolocate():
+    """Queue one re-geolocation to run after the current scan (no-op if one is already pending)."""
+    with _queue_file_lock:
+        st = _read_queue_file()
+        pending = st.setdefault("pending", [])
+        if any(job.get("type") == REGEOLOCATE_JOB for job in pending):
+            return
+        pending.append({"domains": [], "type": REGEOLOCATE_JOB, "label": 'Re-geolocate results'})
+        _write_queue_file(st)
+    logging.info('Re-geolocation queued: a scan is running')
+    _ensure_queue_processor()
+
+def _geolite_status(refresh=False):
+    """Local database dates and the latest release, using the cached manifest.
+
+    The manifest is only written back when the release info was fetched, and
+    under _geolite_lock so a concurrent update's file entries are not lost.
+    """
+    status = {'city_last_modified': None, 'country_last_modified': None, 'latest_release_tag': None,
+              'latest_release_date': None, 'release_checked_at': None, 'update_available': False}
+    for key, path in (('city_last_modified', GEOIP_CITY), ('country_last_modified', GEOIP_COUNTRY)):
+        if os.path.exists(path):
+            status[key] = datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc).isoformat()
+    with _geolite_lock:
+        manifest = _load_geolite_manifest()
+        checked_at = manifest.get('checked_at')
+        try:
+            release = _fetch_geolite_release(manifest, max_age_s=0 if refresh else GEOLITE_MANIFEST_TTL_S)
+        except Exception:
+            return status
+        if manifest.get('checked_at') != checked_at:
+            _save_geolite_manifest(manifest)
+    status['latest_release_tag'] = release.get('tag_name')
+    status['latest_release_date'] = release.get('published_at')
+    status['release_checked_at'] = datetime.fromtimestamp(manifest['checked_at'], tz=timezone.utc).isoformat()
+    files = manifest.get('files', {})
+    for asset in release.get('assets', []):
+        name = asset.get('name')
+        if name not in (GEOLITE_CITY_FILENAME, GEOLITE_COUNTRY_FILENAME):
+            continue
+        target = GEOIP_CITY if name == GEOLITE_CITY_FILENAME else GEOIP_COUNTRY
+        known = files.get(name)
+        if _geolite_asset_current(asset, target, known or {}):
+            continue
+        if not os.path.exists(target) or known:
+            status['update_available'] = True
+        elif status['latest_release_date']:
+            # Downloaded before the manifest existed: fall back to comparing dates
+            release_ts = datetime.fromisoformat(status['latest_release_date'].replace('Z', '+00:00')).timestamp()
+            if release_ts > os.path.getmtime(target):
+                status['update_available'] = True
+    return status
 
 # ============================================================
 # OVPN download
 # ============================================================
 
-def _download_ovpn_from_url(url):
-    """Download and extract OVPN configs from a URL. Returns count of extracted files."""
-    logging.info(f'Downloading OVPN configs from URL...')
-    resp = http_requests.get(url, timeout=120, stream=True)
-    resp.raise_for_status()
+OVPN_DOWNLOAD_CHUNK = 1024 * 1024
+
 
-    zip_bytes = resp.content
-    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
-        for name in zf.namelist():
-            if os.path.isabs(name) or '..' in name:
-                raise ValueError(f'Invalid path in zip: {name}')
+def _apply_ovpn_zip(zip_path):
+    """Sync the ovpn directory with a zip bundle on disk. Returns the apply_zip() change report."""
+    changes = apply_zip(zip_path, VPN_OVPN_DIR)
+    logging.info(f"OVPN configs updated: {_format_ovpn_changes(changes)}")
+    return changes
 
-        ovpn_path = Path(VPN_OVPN_DIR)
-        ovpn_path.mkdir(parents=True, exist_ok=True)
 
-        for old in ovpn_path.glob('*.ovpn'):
-            old.unlink(missing_ok=True)
+def _format_ovpn_changes(changes):
+    return (f"{changes['count']} UDP configs ({len(changes['added'])} added, "
+            f"{len(changes['changed'])} changed, {len(changes['removed'])} removed)")
 
-        extracted = 0
-        for name in zf.namelist():
-            basename = os.path.basename(name)
-            if basename.lower().endswith('.ovpn') and 'udp' in basename.lower():
-                target = ovpn_path / basename
-                target.write_bytes(zf.read(name))
-                extracted += 1
 
-    logging.info(f'OVPN configs updated: {extracted} UDP files extracted')
-    return extracted
+def _download_ovpn_from_url(url):
+    """Stream an OVPN zip bundle to a temp file and apply it. Returns the change report."""
+    logging.info(f'Downloading OVPN configs from URL...')
+    resp = http_requests.get(url, timeout=120, stream=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.zip', prefix='ovpn_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            resp.raise_for_status()
+            for chunk in resp.iter_content(chunk_size=OVPN_DOWNLOAD_CHUNK):
+                f.write(chunk)
+        return _apply_ovpn_zip(tmp_path)
+    finally:
+        resp.close()
+        os.unlink(tmp_path)
 
 # ============================================================
 # Prune stale results
@@ -740,22 +1095,53 @@ def _prune_stale_results():
         raise RuntimeError("servers.list is empty — refusing to prune (would delete all data)")
     if not os.path.exists(RESULTS_FILE):
         return 0, 0
-    with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
-        results = json.load(f)
-    if not isinstance(results, dict):
-        return 0, 0
+    results = results_store.load(RESULTS_FILE)
     stale_keys = [d for d in results if d not in current_servers]
     if not stale_keys:
         return 0, len(results)
     for key in stale_keys:
         del results[key]
-    tmp = RESULTS_FILE + '.tmp'
-    with open(tmp, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2)
-    os.replace(tmp, RESULTS_FILE)
+    results_store.save(RESULTS_FILE, results)
     logging.info(f"Pruned {len(stale_keys)} stale servers from results ({len(results)} remaining)")
     return len(stale_keys), len(results)
 
+# ============================================================
+# Results views (geo index, columnar table)
+# ============================================================
+_results_views = {}  # name -> (file key, view)
+_results_views_lock = threading.Lock()
+
+def _results_view(name, build):
+    """build(results) for the current results.json, rebuilt only when the file changes.
+
+    Returns None if the results file is missing or unreadable.
+    """
+    try:
+        st = os.stat(RESULTS_FILE)
+    except OSError:
+        return None
+    key = (os.path.abspath(RESULTS_FILE), st.st_mtime_ns, st.st_size)
+    with _results_views_lock:
+        cached = _results_views.get(name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    try:
+        data = results_store.snapshot(RESULTS_FILE)
+    except (OSError, ValueError):
+        return None
+    view = build(data)
+    with _results_views_lock:
+        _results_views[name] = (key, view)
+    return view
+
+def _results_geo_index():
+    """Country -> city -> servers index of results.json (see _results_view)."""
+    return _results_view('geo', lambda data: GeoIndex([Analyze._row(domain, entry) for domain, entry in data.items()]))
+
+def _results_table():
+    """Columnar ResultsTable of results.json for rankings and filters (see _results_view)."""
+    return _results_view('table', ResultsTable.from_results)
+
 # ============================================================
 # Origin detection
 # ============================================================
@@ -768,8 +1154,7 @@ def _detect_origin_from_geoip():
     try:
         ip_resp = http_requests.get('https://api.ipify.org', timeout=10)
         public_ip = ip_resp.text.strip()
-        reader = geoip2.database.Reader(GEOIP_CITY)
-        try:
+        with georeader.lease(GEOIP_CITY) as reader:
             geo = reader.city(public_ip)
             return {
                 'ip': public_ip,
@@ -779,8 +1164,6 @@ def _detect_origin_from_geoip():
                 'city': geo.city.name or 'Unknown',
                 'source': 'auto'
             }
-        finally:
-            reader.close()
     except Exception:
         return None
 
@@ -861,39 +1244,135 @@ def _get_servers_commands(config):
         return [{'command': cmd, 'label': '', 'enabled': True}]
     return []
 
+SERVERS_COMMAND_TIMEOUT_S = 120  # Default per-command timeout; a command entry may set 'timeout'
+MAX_SERVERS_COMMAND_WORKERS = 8
+_SERVERS_BLOCKED_PATTERNS = ['rm ', 'rm\t', 'mkfs', 'dd ', ':(){', 'fork', '> /dev/', 'shutdown', 'reboot',
+                             'passwd', 'chmod 777', 'curl|', 'wget|', '| bash', '| sh',
+                             'bash -c', 'sh -c', 'python -c', 'perl -e', 'ruby -e',
+                             '$(', '`']
+
+def _servers_changes_path():
+    return SERVERS_FILE + '.changes.json'
+
+def _read_servers_list():
+    if not os.path.exists(SERVERS_FILE):
+        return []
+    with open(SERVERS_FILE, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def _run_servers_command(entry):
+    """Run one servers command, ingesting stdout line by line as it streams.
+
+    Returns:
+        (hosts, duration_s)
+
+    Raises:
+        RuntimeError: On a non-zero exit or when the command exceeds its timeout
+    """
+    label = entry.get('label', '') or 'unnamed'
+    timeout = float(entry.get('timeout') or SERVERS_COMMAND_TIMEOUT_S)
+    start = time.monotonic()
+    hosts = []
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(['bash', '-c', entry['command']], stdout=subprocess.PIPE, stderr=stderr,
+                                text=True, start_new_session=True)
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)  # The whole group: children may hold stdout open
+            except ProcessLookupError:
+                pass
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            for line in proc.stdout:
+                line = line.strip()
+                if line:
+                    hosts.append(line)
+            proc.wait()
+        finally:
+            timer.cancel()
+            proc.stdout.close()
+        if timed_out.is_set():
+            raise RuntimeError(f"Command '{label}' timed out after {timeout:g}s")
+        if proc.returncode != 0:
+            stderr.seek(0)
+            message = stderr.read()[-2000:].decode('utf-8', errors='replace').strip()
+            raise RuntimeError(f"Command '{label}' exited with code {proc.returncode}: {message}")
+    return hosts, round(time.monotonic() - start, 2)
+
 def _run_servers_update_commands(commands):
-    """Run multiple shell commands and merge their output into servers.list."""
-    import shlex
-    BLOCKED_PATTERNS = ['rm ', 'rm\t', 'mkfs', 'dd ', ':(){', 'fork', '> /dev/', 'shutdown', 'reboot',
-                        'passwd', 'chmod 777', 'curl|', 'wget|', '| bash', '| sh',
-                        'bash -c', 'sh -c', 'python -c', 'perl -e', 'ruby -e',
-                        '$(', '`']
-    all_hosts = []
+    """Run the servers commands concurrently, merge their output into servers.list and diff it.
+
+    Output is merged in command order with duplicates removed. servers.list is
+    only replaced if every command succeeded. The changeset is also written to
+    servers.list.changes.json for downstream jobs.
+
+    Returns:
+        Changeset dict: timestamp, count, added, removed, commands (per-command host count and duration)
+    """
     for entry in commands:
-        cmd = entry['command']
-        label = entry.get('label', '') or 'unnamed'
-        cmd_lower = cmd.lower().strip()
-        for pattern in BLOCKED_PATTERNS:
+        cmd_lower = entry['command'].lower().strip()
+        for pattern in _SERVERS_BLOCKED_PATTERNS:
             if pattern in cmd_lower:
-                raise RuntimeError(f"Command '{label}' contains blocked pattern '{pattern}'")
-        logging.info(f"Running servers update command: {label}")
-        result = subprocess.run(
-            ['bash', '-c', cmd], capture_output=True, text=True, timeout=120
-        )
-        if result.returncode != 0:
-            raise RuntimeError(f"Command '{label}' exited with code {result.returncode}: {result.stderr.strip()}")
-        lines = [line.strip() for line in result.stdout.splitlines() if line.strip()]
-        logging.info(f"  {label}: {len(lines)} hosts")
-        all_hosts.extend(lines)
+                raise RuntimeError(f"Command '{entry.get('label', '') or 'unnamed'}' contains blocked pattern '{pattern}'")
+
+    labels = [entry.get('label', '') or 'unnamed' for entry in commands]
+    logging.info(f"Running {len(commands)} servers update commands: {', '.join(labels)}")
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_SERVERS_COMMAND_WORKERS, len(commands)))) as pool:
+        futures = [pool.submit(_run_servers_command, entry) for entry in commands]
+        outputs = []
+        errors = []
+        for future in futures:
+            try:
+                outputs.append(future.result())
+            except Exception as e:
+                errors.append(str(e))
+    if errors:
+        raise RuntimeError('; '.join(errors))
+
+    all_hosts = []
+    per_command = []
+    for label, (hosts, duration_s) in zip(labels, outputs):
+        logging.info(f"  {label}: {len(hosts)} hosts in {duration_s}s")
+        per_command.append({'label': label, 'hosts': len(hosts), 'duration_s': duration_s})
+        all_hosts.extend(hosts)
     all_hosts = list(dict.fromkeys(all_hosts))
     if not all_hosts:
         raise RuntimeError("All commands produced no output")
-    tmp = SERVERS_FILE + '.tmp'
+
+    previous = _read_servers_list()
+    new_set, old_set = set(all_hosts), set(previous)
+    changeset = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'count': len(all_hosts),
+        'added': [h for h in all_hosts if h not in old_set],
+        'removed': [h for h in previous if h not in new_set],
+        'commands': per_command,
+    }
+    if changeset['added'] or changeset['removed'] or not os.path.exists(SERVERS_FILE):
+        tmp = SERVERS_FILE + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(all_hosts) + '\n')
+        os.replace(tmp, SERVERS_FILE)
+    tmp = _servers_changes_path() + '.tmp'
     with open(tmp, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(all_hosts) + '\n')
-    os.replace(tmp, SERVERS_FILE)
-    logging.info(f"servers.list updated: {len(all_hosts)} unique entries")
-    return len(all_hosts)
+        json.dump(changeset, f, indent=2)
+    os.replace(tmp, _servers_changes_path())
+    logging.info(f"servers.list updated: {len(all_hosts)} unique entries "
+                 f"({len(changeset['added'])} added, {len(changeset['removed'])} removed)")
+    return changeset
+
+def _load_servers_changeset():
+    """The changeset of the last servers update, or None."""
+    try:
+        with open(_servers_changes_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
 # ============================================================
 # Misc route helpers
@@ -925,8 +1404,4 @@ def _parse_countries(args):
 
 def _is_failed_server(entry):
     """Return True if the server's most recent speedtest failed."""
-    fts = entry.get('speedtest_failed_timestamp')
-    if not fts:
-        return False
-    ts = entry.get('speedtest_timestamp')
-    return not ts or fts > ts
+    return recently_failed(entry)
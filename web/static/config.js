@@ -106,6 +106,8 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById('cfgVpnDay').value = vpn.day || 'monday';
         document.getElementById('cfgVpnDom').value = vpn.dom || 1;
         document.getElementById('cfgVpnTime').value = vpn.time || '03:00';
+        document.getElementById('cfgVpnTimeBudget').value = vpn.time_budget_minutes || 0;
+        document.getElementById('cfgVpnDataBudget').value = vpn.data_budget_mb || 0;
         setDayButtons('cfgVpnDays', vpn.days);
         vpnSelectedCountries = vpn.countries || [];
         loadVpnCountries();
@@ -153,6 +155,8 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById('cfgSrvTime').value = srv.time || '06:00';
         setDayButtons('cfgSrvDays', srv.days);
         document.getElementById('cfgSrvPruneStale').checked = srv.prune_stale || false;
+        document.getElementById('cfgSrvScanNew').checked = srv.scan_new !== false;
+        document.getElementById('cfgSrvSpeedtestNew').checked = srv.speedtest_new || false;
         document.getElementById('cfgSrvLastRun').textContent = srv.last_run ? `Last run: ${srv.last_run}` : '';
 
         const ntfy = config.notifications?.ntfy || {};
@@ -185,7 +189,9 @@ document.addEventListener('DOMContentLoaded', () => {
                     days: getDayButtons('cfgVpnDays'),
                     dom: parseInt(document.getElementById('cfgVpnDom').value) || 1,
                     time: document.getElementById('cfgVpnTime').value,
-                    countries: vpnSelectedCountries
+                    countries: vpnSelectedCountries,
+                    time_budget_minutes: parseInt(document.getElementById('cfgVpnTimeBudget').value) || 0,
+                    data_budget_mb: parseInt(document.getElementById('cfgVpnDataBudget').value) || 0
                 },
                 latency_scan: {
                     enabled: document.getElementById('cfgLatEnabled').checked,
@@ -224,7 +230,9 @@ document.addEventListener('DOMContentLoaded', () => {
                     days: getDayButtons('cfgSrvDays'),
                     dom: parseInt(document.getElementById('cfgSrvDom').value) || 1,
                     time: document.getElementById('cfgSrvTime').value,
-                    prune_stale: document.getElementById('cfgSrvPruneStale').checked
+                    prune_stale: document.getElementById('cfgSrvPruneStale').checked,
+                    scan_new: document.getElementById('cfgSrvScanNew').checked,
+                    speedtest_new: document.getElementById('cfgSrvSpeedtestNew').checked
                 }
             },
             notifications: {
@@ -323,7 +331,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 const resp = await fetch('/api/ovpn/upload', { method: 'POST', body: form });
                 const data = await resp.json();
                 if (data.status === 'ok') {
-                    cfgOvpnUploadStatus.textContent = `Uploaded! ${data.count} configs extracted.`;
+                    cfgOvpnUploadStatus.textContent = `Uploaded! ${data.count} configs (${data.added.length} added, ${data.changed.length} changed, ${data.removed.length} removed).`;
                 } else {
                     cfgOvpnUploadStatus.textContent = data.message || 'Upload failed';
                 }
@@ -346,34 +346,21 @@ document.addEventListener('DOMContentLoaded', () => {
             const response = await fetch('/api/results');
             const data = await response.json();
 
-            // Convert to array and handle both old and new formats
+            // The server migrates legacy result layouts, so every entry is an object
             allResults = Object.keys(data).map(domain => {
                 const entry = data[domain];
-                // New format (dict)
-                if (typeof entry === 'object' && !Array.isArray(entry)) {
-                    return {
-                        domain,
-                        latency: entry.latency_ms || 0,
-                        ip: entry.ip || 'N/A',
-                        country: entry.country || 'Unknown',
-                        city: entry.city || 'Unknown',
-                        rx_speed: entry.rx_speed_mbps,
-                        tx_speed: entry.tx_speed_mbps,
-                        scan_timestamp: entry.scan_timestamp || null,
-                        speedtest_timestamp: entry.speedtest_timestamp || null,
-                        speedtest_failed_timestamp: entry.speedtest_failed_timestamp || null,
-                        speedtest_failed_reason: entry.speedtest_failed_reason || null
-                    };
-                }
-                // Old format (array)
                 return {
                     domain,
-                    latency: entry[0] || 0,
-                    ip: entry[1] || 'N/A',
-                    country: entry[2] || 'Unknown',
-                    city: entry[3] || 'Unknown',
-                    rx_speed: null,
-                    tx_speed: null
+                    latency: entry.latency_ms || 0,
+                    ip: entry.ip || 'N/A',
+                    country: entry.country || 'Unknown',
+                    city: entry.city || 'Unknown',
+                    rx_speed: entry.rx_speed_mbps,
+                    tx_speed: entry.tx_speed_mbps,
+                    scan_timestamp: entry.scan_timestamp || null,
+                    speedtest_timestamp: entry.speedtest_timestamp || null,
+                    speedtest_failed_timestamp: entry.speedtest_failed_timestamp || null,
+                    speedtest_failed_reason: entry.speedtest_failed_reason || null
                 };
             });
 
@@ -972,7 +959,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 });
                 const data = await resp.json();
                 if (data.status === 'ok') {
-                    showToast(`OVPN configs updated: ${data.count} UDP files extracted`);
+                    showToast(`OVPN configs updated: ${data.count} UDP configs (${data.added.length} added, ${data.changed.length} changed, ${data.removed.length} removed)`);
                     ovpnStatusLoaded = false;
                 } else {
                     showToast('Download failed: ' + data.message, true);
@@ -1001,7 +988,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const resp = await fetch('/api/ovpn/upload', { method: 'POST', body: formData });
             const data = await resp.json();
             if (data.status === 'ok') {
-                showToast(`OVPN configs updated: ${data.count} UDP files extracted`);
+                showToast(`OVPN configs updated: ${data.count} UDP configs (${data.added.length} added, ${data.changed.length} changed, ${data.removed.length} removed)`);
                 ovpnStatusLoaded = false;
             } else {
                 showToast('Upload failed: ' + data.message, true);
@@ -1064,7 +1051,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const resp = await fetch('/api/geolite/update', { method: 'POST' });
             const data = await resp.json();
             if (data.status === 'ok') {
-                showToast(`GeoLite2 updated: ${data.updated.join(', ')}`);
+                showToast(data.updated.length ? `GeoLite2 updated: ${data.updated.join(', ')}` : 'GeoLite2 is already up to date');
                 geoliteStatusLoaded = false; // Force re-fetch on next hover
             } else {
                 showToast('Update failed: ' + data.message, true);